@@ -0,0 +1,78 @@
+# /start javobini tayyorlash narxi: keshlarsiz va keshlar bilan (CPU va xotira)
+#
+#   python benchmarks/bench_render.py [--channels 8] [--iterations 5000]
+#
+# "Keshsiz" - statik keyboardlar, kanallar keyboardi va xush kelibsiz matni har
+# update'da qaytadan yaratiladi (lru_cache/VersionedCache chetlab o'tiladi).
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(), "bench_render.db")
+
+from database.database import db  # noqa: E402
+from handlers.user import get_welcome_text, render_channel_list  # noqa: E402
+from keyboards import keyboards  # noqa: E402
+from utils.templates import templates  # noqa: E402
+
+
+def make_channels(count: int):
+    return [
+        {'id': i, 'channel_id': f'-100{i}', 'channel_name': f'Kanal {i}', 'channel_link': f'https://t.me/+abc{i}'}
+        for i in range(count)
+    ]
+
+
+def channels_key(channels):
+    return tuple((c['id'], c['channel_name'], c['channel_link'], False) for c in channels)
+
+
+async def uncached(channels):
+    keyboards.get_start_keyboard.__wrapped__()
+    keyboards.get_admin_keyboard.__wrapped__()
+    keyboards.get_cancel_keyboard.__wrapped__()
+    keyboards._build_channels_keyboard.__wrapped__(channels_key(channels))
+    return await templates.render("welcome", channels=render_channel_list(channels))
+
+
+async def cached(channels):
+    keyboards.get_start_keyboard()
+    keyboards.get_admin_keyboard()
+    keyboards.get_cancel_keyboard()
+    keyboards.get_channels_keyboard(channels, [])
+    return await get_welcome_text(channels)
+
+
+async def measure(step, channels, iterations: int):
+    await step(channels)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await step(channels)
+    cpu_us = (time.perf_counter() - started) / iterations * 1e6
+
+    tracemalloc.start()
+    for _ in range(min(iterations, 1000)):
+        await step(channels)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return cpu_us, peak
+
+
+async def main(args):
+    await db.init_db()
+    channels = make_channels(args.channels)
+    for name, step in (("keshsiz", uncached), ("kesh bilan", cached)):
+        cpu_us, peak = await measure(step, channels, args.iterations)
+        print(f"{name:>10}: {cpu_us:8.1f} us/update, eng ko'p ajratilgan xotira {peak / 1024:6.1f} KB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--channels", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=5000)
+    asyncio.run(main(parser.parse_args()))
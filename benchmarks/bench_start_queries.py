@@ -0,0 +1,67 @@
+# /start dagi foydalanuvchi + kanallar holatini o'qish: avvalgi uch chaqiruv va get_user_dashboard
+#
+#   python benchmarks/bench_start_queries.py [--users 200] [--channels 5] [--iterations 300]
+#
+# So'rovlar soni QueryTracer (DB_TRACE) bilan, ulanishlar - query_stats bilan sanaladi;
+# vaqt kuzatuvsiz o'lchanadi. Foydalanuvchilar indeksi o'chirilgan (har o'qish - SQL).
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DB_TRACE"] = "1"
+os.environ["USER_INDEX_SIZE"] = "0"
+
+from database.database import Database  # noqa: E402
+
+USER_ID = 5
+
+
+async def three_calls(db: Database):
+    await db.get_user(USER_ID)
+    await db.get_user_channels(USER_ID)
+    await db.check_all_channels_joined_real(USER_ID)
+
+
+async def dashboard(db: Database):
+    await db.get_user_dashboard(USER_ID)
+
+
+async def main(args):
+    db = Database(os.path.join(tempfile.mkdtemp(), "bench_start.db"))
+    await db.init_db()
+    await db.add_channels([(f"-100{i}", f"Kanal {i}", f"https://t.me/+k{i}") for i in range(args.channels)])
+    for telegram_id in range(1, args.users + 1):
+        await db.create_user(telegram_id, "user", "User", None)
+    channel_ids = [channel['id'] for channel in await db.get_active_channels()]
+    await db.join_channel(USER_ID, channel_ids[0])
+    await db.flush_writes()
+
+    tracer = db.tracer
+    for name, step in (("get_user + get_user_channels + check_all_channels_joined_real", three_calls),
+                       ("get_user_dashboard", dashboard)):
+        db.tracer = tracer
+        tracer.reset()
+        connections = db.query_stats.count
+        await step(db)
+        statements = sum(entry.calls for entry in tracer.statements.values())
+        connections = db.query_stats.count - connections
+
+        db.tracer = None
+        started = time.perf_counter()
+        for _ in range(args.iterations):
+            await step(db)
+        elapsed_ms = (time.perf_counter() - started) / args.iterations * 1000
+        print(f"{name}:\n  {statements} ta so'rov, {connections} ta ulanish, {elapsed_ms:.2f} ms")
+    await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--channels", type=int, default=5)
+    parser.add_argument("--iterations", type=int, default=300)
+    asyncio.run(main(parser.parse_args()))
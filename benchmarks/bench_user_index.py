@@ -0,0 +1,104 @@
+# Foydalanuvchilarni o'qish: SQL (PRIMARY KEY / referral_code indeksi) va UserIndex
+#
+#   python benchmarks/bench_user_index.py [--users 100000] [--lookups 2000] [--memory-rows 100000]
+#   python benchmarks/bench_user_index.py --users 1000000      # 1M foydalanuvchi bilan
+#
+# Baza vaqtinchalik faylda sqlite3 executemany bilan to'ldiriladi. Xotira - bitta
+# foydalanuvchi uchun: UserIndex va oddiy {telegram_id: dict} kesh (tracemalloc).
+import argparse
+import asyncio
+import gc
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.database import Database  # noqa: E402
+from database.user_index import UserIndex  # noqa: E402
+
+FIRST_ID = 100000000
+
+
+def referral_code(telegram_id: int) -> str:
+    return f"{telegram_id - FIRST_ID:08x}"
+
+
+async def fill(path: str, users: int):
+    storage = Database(path)
+    await storage.init_db()
+    await storage.close()
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO users (telegram_id, username, first_name, last_name, referral_code, referred_by, referral_count) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        ((FIRST_ID + i, f"user{i}", f"Name{i}", None, referral_code(FIRST_ID + i), None, i % 7) for i in range(users))
+    )
+    conn.commit()
+    conn.close()
+
+
+async def per_lookup_us(lookup, keys) -> float:
+    started = time.perf_counter()
+    for key in keys:
+        await lookup(key)
+    return (time.perf_counter() - started) / len(keys) * 1e6
+
+
+def memory_per_user(path: str, limit: int):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    rows = [dict(row) for row in conn.execute("SELECT * FROM users LIMIT ?", (limit,))]
+    conn.close()
+
+    gc.collect()
+    tracemalloc.start()
+    index = UserIndex(len(rows))
+    for row in rows:
+        index.put(row)
+    index_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    gc.collect()
+    tracemalloc.start()
+    cache = {row['telegram_id']: dict(row) for row in rows}
+    cache_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del index, cache
+    return index_bytes / len(rows), cache_bytes / len(rows)
+
+
+async def main(args):
+    path = os.path.join(tempfile.mkdtemp(), "bench_user_index.db")
+    await fill(path, args.users)
+
+    db = Database(path)
+    ids = [FIRST_ID + random.randrange(args.users) for _ in range(args.lookups)]
+    codes = [referral_code(telegram_id) for telegram_id in ids]
+
+    sql_user = await per_lookup_us(db._get_user, ids)
+    sql_code = await per_lookup_us(db._get_user_by_referral, codes)
+    # Birinchi o'tish indeksni to'ldiradi, ikkinchisi - faqat indeksdan
+    await per_lookup_us(db.get_user, ids)
+    hit_user = await per_lookup_us(db.get_user, ids)
+    hit_code = await per_lookup_us(db.get_user_by_referral, codes)
+    await db.close()
+
+    print(f"{args.users} ta foydalanuvchi, {args.lookups} ta o'qish:")
+    print(f"  get_user:             SQL {sql_user:8.1f} us, indeks {hit_user:6.2f} us")
+    print(f"  get_user_by_referral: SQL {sql_code:8.1f} us, indeks {hit_code:6.2f} us")
+
+    index_bytes, cache_bytes = memory_per_user(path, min(args.memory_rows, args.users))
+    print(f"  xotira (1 foydalanuvchi): UserIndex {index_bytes:.0f} B, dict kesh {cache_bytes:.0f} B")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--memory-rows", type=int, default=100000)
+    asyncio.run(main(parser.parse_args()))
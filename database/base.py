@@ -0,0 +1,516 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Optional, List, Dict, AsyncIterator, Sequence, Tuple
+
+from config import settings
+from database.referral_codes import referral_codec
+from database.metrics import QueryStats
+from database.segments import Segment
+from database.tracing import QueryTracer
+from database.user_index import UserIndex
+from database.write_behind import UserChannelWriteBuffer, ChannelRow
+
+# get_user_dashboard so'rovidagi kanal ustunlari (qolganlari - users.*)
+DASHBOARD_KEYS = frozenset((
+    'ch_id', 'ch_channel_id', 'ch_name', 'ch_link', 'ch_joined', 'ch_request_sent',
+    'ch_total', 'ch_joined_total', 'ch_pending_total'
+))
+
+
+class Storage(ABC):
+    """Ma'lumotlar ombori interfeysi (SQLite, PostgreSQL, ...)"""
+
+    USERS_EXPORT_COLUMNS = (
+        'telegram_id', 'username', 'first_name', 'last_name', 'referral_code',
+        'referred_by', 'referral_count', 'completed_task',
+        'joined_channels', 'pending_channels', 'total_channels', 'created_at'
+    )
+
+    # Jadvallar/indekslar o'zgarganda oshiriladi - init_db faqat shunda migratsiya qiladi
+    SCHEMA_VERSION = 10
+    # Bundan eski sxemada referral analitikasi ushlab qolingan referallarni ham
+    # sanagan - yangilanganda hisoblangan referallardan qayta quriladi
+    REFERRALS_REBUILD_VERSION = 10
+
+    # broadcasts jadvalidagi sanagichlar
+    BROADCAST_COUNTERS = ('processed', 'sent', 'blocked', 'deleted', 'deactivated', 'other')
+
+    def __init__(self):
+        # Kanal/content o'zgarganda oshiriladi - keshlarni bekor qilish uchun
+        self.channels_version = 0
+        self.content_version = 0
+        self.campaigns_version = 0
+        self.templates_version = 0
+        # join_channel / set_request_sent yozuvlari shu yerda yig'iladi
+        self.user_channel_buffer = UserChannelWriteBuffer(
+            self._write_user_channels,
+            interval=settings.WRITE_BEHIND_INTERVAL_MS / 1000,
+            max_rows=settings.WRITE_BEHIND_MAX_ROWS
+        )
+        # get_user / get_user_by_referral uchun xotiradagi indeks (0 - o'chirilgan)
+        self.user_index = UserIndex(settings.USER_INDEX_SIZE)
+        # So'rovlar soni va kechikishi (/health)
+        self.query_stats = QueryStats()
+        # So'rovlar bo'yicha batafsil kuzatuv (/queries) - faqat DB_TRACE=1 bo'lsa
+        self.tracer = QueryTracer() if settings.DB_TRACE else None
+
+    @abstractmethod
+    async def init_db(self) -> bool:
+        """Sxemani yaratish/yangilash. Versiya o'zgarmagan bo'lsa - False"""
+
+    async def flush_writes(self):
+        """Navbatdagi yozuvlarni darhol saqlash"""
+        await self.user_channel_buffer.flush()
+
+    def pool_usage(self) -> Tuple[int, Optional[int]]:
+        """(band ulanishlar, ulanishlar chegarasi). Chegara bo'lmasa - None"""
+        return self.query_stats.active, None
+
+    async def close(self):
+        """Navbatdagi yozuvlarni saqlab, ulanishlarni yopish"""
+        await self.user_channel_buffer.close()
+        await self._close()
+
+    async def _close(self):
+        """Backend ulanishlarini yopish"""
+
+    # User CRUD operatsiyalari (o'qishlar user_index orqali)
+    async def create_user(self, telegram_id: int, username: str,
+                          first_name: str, last_name: str,
+                          referred_by: int = None, campaign_id: int = None) -> Optional[Dict]:
+        user = await self._create_user(telegram_id, username, first_name, last_name, referred_by, campaign_id)
+        self.user_index.put(user)
+        return user
+
+    async def get_user(self, telegram_id: int) -> Optional[Dict]:
+        user = self.user_index.get(telegram_id)
+        if user is None:
+            version = self.user_index.version
+            user = await self._get_user(telegram_id)
+            self.user_index.put(user, version)
+        return user
+
+    async def get_user_by_referral(self, referral_code: str) -> Optional[Dict]:
+        user = self.user_index.get_by_referral(referral_code)
+        if user is None:
+            version = self.user_index.version
+            user = await self._find_user_by_referral(referral_code)
+            self.user_index.put(user, version)
+        return user
+
+    async def _find_user_by_referral(self, referral_code: str) -> Optional[Dict]:
+        # Yangi kodlar users.id ga qaytariladi (primary key), eskilari - referral_code indeksi
+        user_id = referral_codec.decode(referral_code)
+        if user_id is not None:
+            user = await self._get_user_by_id(user_id)
+            if user and user['referral_code'] == referral_code:
+                return user
+        return await self._get_user_by_referral(referral_code)
+
+    async def add_referral_credit(self, referrer_id: int, user_id: int) -> Optional[int]:
+        """Referalni bir marta hisoblash. Yangi sanagich yoki (takror bo'lsa) None"""
+        referral_count = await self._add_referral_credit(referrer_id, user_id)
+        if referral_count is not None:
+            self.user_index.update(referrer_id, referral_count=referral_count)
+        return referral_count
+
+    async def complete_task(self, telegram_id: int) -> bool:
+        """Vazifani bajarilgan deb belgilash. Faqat birinchi marta True"""
+        completed = await self._complete_task(telegram_id)
+        if completed:
+            self.user_index.update(telegram_id, completed_task=1)
+        return completed
+
+    @abstractmethod
+    async def _create_user(self, telegram_id: int, username: str,
+                           first_name: str, last_name: str,
+                           referred_by: int = None, campaign_id: int = None) -> Optional[Dict]: ...
+
+    @abstractmethod
+    async def _get_user(self, telegram_id: int) -> Optional[Dict]: ...
+
+    @abstractmethod
+    async def _get_user_by_id(self, user_id: int) -> Optional[Dict]: ...
+
+    @abstractmethod
+    async def _get_user_by_referral(self, referral_code: str) -> Optional[Dict]: ...
+
+    @abstractmethod
+    async def _add_referral_credit(self, referrer_id: int, user_id: int) -> Optional[int]: ...
+
+    @abstractmethod
+    async def _complete_task(self, telegram_id: int) -> bool: ...
+
+    # Channel CRUD operatsiyalari
+    @abstractmethod
+    async def add_channel(self, channel_id: str, channel_name: str,
+                          channel_link: str = None) -> bool: ...
+
+    @abstractmethod
+    async def add_channels(self, channels: List[tuple]) -> int:
+        """Ko'p kanallarni bitta tranzaksiyada qo'shish/yangilash"""
+
+    @abstractmethod
+    async def get_active_channels(self) -> List[Dict]: ...
+
+    @abstractmethod
+    async def get_campaign_channels(self, campaign_id: Optional[int]) -> List[Dict]:
+        """Kampaniya kanallari: umumiylari va faqat shu kampaniyaniki"""
+
+    @abstractmethod
+    async def set_channel_campaign(self, channel_id: str, campaign_id: Optional[int]) -> bool:
+        """Kanalni kampaniyaga bog'lash (None - barcha kampaniyalar uchun umumiy)"""
+
+    @abstractmethod
+    async def remove_channel(self, channel_id: str) -> bool: ...
+
+    @abstractmethod
+    async def remove_all_channels(self) -> int:
+        """Barcha kanallarni o'chirish"""
+
+    # User-Channel bog'lanish (write-behind + o'qishlarda overlay)
+    async def join_channel(self, user_id: int, channel_id: int):
+        self.user_channel_buffer.add(user_id, channel_id, joined=1, request_sent=0)
+
+    async def set_request_sent(self, user_id: int, channel_id: int):
+        """Request yuborgan holatini belgilash"""
+        self.user_channel_buffer.add(user_id, channel_id, joined=0, request_sent=1)
+
+    async def get_user_channel_status(self, user_id: int, channel_id: int):
+        """Foydalanuvchining kanal holatini olish"""
+        state = self.user_channel_buffer.overlay(user_id).get(channel_id)
+        row = await self._get_user_channel_status(user_id, channel_id)
+        if state is None:
+            return row
+        joined, request_sent, joined_at = state
+        row = row or {'id': None, 'user_id': user_id, 'channel_id': channel_id}
+        row.update(joined=joined, request_sent=request_sent, joined_at=joined_at)
+        return row
+
+    async def get_user_channels(self, user_id: int) -> List[Dict]:
+        rows = await self._get_user_channels(user_id)
+        overlay = self.user_channel_buffer.overlay(user_id)
+        if overlay:
+            for row in rows:
+                state = overlay.get(row['id'])
+                if state is not None:
+                    row['joined'] = state[0]
+        return rows
+
+    async def check_all_channels_joined(self, user_id: int) -> bool:
+        return (await self.check_all_channels_joined_real(user_id))['all_joined']
+
+    async def check_all_channels_joined_real(self, user_id: int) -> Dict:
+        """Foydalanuvchining haqiqiy kanal holatini tekshirish"""
+        overlay = self.user_channel_buffer.overlay(user_id)
+        if not overlay:
+            total, joined, pending = await self._count_user_channels(user_id)
+        else:
+            total = joined = pending = 0
+            for channel_id, row_joined, row_request_sent in await self._get_user_channel_states(user_id):
+                state = overlay.get(channel_id)
+                if state is not None:
+                    row_joined, row_request_sent = state[0], state[1]
+                total += 1
+                if row_joined == 1:
+                    joined += 1
+                elif row_request_sent == 1:
+                    pending += 1
+
+        return {
+            'total': total,
+            'joined': joined,
+            'pending': pending,
+            'not_joined': total - joined - pending,
+            'all_joined': total > 0 and joined == total
+        }
+
+    async def get_user_dashboard(self, user_id: int, campaign_id: int = None) -> Dict:
+        """Foydalanuvchi, kanallar bo'yicha holat va yig'ma sonlar - bitta so'rovda
+
+        Foydalanuvchi hali yo'q bo'lsa - kanallar `campaign_id` bo'yicha olinadi,
+        mavjud foydalanuvchi uchun esa faqat o'z kampaniyasi bo'yicha (`campaign_id`
+        e'tiborsiz - aks holda boshqa kampaniya kanallari uning keshiga tushadi).
+        """
+        version = self.user_index.version
+        rows = await self._get_user_dashboard_rows(user_id, campaign_id)
+        first = rows[0]
+
+        user = None
+        if first['telegram_id'] is not None:
+            user = {key: value for key, value in first.items() if key not in DASHBOARD_KEYS}
+            self.user_index.put(user, version)
+
+        channels = [
+            {
+                'id': row['ch_id'],
+                'channel_id': row['ch_channel_id'],
+                'channel_name': row['ch_name'],
+                'channel_link': row['ch_link'],
+                'joined': row['ch_joined'],
+                'request_sent': row['ch_request_sent'],
+            }
+            for row in rows if row['ch_id'] is not None
+        ]
+        total, joined, pending = first['ch_total'], first['ch_joined_total'] or 0, first['ch_pending_total'] or 0
+
+        # Hali yozilmagan holatlar bo'lsa - sonlarni qayta hisoblash
+        overlay = self.user_channel_buffer.overlay(user_id)
+        if overlay:
+            joined = pending = 0
+            for channel in channels:
+                state = overlay.get(channel['id'])
+                if state is not None:
+                    channel['joined'], channel['request_sent'] = state[0], state[1]
+                if channel['joined'] == 1:
+                    joined += 1
+                elif channel['request_sent'] == 1:
+                    pending += 1
+
+        return {
+            'user': user,
+            'channels': channels,
+            'total': total,
+            'joined': joined,
+            'pending': pending,
+            'not_joined': total - joined - pending,
+            'all_joined': total > 0 and joined == total
+        }
+
+    async def get_channel_states(self, user_ids: List[int]) -> Dict[int, Dict[int, Tuple[int, int]]]:
+        """Foydalanuvchilar bo'yicha {kanal id: (joined, request_sent)} (navbatdagilari bilan)"""
+        states: Dict[int, Dict[int, Tuple[int, int]]] = {user_id: {} for user_id in user_ids}
+        for user_id, channel_id, joined, request_sent in await self._get_channel_states(user_ids):
+            states[user_id][channel_id] = (joined, request_sent)
+        for user_id in user_ids:
+            for channel_id, state in self.user_channel_buffer.overlay(user_id).items():
+                states[user_id][channel_id] = (state[0], state[1])
+        return states
+
+    async def set_channel_states(self, rows: List[Tuple[int, int, int, int]]):
+        """(user_id, kanal id, joined, request_sent) holatlarini bitta tranzaksiyada yozish"""
+        for user_id, channel_id, joined, request_sent in rows:
+            self.user_channel_buffer.add(user_id, channel_id, joined=joined, request_sent=request_sent)
+        await self.user_channel_buffer.flush()
+
+    async def reset_user_channel_status(self, user_id: int):
+        """Foydalanuvchining barcha kanal holatini tozalash"""
+        self.user_channel_buffer.discard(user_id)
+        # Yozilayotgan holatlar o'chirishdan keyin qaytib kelmasligi uchun
+        await self.user_channel_buffer.flush()
+        await self._reset_user_channel_status(user_id)
+
+    @abstractmethod
+    async def _write_user_channels(self, rows: List[ChannelRow]):
+        """(user_id, channel_id, joined, request_sent, joined_at) qatorlarini bitta tranzaksiyada yozish"""
+
+    @abstractmethod
+    async def _get_user_channel_status(self, user_id: int, channel_id: int) -> Optional[Dict]: ...
+
+    @abstractmethod
+    async def _get_user_channels(self, user_id: int) -> List[Dict]: ...
+
+    @abstractmethod
+    async def _get_user_channel_states(self, user_id: int) -> List[Tuple[int, int, int]]:
+        """Aktiv kanallar bo'yicha (kanal id, joined, request_sent)"""
+
+    @abstractmethod
+    async def _count_user_channels(self, user_id: int) -> Tuple[int, int, int]:
+        """Aktiv kanallar bo'yicha (jami, qo'shilgan, kutilayotgan)"""
+
+    @abstractmethod
+    async def _reset_user_channel_status(self, user_id: int): ...
+
+    @abstractmethod
+    async def get_users_campaign_page(self, after_id: int, limit: int) -> List[Tuple[int, Optional[int]]]:
+        """Barcha foydalanuvchilar: (telegram_id, campaign_id) (telegram_id bo'yicha keyset)"""
+
+    @abstractmethod
+    async def _get_channel_states(self, user_ids: List[int]) -> List[Tuple[int, int, int, int]]:
+        """(user_id, kanal id, joined, request_sent) - berilgan foydalanuvchilar uchun"""
+
+    @abstractmethod
+    async def _get_user_dashboard_rows(self, user_id: int, campaign_id: int = None) -> List[Dict]:
+        """Kamida bitta qator: users.* + ch_* ustunlari (har bir aktiv kanal uchun)"""
+
+    # Content CRUD operatsiyalari (campaign_id None - standart content)
+    @abstractmethod
+    async def set_content(self, title: str, text_content: str,
+                          image_path: str = None, campaign_id: int = None): ...
+
+    @abstractmethod
+    async def set_invitation_image(self, image_path: str, campaign_id: int = None): ...
+
+    @abstractmethod
+    async def get_invitation_image(self, campaign_id: int = None) -> str:
+        """Kampaniya rasmi, bo'lmasa - standart content rasmi"""
+
+    @abstractmethod
+    async def get_active_content(self, campaign_id: int = None) -> Optional[Dict]:
+        """Kampaniya contenti, bo'lmasa - standart content"""
+
+    # Kampaniyalar
+    @abstractmethod
+    async def get_campaigns(self) -> List[Dict]: ...
+
+    @abstractmethod
+    async def save_campaign(self, slug: str, title: Optional[str],
+                            required_referrals: Optional[int],
+                            reward_link: Optional[str]) -> Dict:
+        """Kampaniyani yaratish yoki yangilash (slug bo'yicha)"""
+
+    # Statistika
+    @abstractmethod
+    async def get_stats(self) -> Dict: ...
+
+    @abstractmethod
+    async def get_completed_users(self) -> List[Dict]:
+        """Vazifani bajargan barcha foydalanuvchilarni olish"""
+
+    @abstractmethod
+    async def get_all_users(self) -> List[Dict]:
+        """Barcha foydalanuvchilarni olish"""
+
+    @abstractmethod
+    def iter_users_export(self, chunk_size: int = 1000) -> AsyncIterator[List[Tuple]]:
+        """Foydalanuvchilarni eksport uchun bo'laklab (keyset) olish"""
+
+    # Referral analitikasi
+    @abstractmethod
+    async def get_top_referrers(self, limit: int = 10) -> List[Dict]:
+        """To'g'ridan-to'g'ri referallar soni bo'yicha TOP"""
+
+    @abstractmethod
+    async def get_top_cascades(self, limit: int = 10) -> List[Dict]:
+        """Kaskad (barcha bosqichlar) hajmi bo'yicha TOP"""
+
+    @abstractmethod
+    async def get_referral_subtree(self, telegram_id: int) -> Dict:
+        """Foydalanuvchi kaskadining hajmi va chuqurligi"""
+
+    @abstractmethod
+    async def get_max_referral_depth(self) -> int: ...
+
+    @abstractmethod
+    async def get_viral_coefficients(self, days: int = 7) -> List[Dict]:
+        """Kunlik kogortalar bo'yicha viral koeffitsient (K = keltirilgan / yangi)"""
+
+    # Shubhali referallar
+    @abstractmethod
+    async def add_referral_hold(self, referrer_id: int, user_id: int,
+                                score: int, reasons: str) -> bool: ...
+
+    @abstractmethod
+    async def get_pending_holds(self, limit: int = 20) -> List[Dict]: ...
+
+    @abstractmethod
+    async def resolve_referral_hold(self, hold_id: int, approve: bool) -> Optional[Dict]:
+        """Kutilayotgan referalni tasdiqlash/rad etish (faqat bir marta)"""
+
+    @abstractmethod
+    async def explain_query(self, query: str, args: Sequence) -> List[str]:
+        """So'rov rejasi (bajarilmaydi) - qatorlar ro'yxati"""
+
+    # Bot holati
+    @abstractmethod
+    async def get_state(self, key: str) -> Optional[str]: ...
+
+    @abstractmethod
+    async def set_state(self, key: str, value: str): ...
+
+    # Xabar matnlari (admin o'zgartirgan - qolganlari standart)
+    @abstractmethod
+    async def get_templates(self) -> Dict[str, str]:
+        """{nom: matn} - faqat o'zgartirilganlari"""
+
+    @abstractmethod
+    async def set_template(self, name: str, body: str): ...
+
+    @abstractmethod
+    async def delete_template(self, name: str) -> bool:
+        """Standart matnga qaytarish"""
+
+    # Eslatmalar (har bir foydalanuvchiga har bir bosqich uchun bir marta)
+    @abstractmethod
+    async def get_reminder_candidates(self, stage: str, created_before: datetime,
+                                      after_id: int, limit: int) -> List[Tuple[int, Optional[int], int]]:
+        """FUNNEL_STAGES[stage] dagi, hali eslatilmagan (telegram_id, campaign_id, referral_count) lar
+
+        Vazifani bajarmagan foydalanuvchilar (users (completed_task, telegram_id) indeksi) bo'yicha keyset.
+        """
+
+    @abstractmethod
+    async def claim_reminders(self, stage: str, user_ids: List[int]) -> List[int]:
+        """Eslatmani band qilish - faqat avval band qilinmaganlari qaytariladi"""
+
+    @abstractmethod
+    async def release_reminder(self, stage: str, user_id: int):
+        """Yuborilmagan eslatma bandini bekor qilish (keyingi aylanishda qayta topiladi)"""
+
+    @abstractmethod
+    async def get_reminder_stats(self) -> Dict[str, int]:
+        """{bosqich: yuborilgan eslatmalar soni}"""
+
+    # Umumiy xabarlar (broadcast) - to'xtatilsa, kursordan davom ettiriladi
+    async def count_segment(self, segment: Segment) -> int:
+        """Segmentdagi foydalanuvchilar soni (yuborishdan oldin ko'rish uchun)"""
+        # joined_all/pending navbatdagi yozuvlarni ham hisobga olishi uchun
+        await self.flush_writes()
+        return await self._count_segment(segment)
+
+    @abstractmethod
+    async def _count_segment(self, segment: Segment) -> int: ...
+
+    @abstractmethod
+    async def get_user_ids_page(self, after_id: int, limit: int,
+                                segment: Segment = Segment()) -> List[int]:
+        """telegram_id bo'yicha keyset: `after_id` dan keyingi segment foydalanuvchilari"""
+
+    @abstractmethod
+    async def create_broadcast(self, admin_chat_id: int, text: Optional[str],
+                               photo: Optional[str], total: int, segment: str = "all",
+                               send_delay: float = None, source_chat_id: int = None,
+                               source_message_ids: str = None) -> Dict: ...
+
+    @abstractmethod
+    async def save_broadcast(self, broadcast: Dict):
+        """Holat, kursor, progress xabari va sanagichlarni saqlash (checkpoint)"""
+
+    @abstractmethod
+    async def get_unfinished_broadcasts(self) -> List[Dict]:
+        """Yakunlanmagan (running/paused) xabar yuborishlar"""
+
+    # Rejalashtirilgan xabar yuborishlar (vaqtlar - unix soniyalarda)
+    @abstractmethod
+    async def create_schedule(self, admin_chat_id: int, text: Optional[str], photo: Optional[str],
+                              segment: str, run_at: int, interval: int = None,
+                              spread: int = 0, source_chat_id: int = None,
+                              source_message_ids: str = None) -> Dict: ...
+
+    @abstractmethod
+    async def get_due_schedules(self, now: int) -> List[Dict]:
+        """Vaqti kelgan aktiv rejalar (run_at bo'yicha)"""
+
+    @abstractmethod
+    async def get_schedules(self) -> List[Dict]:
+        """Barcha aktiv rejalar"""
+
+    @abstractmethod
+    async def claim_schedule(self, schedule_id: int, run_at: int,
+                             next_run_at: Optional[int]) -> bool:
+        """Rejani ishga tushirish uchun band qilish (faqat run_at o'zgarmagan bo'lsa).
+
+        `next_run_at` None bo'lsa - reja yakunlanadi
+        """
+
+    @abstractmethod
+    async def release_schedule(self, schedule_id: int, run_at: int, claimed_run_at: int) -> bool:
+        """claim_schedule ni bekor qilish: reja yana `run_at` da aktiv bo'ladi
+        (faqat band qilingandan keyin o'zgarmagan bo'lsa)
+        """
+
+    @abstractmethod
+    async def set_schedule_broadcast(self, schedule_id: int, broadcast_id: int): ...
+
+    @abstractmethod
+    async def cancel_schedule(self, schedule_id: int) -> bool: ...
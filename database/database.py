@@ -1,16 +1,47 @@
 import aiosqlite
 import asyncio
+from contextlib import asynccontextmanager
 from config import settings
-from typing import Optional, List, Dict, Any
+from database import referrals
+from database.base import Storage
+from database.referral_codes import referral_codec
+from database.segments import (
+    FUNNEL_STAGES, USER_CAMPAIGN_CHANNEL_SQL, Segment, campaign_channel_sql, compile_segment
+)
+from database.tracing import TracedConnection
+from datetime import datetime
+from typing import Optional, List, Dict, Any, AsyncIterator, Sequence, Tuple
 
 
-class Database:
+class Database(Storage):
+    """SQLite (aiosqlite) ombori"""
+
     def __init__(self, db_path: str = settings.DATABASE_PATH):
+        super().__init__()
         self.db_path = db_path
 
-    async def init_db(self):
-        """Database va jadvallarni yaratish"""
-        async with aiosqlite.connect(self.db_path) as db:
+    @asynccontextmanager
+    async def _connect(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Ulanish (har bir metod uchun alohida) - vaqti query_stats'ga, so'rovlar tracer'ga yoziladi"""
+        started = self.query_stats.begin()
+        failed = False
+        try:
+            async with aiosqlite.connect(self.db_path) as db:
+                yield TracedConnection(db, self.tracer) if self.tracer else db
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self.query_stats.end(started, failed)
+
+    async def init_db(self) -> bool:
+        """Database va jadvallarni yaratish (faqat sxema versiyasi o'zgarganda)"""
+        async with self._connect() as db:
+            async with db.execute("PRAGMA user_version") as cursor:
+                version = (await cursor.fetchone())[0]
+            if version == self.SCHEMA_VERSION:
+                return False
+
             # Users jadvali
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS users (
@@ -23,6 +54,7 @@ class Database:
                     referred_by INTEGER,
                     completed_task INTEGER DEFAULT 0,
                     referral_count INTEGER DEFAULT 0,
+                    campaign_id INTEGER,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
@@ -35,6 +67,7 @@ class Database:
                     channel_name TEXT NOT NULL,
                     channel_link TEXT,
                     is_active INTEGER DEFAULT 1,
+                    campaign_id INTEGER,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
@@ -60,6 +93,24 @@ class Database:
                 # Ustun allaqachon mavjud yoki boshqa xato
                 pass
 
+            # (user_id, channel_id) juftligi yagona bo'lishi kerak - aks holda
+            # INSERT OR REPLACE dublikat qatorlar yaratadi
+            async with db.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_user_channels_unique'"
+            ) as cursor:
+                has_unique_index = await cursor.fetchone()
+            if not has_unique_index:
+                await db.execute("""
+                    DELETE FROM user_channels WHERE id NOT IN (
+                        SELECT MAX(id) FROM user_channels GROUP BY user_id, channel_id
+                    )
+                """)
+                await db.execute("DROP INDEX IF EXISTS idx_user_channels_user")
+                await db.execute("""
+                    CREATE UNIQUE INDEX idx_user_channels_unique
+                    ON user_channels (user_id, channel_id)
+                """)
+
             # Content jadvali
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS content (
@@ -69,34 +120,210 @@ class Database:
                     image_path TEXT,
                     invitation_image TEXT,
                     is_active INTEGER DEFAULT 1,
+                    campaign_id INTEGER,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
 
+            # Shubhali referallar (admin tekshiruvi uchun)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS referral_holds (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    referrer_id INTEGER NOT NULL,
+                    user_id INTEGER UNIQUE NOT NULL,
+                    score INTEGER NOT NULL,
+                    reasons TEXT,
+                    status TEXT DEFAULT 'pending',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_referral_holds_status
+                ON referral_holds (status, id)
+            """)
+
+            # Hisoblangan referallar - har bir foydalanuvchi faqat bir marta
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS referral_credits (
+                    user_id INTEGER PRIMARY KEY,
+                    referrer_id INTEGER NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            # Mavjud referallar allaqachon hisoblangan (kutilayotgan/rad etilganlardan tashqari)
+            await db.execute("""
+                INSERT OR IGNORE INTO referral_credits (user_id, referrer_id, created_at)
+                SELECT telegram_id, referred_by, created_at FROM users
+                WHERE referred_by IS NOT NULL AND telegram_id NOT IN (
+                    SELECT user_id FROM referral_holds WHERE status != 'approved'
+                )
+            """)
+
+            # Bot holati (kalit-qiymat)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS bot_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+            # Umumiy xabar yuborishlar (to'xtatilsa - last_user_id dan davom etadi)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS broadcasts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    admin_chat_id INTEGER NOT NULL,
+                    progress_message_id INTEGER,
+                    text TEXT,
+                    photo TEXT,
+                    segment TEXT DEFAULT 'all',
+                    send_delay REAL,
+                    source_chat_id INTEGER,
+                    source_message_ids TEXT,
+                    status TEXT DEFAULT 'running',
+                    total INTEGER DEFAULT 0,
+                    last_user_id INTEGER DEFAULT 0,
+                    processed INTEGER DEFAULT 0,
+                    sent INTEGER DEFAULT 0,
+                    blocked INTEGER DEFAULT 0,
+                    deleted INTEGER DEFAULT 0,
+                    deactivated INTEGER DEFAULT 0,
+                    other INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_broadcasts_status
+                ON broadcasts (status)
+            """)
+            try:
+                await db.execute("ALTER TABLE broadcasts ADD COLUMN segment TEXT DEFAULT 'all'")
+            except aiosqlite.OperationalError:
+                # Ustun allaqachon mavjud
+                pass
+
+            try:
+                await db.execute("ALTER TABLE broadcasts ADD COLUMN send_delay REAL")
+            except aiosqlite.OperationalError:
+                # Ustun allaqachon mavjud
+                pass
+
+            # Rejalashtirilgan (bir martalik yoki takroriy) xabar yuborishlar
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS scheduled_broadcasts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    admin_chat_id INTEGER NOT NULL,
+                    text TEXT,
+                    photo TEXT,
+                    segment TEXT DEFAULT 'all',
+                    run_at INTEGER NOT NULL,
+                    interval_seconds INTEGER,
+                    spread_seconds INTEGER DEFAULT 0,
+                    source_chat_id INTEGER,
+                    source_message_ids TEXT,
+                    status TEXT DEFAULT 'active',
+                    last_broadcast_id INTEGER,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_scheduled_broadcasts_due
+                ON scheduled_broadcasts (status, run_at)
+            """)
+
+            # Admin xabaridan nusxa (copy_message) - albom, video, hujjat va h.k.
+            for table in ("broadcasts", "scheduled_broadcasts"):
+                for column in ("source_chat_id INTEGER", "source_message_ids TEXT"):
+                    try:
+                        await db.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+                    except aiosqlite.OperationalError:
+                        # Ustun allaqachon mavjud
+                        pass
+
+            # Segment filtrlari uchun indekslar (referral_count - referrals.py da)
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_users_created_at ON users (created_at)
+            """)
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_users_completed
+                ON users (completed_task, telegram_id)
+            """)
+
+            # Kampaniyalar: users/channels/content.campaign_id NULL - standart kampaniya
+            # (kanallar uchun - barcha kampaniyalarga umumiy)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS campaigns (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    slug TEXT UNIQUE NOT NULL,
+                    title TEXT,
+                    required_referrals INTEGER,
+                    reward_link TEXT,
+                    is_active INTEGER DEFAULT 1,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            for table in ("users", "channels", "content"):
+                try:
+                    await db.execute(f"ALTER TABLE {table} ADD COLUMN campaign_id INTEGER")
+                except aiosqlite.OperationalError:
+                    # Ustun allaqachon mavjud
+                    pass
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_users_campaign
+                ON users (campaign_id, telegram_id)
+            """)
+
+            # Admin o'zgartirgan xabar matnlari
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS templates (
+                    name TEXT PRIMARY KEY,
+                    body TEXT NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+            # Yuborilgan eslatmalar (foydalanuvchi + bosqich bo'yicha bir marta)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS reminders (
+                    user_id INTEGER NOT NULL,
+                    stage TEXT NOT NULL,
+                    sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (user_id, stage)
+                )
+            """)
+
+            # Referral analitikasi jadvallari
+            await referrals.create_schema(db, rebuild=version < self.REFERRALS_REBUILD_VERSION)
+
+            await db.execute(f"PRAGMA user_version = {int(self.SCHEMA_VERSION)}")
             await db.commit()
+            return True
 
     # User CRUD operatsiyalari
-    async def create_user(self, telegram_id: int, username: str,
-                          first_name: str, last_name: str,
-                          referred_by: int = None) -> Optional[Dict]:
-        import uuid
-        referral_code = str(uuid.uuid4())[:8]
-
-        async with aiosqlite.connect(self.db_path) as db:
+    async def _create_user(self, telegram_id: int, username: str,
+                           first_name: str, last_name: str,
+                           referred_by: int = None, campaign_id: int = None) -> Optional[Dict]:
+        async with self._connect() as db:
             try:
-                await db.execute("""
+                # Kod users.id dan olinadi: avval vaqtinchalik (telegram_id bo'yicha unique) qiymat
+                cursor = await db.execute("""
                     INSERT INTO users (telegram_id, username, first_name, 
-                                     last_name, referral_code, referred_by)
-                    VALUES (?, ?, ?, ?, ?, ?)
+                                     last_name, referral_code, referred_by, campaign_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
                 """, (telegram_id, username, first_name, last_name,
-                      referral_code, referred_by))
+                      f"#{telegram_id}", referred_by, campaign_id))
+                await db.execute("""
+                    UPDATE users SET referral_code = ? WHERE id = ?
+                """, (referral_codec.encode(cursor.lastrowid), cursor.lastrowid))
+                await referrals.record_signup(db)
                 await db.commit()
-                return await self.get_user(telegram_id)
+                return await self._get_user(telegram_id)
             except aiosqlite.IntegrityError:
                 return None
 
-    async def get_user(self, telegram_id: int) -> Optional[Dict]:
-        async with aiosqlite.connect(self.db_path) as db:
+    async def _get_user(self, telegram_id: int) -> Optional[Dict]:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             async with db.execute(
                     "SELECT * FROM users WHERE telegram_id = ?", (telegram_id,)
@@ -104,8 +331,17 @@ class Database:
                 row = await cursor.fetchone()
                 return dict(row) if row else None
 
-    async def get_user_by_referral(self, referral_code: str) -> Optional[Dict]:
-        async with aiosqlite.connect(self.db_path) as db:
+    async def _get_user_by_id(self, user_id: int) -> Optional[Dict]:
+        async with self._connect() as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute(
+                    "SELECT * FROM users WHERE id = ?", (user_id,)
+            ) as cursor:
+                row = await cursor.fetchone()
+                return dict(row) if row else None
+
+    async def _get_user_by_referral(self, referral_code: str) -> Optional[Dict]:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             async with db.execute(
                     "SELECT * FROM users WHERE referral_code = ?", (referral_code,)
@@ -113,37 +349,71 @@ class Database:
                 row = await cursor.fetchone()
                 return dict(row) if row else None
 
-    async def update_referral_count(self, telegram_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
+    async def _add_referral_credit(self, referrer_id: int, user_id: int) -> Optional[int]:
+        async with self._connect() as db:
+            cursor = await db.execute("""
+                INSERT OR IGNORE INTO referral_credits (user_id, referrer_id)
+                VALUES (?, ?)
+            """, (user_id, referrer_id))
+            if cursor.rowcount != 1:
+                return None
+
             await db.execute("""
                 UPDATE users SET referral_count = referral_count + 1 
                 WHERE telegram_id = ?
-            """, (telegram_id,))
+            """, (referrer_id,))
+            await referrals.record_referral(db, user_id, referrer_id)
+            async with db.execute(
+                    "SELECT referral_count FROM users WHERE telegram_id = ?", (referrer_id,)
+            ) as cursor:
+                row = await cursor.fetchone()
             await db.commit()
+            return row[0] if row else None
 
-    async def complete_task(self, telegram_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                UPDATE users SET completed_task = 1 WHERE telegram_id = ?
+    async def _complete_task(self, telegram_id: int) -> bool:
+        async with self._connect() as db:
+            cursor = await db.execute("""
+                UPDATE users SET completed_task = 1
+                WHERE telegram_id = ? AND completed_task = 0
             """, (telegram_id,))
             await db.commit()
+            return cursor.rowcount > 0
 
     # Channel CRUD operatsiyalari
     async def add_channel(self, channel_id: str, channel_name: str,
                           channel_link: str = None) -> bool:
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             try:
                 await db.execute("""
                     INSERT INTO channels (channel_id, channel_name, channel_link)
                     VALUES (?, ?, ?)
                 """, (channel_id, channel_name, channel_link))
                 await db.commit()
+                self.channels_version += 1
                 return True
             except aiosqlite.IntegrityError:
                 return False
 
+    async def add_channels(self, channels: List[tuple]) -> int:
+        """Ko'p kanallarni bitta tranzaksiyada qo'shish/yangilash"""
+        if not channels:
+            return 0
+        async with self._connect() as db:
+            before = db.total_changes
+            await db.executemany("""
+                INSERT INTO channels (channel_id, channel_name, channel_link)
+                VALUES (?, ?, ?)
+                ON CONFLICT(channel_id) DO UPDATE SET
+                    channel_name = excluded.channel_name,
+                    channel_link = excluded.channel_link,
+                    is_active = 1
+            """, channels)
+            await db.commit()
+            self.channels_version += 1
+            return db.total_changes - before
+
     async def get_active_channels(self) -> List[Dict]:
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             async with db.execute(
                     "SELECT * FROM channels WHERE is_active = 1"
@@ -151,47 +421,61 @@ class Database:
                 rows = await cursor.fetchall()
                 return [dict(row) for row in rows]
 
+    async def get_campaign_channels(self, campaign_id: Optional[int]) -> List[Dict]:
+        async with self._connect() as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute("""
+                SELECT * FROM channels
+                WHERE is_active = 1 AND (campaign_id IS NULL OR campaign_id = ?)
+            """, (campaign_id,)) as cursor:
+                rows = await cursor.fetchall()
+                return [dict(row) for row in rows]
+
+    async def set_channel_campaign(self, channel_id: str, campaign_id: Optional[int]) -> bool:
+        async with self._connect() as db:
+            cursor = await db.execute(
+                "UPDATE channels SET campaign_id = ? WHERE channel_id = ? AND is_active = 1",
+                (campaign_id, channel_id)
+            )
+            await db.commit()
+            self.channels_version += 1
+            return cursor.rowcount > 0
+
     async def remove_channel(self, channel_id: str) -> bool:
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             cursor = await db.execute(
                 "UPDATE channels SET is_active = 0 WHERE channel_id = ?",
                 (channel_id,)
             )
             await db.commit()
+            self.channels_version += 1
             return cursor.rowcount > 0
 
     async def remove_all_channels(self) -> int:
         """Barcha kanallarni o'chirish"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             cursor = await db.execute(
                 "UPDATE channels SET is_active = 0 WHERE is_active = 1"
             )
             await db.commit()
+            self.channels_version += 1
             return cursor.rowcount
 
     # User-Channel bog'lanish
-    async def join_channel(self, user_id: int, channel_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                INSERT OR REPLACE INTO user_channels 
-                (user_id, channel_id, joined, joined_at)
-                VALUES (?, ?, 1, CURRENT_TIMESTAMP)
-            """, (user_id, channel_id))
-            await db.commit()
-
-    async def set_request_sent(self, user_id: int, channel_id: int):
-        """Request yuborgan holatini belgilash"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                INSERT OR REPLACE INTO user_channels 
+    async def _write_user_channels(self, rows: List[tuple]):
+        async with self._connect() as db:
+            await db.executemany("""
+                INSERT OR REPLACE INTO user_channels
                 (user_id, channel_id, joined, request_sent, joined_at)
-                VALUES (?, ?, 0, 1, CURRENT_TIMESTAMP)
-            """, (user_id, channel_id))
+                VALUES (?, ?, ?, ?, ?)
+            """, [
+                (user_id, channel_id, joined, request_sent, joined_at.strftime('%Y-%m-%d %H:%M:%S'))
+                for user_id, channel_id, joined, request_sent, joined_at in rows
+            ])
             await db.commit()
 
-    async def get_user_channel_status(self, user_id: int, channel_id: int):
-        """Foydalanuvchining kanal holatini olish"""
-        async with aiosqlite.connect(self.db_path) as db:
+    async def _get_user_channel_status(self, user_id: int, channel_id: int):
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             async with db.execute("""
                 SELECT * FROM user_channels 
@@ -200,51 +484,49 @@ class Database:
                 row = await cursor.fetchone()
                 return dict(row) if row else None
 
-    async def get_user_channels(self, user_id: int) -> List[Dict]:
-        async with aiosqlite.connect(self.db_path) as db:
+    async def _get_user_channels(self, user_id: int) -> List[Dict]:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
-            async with db.execute("""
+            async with db.execute(f"""
                 SELECT c.*, uc.joined FROM channels c
                 LEFT JOIN user_channels uc ON c.id = uc.channel_id 
                 AND uc.user_id = ?
-                WHERE c.is_active = 1
-            """, (user_id,)) as cursor:
+                WHERE c.is_active = 1 AND {campaign_channel_sql('?')}
+            """, (user_id, user_id)) as cursor:
                 rows = await cursor.fetchall()
                 return [dict(row) for row in rows]
 
-    async def check_all_channels_joined(self, user_id: int) -> bool:
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute("""
-                SELECT COUNT(*) as total,
-                       SUM(CASE WHEN uc.joined = 1 THEN 1 ELSE 0 END) as joined
+    async def _get_user_channel_states(self, user_id: int) -> List[Tuple[int, int, int]]:
+        async with self._connect() as db:
+            async with db.execute(f"""
+                SELECT c.id, COALESCE(uc.joined, 0), COALESCE(uc.request_sent, 0)
                 FROM channels c
-                LEFT JOIN user_channels uc ON c.id = uc.channel_id 
-                AND uc.user_id = ?
-                WHERE c.is_active = 1
-            """, (user_id,)) as cursor:
-                row = await cursor.fetchone()
-                total, joined = row
-                return total > 0 and total == joined
+                LEFT JOIN user_channels uc ON c.id = uc.channel_id AND uc.user_id = ?
+                WHERE c.is_active = 1 AND {campaign_channel_sql('?')}
+            """, (user_id, user_id)) as cursor:
+                return await cursor.fetchall()
 
     # Content CRUD operatsiyalari
     async def set_content(self, title: str, text_content: str,
-                          image_path: str = None):
-        async with aiosqlite.connect(self.db_path) as db:
-            # Avvalgi contentni deaktiv qilish
-            await db.execute("UPDATE content SET is_active = 0")
+                          image_path: str = None, campaign_id: int = None):
+        async with self._connect() as db:
+            # Avvalgi contentni deaktiv qilish (shu kampaniyada)
+            await db.execute("UPDATE content SET is_active = 0 WHERE campaign_id IS ?", (campaign_id,))
 
             # Yangi content qo'shish
             await db.execute("""
-                INSERT INTO content (title, text_content, image_path)
-                VALUES (?, ?, ?)
-            """, (title, text_content, image_path))
+                INSERT INTO content (title, text_content, image_path, campaign_id)
+                VALUES (?, ?, ?, ?)
+            """, (title, text_content, image_path, campaign_id))
             await db.commit()
+            self.content_version += 1
 
-    async def set_invitation_image(self, image_path: str):
-        async with aiosqlite.connect(self.db_path) as db:
+    async def set_invitation_image(self, image_path: str, campaign_id: int = None):
+        async with self._connect() as db:
             # Avvalgi contentni olish
             async with db.execute(
-                    "SELECT * FROM content WHERE is_active = 1 ORDER BY created_at DESC LIMIT 1"
+                    "SELECT * FROM content WHERE is_active = 1 AND campaign_id IS ? ORDER BY created_at DESC LIMIT 1",
+                    (campaign_id,)
             ) as cursor:
                 row = await cursor.fetchone()
 
@@ -256,32 +538,67 @@ class Database:
             else:
                 # Yangi content yaratish
                 await db.execute("""
-                    INSERT INTO content (title, text_content, invitation_image)
-                    VALUES (?, ?, ?)
-                """, ("Bepul Darsliklar", "", image_path))
+                    INSERT INTO content (title, text_content, invitation_image, campaign_id)
+                    VALUES (?, ?, ?, ?)
+                """, ("Bepul Darsliklar", "", image_path, campaign_id))
 
             await db.commit()
+            self.content_version += 1
 
-    async def get_invitation_image(self) -> str:
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute(
-                    "SELECT invitation_image FROM content WHERE is_active = 1 AND invitation_image IS NOT NULL ORDER BY created_at DESC LIMIT 1"
-            ) as cursor:
+    async def get_invitation_image(self, campaign_id: int = None) -> str:
+        # Kampaniyaniki bo'lmasa - standart content
+        async with self._connect() as db:
+            async with db.execute("""
+                SELECT invitation_image FROM content
+                WHERE is_active = 1 AND invitation_image IS NOT NULL
+                AND (campaign_id IS NULL OR campaign_id = ?)
+                ORDER BY campaign_id IS NULL, created_at DESC LIMIT 1
+            """, (campaign_id,)) as cursor:
                 row = await cursor.fetchone()
                 return row[0] if row else None
 
-    async def get_active_content(self) -> Optional[Dict]:
-        async with aiosqlite.connect(self.db_path) as db:
+    async def get_active_content(self, campaign_id: int = None) -> Optional[Dict]:
+        # Kampaniyaniki bo'lmasa - standart content
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
-            async with db.execute(
-                    "SELECT * FROM content WHERE is_active = 1 ORDER BY created_at DESC LIMIT 1"
-            ) as cursor:
+            async with db.execute("""
+                SELECT * FROM content
+                WHERE is_active = 1 AND (campaign_id IS NULL OR campaign_id = ?)
+                ORDER BY campaign_id IS NULL, created_at DESC LIMIT 1
+            """, (campaign_id,)) as cursor:
                 row = await cursor.fetchone()
                 return dict(row) if row else None
 
+    # Kampaniyalar
+    async def get_campaigns(self) -> List[Dict]:
+        async with self._connect() as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute("SELECT * FROM campaigns ORDER BY id") as cursor:
+                rows = await cursor.fetchall()
+                return [dict(row) for row in rows]
+
+    async def save_campaign(self, slug: str, title: Optional[str],
+                            required_referrals: Optional[int],
+                            reward_link: Optional[str]) -> Dict:
+        # None berilgan maydonlar o'zgarmaydi
+        async with self._connect() as db:
+            db.row_factory = aiosqlite.Row
+            await db.execute("""
+                INSERT INTO campaigns (slug, title, required_referrals, reward_link)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(slug) DO UPDATE SET
+                    title = COALESCE(excluded.title, title),
+                    required_referrals = COALESCE(excluded.required_referrals, required_referrals),
+                    reward_link = COALESCE(excluded.reward_link, reward_link)
+            """, (slug, title, required_referrals, reward_link))
+            await db.commit()
+            self.campaigns_version += 1
+            async with db.execute("SELECT * FROM campaigns WHERE slug = ?", (slug,)) as cursor:
+                return dict(await cursor.fetchone())
+
     # Statistika
     async def get_stats(self) -> Dict:
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             stats = {}
 
             # Jami foydalanuvchilar
@@ -304,7 +621,7 @@ class Database:
 
     async def get_completed_users(self) -> List[Dict]:
         """Vazifani bajargan barcha foydalanuvchilarni olish"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             async with db.execute("""
                     SELECT telegram_id, username, first_name, last_name, 
@@ -318,7 +635,7 @@ class Database:
 
     async def get_all_users(self) -> List[Dict]:
         """Barcha foydalanuvchilarni olish"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             async with db.execute("""
                 SELECT telegram_id, username, first_name, last_name, 
@@ -329,50 +646,460 @@ class Database:
                 rows = await cursor.fetchall()
                 return [dict(row) for row in rows]
 
-    async def check_all_channels_joined_real(self, user_id: int) -> Dict:
-        """Foydalanuvchining haqiqiy kanal holatini tekshirish"""
-        async with aiosqlite.connect(self.db_path) as db:
+    async def iter_users_export(self, chunk_size: int = 1000) -> AsyncIterator[List[Tuple]]:
+        """Foydalanuvchilarni eksport uchun bo'laklab (keyset) olish"""
+        await self.flush_writes()
+        last_id = None
+        async with self._connect() as db:
+            while True:
+                async with db.execute(f"""
+                    SELECT u.telegram_id, u.username, u.first_name, u.last_name,
+                           u.referral_code, u.referred_by, u.referral_count,
+                           u.completed_task,
+                           (SELECT COUNT(*) FROM user_channels uc
+                            JOIN channels c ON c.id = uc.channel_id AND c.is_active = 1
+                            WHERE uc.user_id = u.telegram_id AND uc.joined = 1
+                            AND {USER_CAMPAIGN_CHANNEL_SQL}),
+                           (SELECT COUNT(*) FROM user_channels uc
+                            JOIN channels c ON c.id = uc.channel_id AND c.is_active = 1
+                            WHERE uc.user_id = u.telegram_id
+                            AND uc.request_sent = 1 AND uc.joined = 0
+                            AND {USER_CAMPAIGN_CHANNEL_SQL}),
+                           (SELECT COUNT(*) FROM channels c
+                            WHERE c.is_active = 1 AND {USER_CAMPAIGN_CHANNEL_SQL}),
+                           u.created_at
+                    FROM users u
+                    WHERE ? IS NULL OR u.telegram_id > ?
+                    ORDER BY u.telegram_id
+                    LIMIT ?
+                """, (last_id, last_id, chunk_size)) as cursor:
+                    rows = await cursor.fetchall()
+
+                if not rows:
+                    return
+                yield rows
+                last_id = rows[-1][0]
+
+    async def _get_user_dashboard_rows(self, user_id: int, campaign_id: int = None) -> List[Dict]:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
+            async with db.execute("""
+                SELECT u.*,
+                       c.id AS ch_id, c.channel_id AS ch_channel_id,
+                       c.channel_name AS ch_name, c.channel_link AS ch_link,
+                       COALESCE(uc.joined, 0) AS ch_joined,
+                       COALESCE(uc.request_sent, 0) AS ch_request_sent,
+                       COUNT(c.id) OVER () AS ch_total,
+                       SUM(CASE WHEN uc.joined = 1 THEN 1 ELSE 0 END) OVER () AS ch_joined_total,
+                       SUM(CASE WHEN uc.request_sent = 1 AND uc.joined = 0 THEN 1 ELSE 0 END)
+                           OVER () AS ch_pending_total
+                FROM (SELECT 1) AS one
+                LEFT JOIN users u ON u.telegram_id = ?
+                LEFT JOIN channels c ON c.is_active = 1
+                    AND (c.campaign_id IS NULL OR c.campaign_id =
+                         CASE WHEN u.telegram_id IS NULL THEN ? ELSE u.campaign_id END)
+                LEFT JOIN user_channels uc ON uc.channel_id = c.id AND uc.user_id = ?
+                ORDER BY c.id
+            """, (user_id, campaign_id, user_id)) as cursor:
+                rows = await cursor.fetchall()
+                return [dict(row) for row in rows]
 
-            # Barcha aktiv kanallar
-            async with db.execute(
-                    "SELECT COUNT(*) as total FROM channels WHERE is_active = 1"
-            ) as cursor:
-                total_channels = (await cursor.fetchone())[0]
+    async def _count_user_channels(self, user_id: int) -> Tuple[int, int, int]:
+        async with self._connect() as db:
+            # Jami / qo'shilgan / request yuborgan aktiv kanallar - bitta so'rovda
+            async with db.execute(f"""
+                SELECT COUNT(*),
+                       COALESCE(SUM(CASE WHEN uc.joined = 1 THEN 1 ELSE 0 END), 0),
+                       COALESCE(SUM(CASE WHEN uc.request_sent = 1 AND uc.joined = 0
+                                         THEN 1 ELSE 0 END), 0)
+                FROM channels c
+                LEFT JOIN user_channels uc ON c.id = uc.channel_id AND uc.user_id = ?
+                WHERE c.is_active = 1 AND {campaign_channel_sql('?')}
+            """, (user_id, user_id)) as cursor:
+                return tuple(await cursor.fetchone())
 
-            # Haqiqatan qo'shilgan kanallar (joined = 1)
+    # Referral analitikasi
+    async def get_top_referrers(self, limit: int = 10) -> List[Dict]:
+        """To'g'ridan-to'g'ri referallar soni bo'yicha TOP"""
+        async with self._connect() as db:
+            db.row_factory = aiosqlite.Row
             async with db.execute("""
-                SELECT COUNT(*) as joined FROM user_channels uc
-                JOIN channels c ON uc.channel_id = c.id
-                WHERE uc.user_id = ? AND c.is_active = 1 AND uc.joined = 1
-            """, (user_id,)) as cursor:
-                joined_channels = (await cursor.fetchone())[0]
+                SELECT telegram_id, username, first_name, referral_count
+                FROM users WHERE referral_count > 0
+                ORDER BY referral_count DESC LIMIT ?
+            """, (limit,)) as cursor:
+                rows = await cursor.fetchall()
+                return [dict(row) for row in rows]
 
-            # Request yuborgan kanallar (request_sent = 1, joined = 0)
+    async def get_top_cascades(self, limit: int = 10) -> List[Dict]:
+        """Kaskad (barcha bosqichlar) hajmi bo'yicha TOP"""
+        async with self._connect() as db:
+            db.row_factory = aiosqlite.Row
             async with db.execute("""
-                SELECT COUNT(*) as pending FROM user_channels uc
-                JOIN channels c ON uc.channel_id = c.id
-                WHERE uc.user_id = ? AND c.is_active = 1 
-                AND uc.request_sent = 1 AND uc.joined = 0
-            """, (user_id,)) as cursor:
-                pending_channels = (await cursor.fetchone())[0]
+                SELECT s.ancestor AS telegram_id, u.username, u.first_name,
+                       s.size, s.max_depth
+                FROM referral_subtree s
+                LEFT JOIN users u ON u.telegram_id = s.ancestor
+                ORDER BY s.size DESC LIMIT ?
+            """, (limit,)) as cursor:
+                rows = await cursor.fetchall()
+                return [dict(row) for row in rows]
 
+    async def get_referral_subtree(self, telegram_id: int) -> Dict:
+        """Foydalanuvchi kaskadining hajmi va chuqurligi"""
+        async with self._connect() as db:
+            async with db.execute(
+                    "SELECT size, max_depth FROM referral_subtree WHERE ancestor = ?",
+                    (telegram_id,)
+            ) as cursor:
+                row = await cursor.fetchone()
+            async with db.execute(
+                    "SELECT MAX(depth) FROM referral_closure WHERE descendant = ?",
+                    (telegram_id,)
+            ) as cursor:
+                level = (await cursor.fetchone())[0]
             return {
-                'total': total_channels,
-                'joined': joined_channels,
-                'pending': pending_channels,
-                'not_joined': total_channels - joined_channels - pending_channels,
-                'all_joined': total_channels > 0 and joined_channels == total_channels
+                'size': row[0] if row else 0,
+                'max_depth': row[1] if row else 0,
+                'level': level or 0
             }
 
-    async def reset_user_channel_status(self, user_id: int):
-        """Foydalanuvchining barcha kanal holatini tozalash"""
+    async def get_max_referral_depth(self) -> int:
+        async with self._connect() as db:
+            async with db.execute("SELECT MAX(max_depth) FROM referral_subtree") as cursor:
+                return (await cursor.fetchone())[0] or 0
+
+    async def get_viral_coefficients(self, days: int = 7) -> List[Dict]:
+        """Kunlik kogortalar bo'yicha viral koeffitsient (K = keltirilgan / yangi)"""
+        async with self._connect() as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute("""
+                SELECT day, new_users, referred_users, referrals_made
+                FROM referral_daily ORDER BY day DESC LIMIT ?
+            """, (days,)) as cursor:
+                rows = await cursor.fetchall()
+            return [
+                dict(row, k=row['referrals_made'] / row['new_users'] if row['new_users'] else 0.0)
+                for row in rows
+            ]
+
+    # Shubhali referallar
+    async def add_referral_hold(self, referrer_id: int, user_id: int,
+                                score: int, reasons: str) -> bool:
+        async with self._connect() as db:
+            try:
+                await db.execute("""
+                    INSERT INTO referral_holds (referrer_id, user_id, score, reasons)
+                    VALUES (?, ?, ?, ?)
+                """, (referrer_id, user_id, score, reasons))
+                await db.commit()
+                return True
+            except aiosqlite.IntegrityError:
+                return False
+
+    async def get_pending_holds(self, limit: int = 20) -> List[Dict]:
+        async with self._connect() as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute("""
+                SELECT * FROM referral_holds WHERE status = 'pending'
+                ORDER BY id LIMIT ?
+            """, (limit,)) as cursor:
+                rows = await cursor.fetchall()
+                return [dict(row) for row in rows]
+
+    async def resolve_referral_hold(self, hold_id: int, approve: bool) -> Optional[Dict]:
+        """Kutilayotgan referalni tasdiqlash/rad etish (faqat bir marta)"""
+        async with self._connect() as db:
+            db.row_factory = aiosqlite.Row
+            cursor = await db.execute("""
+                UPDATE referral_holds SET status = ?
+                WHERE id = ? AND status = 'pending'
+            """, ('approved' if approve else 'rejected', hold_id))
+            if cursor.rowcount == 0:
+                return None
+            await db.commit()
+            async with db.execute(
+                    "SELECT * FROM referral_holds WHERE id = ?", (hold_id,)
+            ) as cursor:
+                row = await cursor.fetchone()
+                return dict(row) if row else None
+
+    # Bot holati
+    async def explain_query(self, query: str, args: Sequence) -> List[str]:
+        # Kuzatuvsiz ulanish - EXPLAIN statistikaga qo'shilmaydi
         async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute("EXPLAIN QUERY PLAN " + query, args) as cursor:
+                return [row[3] for row in await cursor.fetchall()]
+
+    async def get_state(self, key: str) -> Optional[str]:
+        async with self._connect() as db:
+            async with db.execute(
+                    "SELECT value FROM bot_state WHERE key = ?", (key,)
+            ) as cursor:
+                row = await cursor.fetchone()
+                return row[0] if row else None
+
+    async def set_state(self, key: str, value: str):
+        async with self._connect() as db:
+            await db.execute("""
+                INSERT INTO bot_state (key, value, updated_at)
+                VALUES (?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(key) DO UPDATE SET
+                    value = excluded.value,
+                    updated_at = excluded.updated_at
+            """, (key, value))
+            await db.commit()
+
+    # Xabar matnlari
+    async def get_templates(self) -> Dict[str, str]:
+        async with self._connect() as db:
+            async with db.execute("SELECT name, body FROM templates") as cursor:
+                return dict(await cursor.fetchall())
+
+    async def set_template(self, name: str, body: str):
+        async with self._connect() as db:
+            await db.execute("""
+                INSERT INTO templates (name, body, updated_at)
+                VALUES (?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(name) DO UPDATE SET
+                    body = excluded.body,
+                    updated_at = excluded.updated_at
+            """, (name, body))
+            await db.commit()
+            self.templates_version += 1
+
+    async def delete_template(self, name: str) -> bool:
+        async with self._connect() as db:
+            cursor = await db.execute("DELETE FROM templates WHERE name = ?", (name,))
+            await db.commit()
+            self.templates_version += 1
+            return cursor.rowcount > 0
+
+    # Eslatmalar
+    async def get_reminder_candidates(self, stage: str, created_before: datetime,
+                                      after_id: int, limit: int) -> List[Tuple[int, Optional[int], int]]:
+        async with self._connect() as db:
+            async with db.execute(f"""
+                SELECT u.telegram_id, u.campaign_id, u.referral_count FROM users u
+                WHERE u.completed_task = 0 AND u.telegram_id > ? AND u.created_at < ?
+                AND NOT EXISTS (
+                    SELECT 1 FROM reminders r WHERE r.user_id = u.telegram_id AND r.stage = ?
+                )
+                AND {FUNNEL_STAGES[stage]}
+                ORDER BY u.telegram_id LIMIT ?
+            """, (after_id, created_before.strftime('%Y-%m-%d %H:%M:%S'), stage, limit)) as cursor:
+                return [tuple(row) for row in await cursor.fetchall()]
+
+    async def claim_reminders(self, stage: str, user_ids: List[int]) -> List[int]:
+        claimed = []
+        async with self._connect() as db:
+            for user_id in user_ids:
+                cursor = await db.execute(
+                    "INSERT OR IGNORE INTO reminders (user_id, stage) VALUES (?, ?)", (user_id, stage)
+                )
+                if cursor.rowcount > 0:
+                    claimed.append(user_id)
+            await db.commit()
+        return claimed
+
+    async def release_reminder(self, stage: str, user_id: int):
+        async with self._connect() as db:
+            await db.execute(
+                "DELETE FROM reminders WHERE user_id = ? AND stage = ?", (user_id, stage)
+            )
+            await db.commit()
+
+    async def get_reminder_stats(self) -> Dict[str, int]:
+        async with self._connect() as db:
+            async with db.execute("SELECT stage, COUNT(*) FROM reminders GROUP BY stage") as cursor:
+                return dict(await cursor.fetchall())
+
+    # Umumiy xabarlar
+    def _compile_segment(self, segment: Segment) -> Tuple[str, List]:
+        where, params = compile_segment(segment, lambda index: '?')
+        # created_at matn sifatida saqlanadi ('YYYY-MM-DD HH:MM:SS')
+        return where, [
+            value.strftime('%Y-%m-%d %H:%M:%S') if isinstance(value, datetime) else value
+            for value in params
+        ]
+
+    async def _count_segment(self, segment: Segment) -> int:
+        where, params = self._compile_segment(segment)
+        async with self._connect() as db:
+            async with db.execute(f"SELECT COUNT(*) FROM users u WHERE {where}", params) as cursor:
+                return (await cursor.fetchone())[0]
+
+    async def get_user_ids_page(self, after_id: int, limit: int,
+                                segment: Segment = Segment()) -> List[int]:
+        """telegram_id bo'yicha keyset: `after_id` dan keyingi segment foydalanuvchilari"""
+        where, params = self._compile_segment(segment)
+        async with self._connect() as db:
+            async with db.execute(f"""
+                SELECT u.telegram_id FROM users u
+                WHERE u.telegram_id > ? AND {where}
+                ORDER BY u.telegram_id LIMIT ?
+            """, (after_id, *params, limit)) as cursor:
+                return [row[0] for row in await cursor.fetchall()]
+
+    async def create_broadcast(self, admin_chat_id: int, text: Optional[str],
+                               photo: Optional[str], total: int, segment: str = "all",
+                               send_delay: float = None, source_chat_id: int = None,
+                               source_message_ids: str = None) -> Dict:
+        async with self._connect() as db:
+            db.row_factory = aiosqlite.Row
+            cursor = await db.execute("""
+                INSERT INTO broadcasts
+                (admin_chat_id, text, photo, total, segment, send_delay,
+                 source_chat_id, source_message_ids)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (admin_chat_id, text, photo, total, segment, send_delay,
+                  source_chat_id, source_message_ids))
+            async with db.execute(
+                    "SELECT * FROM broadcasts WHERE id = ?", (cursor.lastrowid,)
+            ) as cursor:
+                row = await cursor.fetchone()
+            await db.commit()
+            return dict(row)
+
+    async def save_broadcast(self, broadcast: Dict):
+        """Holat, kursor, progress xabari va sanagichlarni saqlash (checkpoint)"""
+        async with self._connect() as db:
+            await db.execute(f"""
+                UPDATE broadcasts SET
+                    status = ?, last_user_id = ?, progress_message_id = ?,
+                    {', '.join(f'{name} = ?' for name in self.BROADCAST_COUNTERS)},
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (
+                broadcast['status'], broadcast['last_user_id'], broadcast['progress_message_id'],
+                *(broadcast[name] for name in self.BROADCAST_COUNTERS), broadcast['id']
+            ))
+            await db.commit()
+
+    async def get_unfinished_broadcasts(self) -> List[Dict]:
+        async with self._connect() as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute("""
+                SELECT * FROM broadcasts WHERE status IN ('running', 'paused')
+                ORDER BY id
+            """) as cursor:
+                rows = await cursor.fetchall()
+                return [dict(row) for row in rows]
+
+    # Rejalashtirilgan xabar yuborishlar
+    async def create_schedule(self, admin_chat_id: int, text: Optional[str], photo: Optional[str],
+                              segment: str, run_at: int, interval: int = None,
+                              spread: int = 0, source_chat_id: int = None,
+                              source_message_ids: str = None) -> Dict:
+        async with self._connect() as db:
+            db.row_factory = aiosqlite.Row
+            cursor = await db.execute("""
+                INSERT INTO scheduled_broadcasts
+                (admin_chat_id, text, photo, segment, run_at, interval_seconds, spread_seconds,
+                 source_chat_id, source_message_ids)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (admin_chat_id, text, photo, segment, run_at, interval, spread,
+                  source_chat_id, source_message_ids))
+            async with db.execute(
+                    "SELECT * FROM scheduled_broadcasts WHERE id = ?", (cursor.lastrowid,)
+            ) as cursor:
+                row = await cursor.fetchone()
+            await db.commit()
+            return dict(row)
+
+    async def get_due_schedules(self, now: int) -> List[Dict]:
+        """Vaqti kelgan aktiv rejalar (run_at bo'yicha)"""
+        async with self._connect() as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute("""
+                SELECT * FROM scheduled_broadcasts
+                WHERE status = 'active' AND run_at <= ?
+                ORDER BY run_at, id
+            """, (now,)) as cursor:
+                rows = await cursor.fetchall()
+                return [dict(row) for row in rows]
+
+    async def get_schedules(self) -> List[Dict]:
+        async with self._connect() as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute("""
+                SELECT * FROM scheduled_broadcasts WHERE status = 'active'
+                ORDER BY run_at, id
+            """) as cursor:
+                rows = await cursor.fetchall()
+                return [dict(row) for row in rows]
+
+    async def claim_schedule(self, schedule_id: int, run_at: int,
+                             next_run_at: Optional[int]) -> bool:
+        async with self._connect() as db:
+            cursor = await db.execute("""
+                UPDATE scheduled_broadcasts SET run_at = ?, status = ?
+                WHERE id = ? AND run_at = ? AND status = 'active'
+            """, (next_run_at if next_run_at is not None else run_at,
+                  'active' if next_run_at is not None else 'done', schedule_id, run_at))
+            await db.commit()
+            return cursor.rowcount > 0
+
+    async def release_schedule(self, schedule_id: int, run_at: int, claimed_run_at: int) -> bool:
+        async with self._connect() as db:
+            cursor = await db.execute("""
+                UPDATE scheduled_broadcasts SET run_at = ?, status = 'active'
+                WHERE id = ? AND run_at = ? AND status IN ('active', 'done')
+            """, (run_at, schedule_id, claimed_run_at))
+            await db.commit()
+            return cursor.rowcount > 0
+
+    async def set_schedule_broadcast(self, schedule_id: int, broadcast_id: int):
+        async with self._connect() as db:
+            await db.execute("""
+                UPDATE scheduled_broadcasts SET last_broadcast_id = ? WHERE id = ?
+            """, (broadcast_id, schedule_id))
+            await db.commit()
+
+    async def cancel_schedule(self, schedule_id: int) -> bool:
+        async with self._connect() as db:
+            cursor = await db.execute("""
+                UPDATE scheduled_broadcasts SET status = 'cancelled'
+                WHERE id = ? AND status = 'active'
+            """, (schedule_id,))
+            await db.commit()
+            return cursor.rowcount > 0
+
+    async def _reset_user_channel_status(self, user_id: int):
+        async with self._connect() as db:
             await db.execute("""
                 DELETE FROM user_channels WHERE user_id = ?
             """, (user_id,))
             await db.commit()
 
+    async def get_users_campaign_page(self, after_id: int, limit: int) -> List[Tuple[int, Optional[int]]]:
+        # telegram_id unique indeksi bo'yicha
+        async with self._connect() as db:
+            async with db.execute("""
+                SELECT telegram_id, campaign_id FROM users
+                WHERE telegram_id > ?
+                ORDER BY telegram_id LIMIT ?
+            """, (after_id, limit)) as cursor:
+                return [tuple(row) for row in await cursor.fetchall()]
+
+    async def _get_channel_states(self, user_ids: List[int]) -> List[Tuple[int, int, int, int]]:
+        if not user_ids:
+            return []
+        async with self._connect() as db:
+            async with db.execute(f"""
+                SELECT user_id, channel_id, joined, request_sent FROM user_channels
+                WHERE user_id IN ({', '.join('?' * len(user_ids))})
+            """, user_ids) as cursor:
+                return [tuple(row) for row in await cursor.fetchall()]
+
+
+def create_database(url: str) -> Storage:
+    """URL bo'yicha omborni tanlash: postgresql://... yoki SQLite fayl yo'li"""
+    if url.startswith(("postgres://", "postgresql://")):
+        from database.postgres import PostgresDatabase
+        return PostgresDatabase(url)
+    return Database(url)
+
 
 # Singleton pattern uchun
-db = Database()
\ No newline at end of file
+db = create_database(settings.DATABASE_URL or settings.DATABASE_PATH)
\ No newline at end of file
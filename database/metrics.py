@@ -0,0 +1,55 @@
+import time
+from collections import deque
+from typing import Deque, Dict
+
+# Kechikish foizliklari shuncha oxirgi so'rov bo'yicha
+LATENCY_WINDOW = 1000
+
+
+class QueryStats:
+    """Database so'rovlari sanagichlari: soni, xatolar, kechikish, band ulanishlar"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.count = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        # Hozir ochiq (SQLite) ulanishlar
+        self.active = 0
+        self.peak_active = 0
+        self._recent: Deque[float] = deque(maxlen=window)
+
+    def begin(self) -> float:
+        self.active += 1
+        if self.active > self.peak_active:
+            self.peak_active = self.active
+        return time.perf_counter()
+
+    def end(self, started: float, failed: bool = False):
+        self.active -= 1
+        self.record(time.perf_counter() - started, failed)
+
+    def record(self, elapsed: float, failed: bool = False):
+        self.count += 1
+        self.total_time += elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+        if failed:
+            self.errors += 1
+        self._recent.append(elapsed)
+
+    def snapshot(self) -> Dict[str, float]:
+        """Sanagichlar; vaqtlar millisekundda (p50/p95 - oxirgi so'rovlar bo'yicha)"""
+        recent = sorted(self._recent)
+
+        def percentile(q: float) -> float:
+            return recent[min(int(len(recent) * q), len(recent) - 1)] * 1000 if recent else 0.0
+
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'avg_ms': self.total_time / self.count * 1000 if self.count else 0.0,
+            'p50_ms': percentile(0.5),
+            'p95_ms': percentile(0.95),
+            'max_ms': self.max_time * 1000,
+        }
@@ -0,0 +1,997 @@
+from datetime import datetime
+from typing import Optional, List, Dict, AsyncIterator, Sequence, Tuple
+
+import asyncpg
+
+from config import settings
+from database.base import Storage
+from database.referral_codes import referral_codec
+from database.segments import (
+    FUNNEL_STAGES, USER_CAMPAIGN_CHANNEL_SQL, Segment, campaign_channel_sql, compile_segment
+)
+
+# Sxema versiyasi bot_state jadvalida saqlanadi
+SCHEMA_VERSION_KEY = "schema_version"
+# asyncpg pul reset so'rovining oxiri (SELECT pg_advisory_unlock_all(); ... RESET ALL;)
+RESET_QUERY_SUFFIX = "RESET ALL;"
+EXPLAIN_PREFIX = "EXPLAIN "
+
+# asyncpg har bir ulanishda so'rovlarni prepare qilib keshlaydi
+# (statement_cache_size) - bir xil SQL qayta parse qilinmaydi.
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id BIGSERIAL PRIMARY KEY,
+        telegram_id BIGINT UNIQUE NOT NULL,
+        username TEXT,
+        first_name TEXT,
+        last_name TEXT,
+        referral_code TEXT UNIQUE NOT NULL,
+        referred_by BIGINT,
+        completed_task INTEGER DEFAULT 0,
+        referral_count INTEGER DEFAULT 0,
+        campaign_id INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS channels (
+        id SERIAL PRIMARY KEY,
+        channel_id TEXT UNIQUE NOT NULL,
+        channel_name TEXT NOT NULL,
+        channel_link TEXT,
+        is_active INTEGER DEFAULT 1,
+        campaign_id INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_channels (
+        id BIGSERIAL PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        channel_id INTEGER NOT NULL REFERENCES channels (id),
+        joined INTEGER DEFAULT 0,
+        request_sent INTEGER DEFAULT 0,
+        joined_at TIMESTAMP,
+        UNIQUE (user_id, channel_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS content (
+        id SERIAL PRIMARY KEY,
+        title TEXT,
+        text_content TEXT,
+        image_path TEXT,
+        invitation_image TEXT,
+        is_active INTEGER DEFAULT 1,
+        campaign_id INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS referral_holds (
+        id SERIAL PRIMARY KEY,
+        referrer_id BIGINT NOT NULL,
+        user_id BIGINT UNIQUE NOT NULL,
+        score INTEGER NOT NULL,
+        reasons TEXT,
+        status TEXT DEFAULT 'pending',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_referral_holds_status ON referral_holds (status, id)",
+    """
+    CREATE TABLE IF NOT EXISTS referral_credits (
+        user_id BIGINT PRIMARY KEY,
+        referrer_id BIGINT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Mavjud referallar allaqachon hisoblangan (kutilayotgan/rad etilganlardan tashqari)
+    """
+    INSERT INTO referral_credits (user_id, referrer_id, created_at)
+    SELECT telegram_id, referred_by, created_at FROM users
+    WHERE referred_by IS NOT NULL AND telegram_id NOT IN (
+        SELECT user_id FROM referral_holds WHERE status != 'approved'
+    )
+    ON CONFLICT (user_id) DO NOTHING
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS bot_state (
+        key TEXT PRIMARY KEY,
+        value TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS broadcasts (
+        id SERIAL PRIMARY KEY,
+        admin_chat_id BIGINT NOT NULL,
+        progress_message_id BIGINT,
+        text TEXT,
+        photo TEXT,
+        segment TEXT DEFAULT 'all',
+        send_delay REAL,
+        source_chat_id BIGINT,
+        source_message_ids TEXT,
+        status TEXT DEFAULT 'running',
+        total INTEGER DEFAULT 0,
+        last_user_id BIGINT DEFAULT 0,
+        processed INTEGER DEFAULT 0,
+        sent INTEGER DEFAULT 0,
+        blocked INTEGER DEFAULT 0,
+        deleted INTEGER DEFAULT 0,
+        deactivated INTEGER DEFAULT 0,
+        other INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_broadcasts_status ON broadcasts (status)",
+    "ALTER TABLE broadcasts ADD COLUMN IF NOT EXISTS segment TEXT DEFAULT 'all'",
+    "ALTER TABLE broadcasts ADD COLUMN IF NOT EXISTS send_delay REAL",
+    # Rejalashtirilgan (bir martalik yoki takroriy) xabar yuborishlar
+    """
+    CREATE TABLE IF NOT EXISTS scheduled_broadcasts (
+        id SERIAL PRIMARY KEY,
+        admin_chat_id BIGINT NOT NULL,
+        text TEXT,
+        photo TEXT,
+        segment TEXT DEFAULT 'all',
+        run_at BIGINT NOT NULL,
+        interval_seconds INTEGER,
+        spread_seconds INTEGER DEFAULT 0,
+        source_chat_id BIGINT,
+        source_message_ids TEXT,
+        status TEXT DEFAULT 'active',
+        last_broadcast_id INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_scheduled_broadcasts_due ON scheduled_broadcasts (status, run_at)",
+    # Admin xabaridan nusxa (copy_message) - albom, video, hujjat va h.k.
+    "ALTER TABLE broadcasts ADD COLUMN IF NOT EXISTS source_chat_id BIGINT",
+    "ALTER TABLE broadcasts ADD COLUMN IF NOT EXISTS source_message_ids TEXT",
+    "ALTER TABLE scheduled_broadcasts ADD COLUMN IF NOT EXISTS source_chat_id BIGINT",
+    "ALTER TABLE scheduled_broadcasts ADD COLUMN IF NOT EXISTS source_message_ids TEXT",
+    # Segment filtrlari uchun indekslar
+    "CREATE INDEX IF NOT EXISTS idx_users_created_at ON users (created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_users_completed ON users (completed_task, telegram_id)",
+    # Kampaniyalar: users/channels/content.campaign_id NULL - standart kampaniya
+    # (kanallar uchun - barcha kampaniyalarga umumiy)
+    """
+    CREATE TABLE IF NOT EXISTS campaigns (
+        id SERIAL PRIMARY KEY,
+        slug TEXT UNIQUE NOT NULL,
+        title TEXT,
+        required_referrals INTEGER,
+        reward_link TEXT,
+        is_active INTEGER DEFAULT 1,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS campaign_id INTEGER",
+    "ALTER TABLE channels ADD COLUMN IF NOT EXISTS campaign_id INTEGER",
+    "ALTER TABLE content ADD COLUMN IF NOT EXISTS campaign_id INTEGER",
+    "CREATE INDEX IF NOT EXISTS idx_users_campaign ON users (campaign_id, telegram_id)",
+    # Admin o'zgartirgan xabar matnlari
+    """
+    CREATE TABLE IF NOT EXISTS templates (
+        name TEXT PRIMARY KEY,
+        body TEXT NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Yuborilgan eslatmalar (foydalanuvchi + bosqich bo'yicha bir marta)
+    """
+    CREATE TABLE IF NOT EXISTS reminders (
+        user_id BIGINT NOT NULL,
+        stage TEXT NOT NULL,
+        sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, stage)
+    )
+    """,
+    # Referral analitikasi (database/referrals.py bilan bir xil tuzilma)
+    """
+    CREATE TABLE IF NOT EXISTS referral_closure (
+        ancestor BIGINT NOT NULL,
+        descendant BIGINT NOT NULL,
+        depth INTEGER NOT NULL,
+        PRIMARY KEY (ancestor, descendant)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_referral_closure_descendant ON referral_closure (descendant)",
+    """
+    CREATE TABLE IF NOT EXISTS referral_subtree (
+        ancestor BIGINT PRIMARY KEY,
+        size INTEGER NOT NULL DEFAULT 0,
+        max_depth INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_referral_subtree_size ON referral_subtree (size)",
+    "CREATE INDEX IF NOT EXISTS idx_referral_subtree_depth ON referral_subtree (max_depth)",
+    """
+    CREATE TABLE IF NOT EXISTS referral_daily (
+        day DATE PRIMARY KEY,
+        new_users INTEGER NOT NULL DEFAULT 0,
+        referred_users INTEGER NOT NULL DEFAULT 0,
+        referrals_made INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_users_referral_count ON users (referral_count)",
+    "CREATE INDEX IF NOT EXISTS idx_users_referred_by ON users (referred_by)",
+]
+
+
+def _rowcount(status: str) -> int:
+    """asyncpg holat satridan ('UPDATE 3') qatorlar sonini olish"""
+    try:
+        return int(status.split()[-1])
+    except (ValueError, IndexError):
+        return 0
+
+
+class PostgresDatabase(Storage):
+    """PostgreSQL (asyncpg) ombori - ulanishlar puli bilan"""
+
+    def __init__(self, dsn: str):
+        super().__init__()
+        self.dsn = dsn
+        self.pool: Optional[asyncpg.Pool] = None
+
+    async def _get_pool(self) -> asyncpg.Pool:
+        if self.pool is None:
+            self.pool = await asyncpg.create_pool(
+                self.dsn,
+                min_size=settings.DB_POOL_MIN_SIZE,
+                max_size=settings.DB_POOL_MAX_SIZE,
+                init=self._init_connection
+            )
+        return self.pool
+
+    async def _init_connection(self, conn: asyncpg.Connection):
+        # Har bir so'rov vaqti query_stats'ga yoziladi
+        conn.add_query_logger(self._log_query)
+
+    def _log_query(self, record: asyncpg.connection.LoggedQuery):
+        # Pul ulanishni qaytarishda yuboradigan reset so'rovi sanalmaydi
+        if not record.args and record.query.endswith(RESET_QUERY_SUFFIX):
+            return
+        self.query_stats.record(record.elapsed, record.exception is not None)
+        # Logger keyinroq (call_soon) chaqiriladi - chaqiruv joyi va qatorlar soni noma'lum
+        if self.tracer and not record.query.startswith(EXPLAIN_PREFIX):
+            self.tracer.record(record.query, record.args, record.elapsed)
+
+    def pool_usage(self) -> Tuple[int, Optional[int]]:
+        if self.pool is None:
+            return 0, settings.DB_POOL_MAX_SIZE
+        return self.pool.get_size() - self.pool.get_idle_size(), self.pool.get_max_size()
+
+    async def _fetchrow(self, query: str, *args) -> Optional[Dict]:
+        pool = await self._get_pool()
+        row = await pool.fetchrow(query, *args)
+        return dict(row) if row else None
+
+    async def _fetch(self, query: str, *args) -> List[Dict]:
+        pool = await self._get_pool()
+        rows = await pool.fetch(query, *args)
+        return [dict(row) for row in rows]
+
+    async def _fetchval(self, query: str, *args):
+        pool = await self._get_pool()
+        return await pool.fetchval(query, *args)
+
+    async def _execute(self, query: str, *args) -> str:
+        pool = await self._get_pool()
+        return await pool.execute(query, *args)
+
+    async def init_db(self) -> bool:
+        """Database va jadvallarni yaratish (faqat sxema versiyasi o'zgarganda)"""
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            version = None
+            if await conn.fetchval("SELECT to_regclass('bot_state')") is not None:
+                version = await conn.fetchval(
+                    "SELECT value FROM bot_state WHERE key = $1", SCHEMA_VERSION_KEY
+                )
+                if version == str(self.SCHEMA_VERSION):
+                    return False
+            rebuild = int(version or 0) < self.REFERRALS_REBUILD_VERSION
+
+            async with conn.transaction():
+                for statement in SCHEMA:
+                    await conn.execute(statement)
+
+                initialized = await conn.fetchval("SELECT 1 FROM referral_daily LIMIT 1")
+                has_users = await conn.fetchval("SELECT 1 FROM users LIMIT 1")
+                if (rebuild or not initialized) and has_users:
+                    await self._backfill_referrals(conn)
+
+                await conn.execute("""
+                    INSERT INTO bot_state (key, value, updated_at)
+                    VALUES ($1, $2, CURRENT_TIMESTAMP)
+                    ON CONFLICT (key) DO UPDATE SET
+                        value = EXCLUDED.value,
+                        updated_at = EXCLUDED.updated_at
+                """, SCHEMA_VERSION_KEY, str(self.SCHEMA_VERSION))
+            return True
+
+    async def _close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    # User CRUD operatsiyalari
+    async def _create_user(self, telegram_id: int, username: str,
+                           first_name: str, last_name: str,
+                           referred_by: int = None, campaign_id: int = None) -> Optional[Dict]:
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            try:
+                async with conn.transaction():
+                    # Kod users.id dan olinadi: avval vaqtinchalik (telegram_id bo'yicha unique) qiymat
+                    user_id = await conn.fetchval("""
+                        INSERT INTO users (telegram_id, username, first_name,
+                                           last_name, referral_code, referred_by, campaign_id)
+                        VALUES ($1, $2, $3, $4, $5, $6, $7)
+                        RETURNING id
+                    """, telegram_id, username, first_name, last_name,
+                        f"#{telegram_id}", referred_by, campaign_id)
+                    row = await conn.fetchrow("""
+                        UPDATE users SET referral_code = $1 WHERE id = $2
+                        RETURNING *
+                    """, referral_codec.encode(user_id), user_id)
+                    await self._record_signup(conn)
+                    return dict(row)
+            except asyncpg.UniqueViolationError:
+                return None
+
+    async def _get_user(self, telegram_id: int) -> Optional[Dict]:
+        return await self._fetchrow("SELECT * FROM users WHERE telegram_id = $1", telegram_id)
+
+    async def _get_user_by_id(self, user_id: int) -> Optional[Dict]:
+        return await self._fetchrow("SELECT * FROM users WHERE id = $1", user_id)
+
+    async def _get_user_by_referral(self, referral_code: str) -> Optional[Dict]:
+        return await self._fetchrow("SELECT * FROM users WHERE referral_code = $1", referral_code)
+
+    async def _add_referral_credit(self, referrer_id: int, user_id: int) -> Optional[int]:
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                referral_count = await conn.fetchval("""
+                    WITH credit AS (
+                        INSERT INTO referral_credits (user_id, referrer_id)
+                        VALUES ($1, $2)
+                        ON CONFLICT (user_id) DO NOTHING
+                        RETURNING referrer_id
+                    )
+                    UPDATE users SET referral_count = referral_count + 1
+                    WHERE telegram_id = (SELECT referrer_id FROM credit)
+                    RETURNING referral_count
+                """, user_id, referrer_id)
+                if referral_count is not None:
+                    await self._record_referral(conn, user_id, referrer_id)
+                return referral_count
+
+    async def _complete_task(self, telegram_id: int) -> bool:
+        status = await self._execute(
+            "UPDATE users SET completed_task = 1 WHERE telegram_id = $1 AND completed_task = 0",
+            telegram_id
+        )
+        return _rowcount(status) > 0
+
+    # Channel CRUD operatsiyalari
+    async def add_channel(self, channel_id: str, channel_name: str,
+                          channel_link: str = None) -> bool:
+        try:
+            await self._execute("""
+                INSERT INTO channels (channel_id, channel_name, channel_link)
+                VALUES ($1, $2, $3)
+            """, channel_id, channel_name, channel_link)
+        except asyncpg.UniqueViolationError:
+            return False
+        self.channels_version += 1
+        return True
+
+    async def add_channels(self, channels: List[tuple]) -> int:
+        """Ko'p kanallarni bitta tranzaksiyada qo'shish/yangilash"""
+        if not channels:
+            return 0
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.executemany("""
+                    INSERT INTO channels (channel_id, channel_name, channel_link)
+                    VALUES ($1, $2, $3)
+                    ON CONFLICT (channel_id) DO UPDATE SET
+                        channel_name = EXCLUDED.channel_name,
+                        channel_link = EXCLUDED.channel_link,
+                        is_active = 1
+                """, channels)
+        self.channels_version += 1
+        return len(channels)
+
+    async def get_active_channels(self) -> List[Dict]:
+        return await self._fetch("SELECT * FROM channels WHERE is_active = 1 ORDER BY id")
+
+    async def get_campaign_channels(self, campaign_id: Optional[int]) -> List[Dict]:
+        return await self._fetch("""
+            SELECT * FROM channels
+            WHERE is_active = 1 AND (campaign_id IS NULL OR campaign_id = $1)
+            ORDER BY id
+        """, campaign_id)
+
+    async def set_channel_campaign(self, channel_id: str, campaign_id: Optional[int]) -> bool:
+        status = await self._execute(
+            "UPDATE channels SET campaign_id = $1 WHERE channel_id = $2 AND is_active = 1",
+            campaign_id, channel_id
+        )
+        self.channels_version += 1
+        return _rowcount(status) > 0
+
+    async def remove_channel(self, channel_id: str) -> bool:
+        status = await self._execute(
+            "UPDATE channels SET is_active = 0 WHERE channel_id = $1", channel_id
+        )
+        self.channels_version += 1
+        return _rowcount(status) > 0
+
+    async def remove_all_channels(self) -> int:
+        """Barcha kanallarni o'chirish"""
+        status = await self._execute("UPDATE channels SET is_active = 0 WHERE is_active = 1")
+        self.channels_version += 1
+        return _rowcount(status)
+
+    # User-Channel bog'lanish
+    async def _write_user_channels(self, rows: List[tuple]):
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.executemany("""
+                    INSERT INTO user_channels (user_id, channel_id, joined, request_sent, joined_at)
+                    VALUES ($1, $2, $3, $4, $5)
+                    ON CONFLICT (user_id, channel_id) DO UPDATE SET
+                        joined = EXCLUDED.joined,
+                        request_sent = EXCLUDED.request_sent,
+                        joined_at = EXCLUDED.joined_at
+                """, rows)
+
+    async def _get_user_channel_status(self, user_id: int, channel_id: int):
+        return await self._fetchrow("""
+            SELECT * FROM user_channels WHERE user_id = $1 AND channel_id = $2
+        """, user_id, channel_id)
+
+    async def _get_user_channels(self, user_id: int) -> List[Dict]:
+        return await self._fetch(f"""
+            SELECT c.*, uc.joined FROM channels c
+            LEFT JOIN user_channels uc ON c.id = uc.channel_id
+            AND uc.user_id = $1
+            WHERE c.is_active = 1 AND {campaign_channel_sql('$1')}
+            ORDER BY c.id
+        """, user_id)
+
+    async def _get_user_channel_states(self, user_id: int) -> List[Tuple[int, int, int]]:
+        pool = await self._get_pool()
+        rows = await pool.fetch(f"""
+            SELECT c.id, COALESCE(uc.joined, 0), COALESCE(uc.request_sent, 0)
+            FROM channels c
+            LEFT JOIN user_channels uc ON c.id = uc.channel_id AND uc.user_id = $1
+            WHERE c.is_active = 1 AND {campaign_channel_sql('$1')}
+        """, user_id)
+        return [tuple(row) for row in rows]
+
+    async def _get_user_dashboard_rows(self, user_id: int, campaign_id: int = None) -> List[Dict]:
+        return await self._fetch("""
+            SELECT u.*,
+                   c.id AS ch_id, c.channel_id AS ch_channel_id,
+                   c.channel_name AS ch_name, c.channel_link AS ch_link,
+                   COALESCE(uc.joined, 0) AS ch_joined,
+                   COALESCE(uc.request_sent, 0) AS ch_request_sent,
+                   COUNT(c.id) OVER () AS ch_total,
+                   SUM(CASE WHEN uc.joined = 1 THEN 1 ELSE 0 END) OVER () AS ch_joined_total,
+                   SUM(CASE WHEN uc.request_sent = 1 AND uc.joined = 0 THEN 1 ELSE 0 END)
+                       OVER () AS ch_pending_total
+            FROM (SELECT 1) AS one
+            LEFT JOIN users u ON u.telegram_id = $1
+            LEFT JOIN channels c ON c.is_active = 1
+                AND (c.campaign_id IS NULL OR c.campaign_id =
+                     CASE WHEN u.telegram_id IS NULL THEN $2::INTEGER ELSE u.campaign_id END)
+            LEFT JOIN user_channels uc ON uc.channel_id = c.id AND uc.user_id = $1
+            ORDER BY c.id
+        """, user_id, campaign_id)
+
+    async def _count_user_channels(self, user_id: int) -> Tuple[int, int, int]:
+        pool = await self._get_pool()
+        row = await pool.fetchrow(f"""
+            SELECT COUNT(*),
+                   COUNT(*) FILTER (WHERE uc.joined = 1),
+                   COUNT(*) FILTER (WHERE uc.request_sent = 1 AND uc.joined = 0)
+            FROM channels c
+            LEFT JOIN user_channels uc ON c.id = uc.channel_id AND uc.user_id = $1
+            WHERE c.is_active = 1 AND {campaign_channel_sql('$1')}
+        """, user_id)
+        return tuple(row)
+
+    async def _reset_user_channel_status(self, user_id: int):
+        await self._execute("DELETE FROM user_channels WHERE user_id = $1", user_id)
+
+    async def get_users_campaign_page(self, after_id: int, limit: int) -> List[Tuple[int, Optional[int]]]:
+        # telegram_id unique indeksi bo'yicha
+        pool = await self._get_pool()
+        rows = await pool.fetch("""
+            SELECT telegram_id, campaign_id FROM users
+            WHERE telegram_id > $1
+            ORDER BY telegram_id LIMIT $2
+        """, after_id, limit)
+        return [tuple(row) for row in rows]
+
+    async def _get_channel_states(self, user_ids: List[int]) -> List[Tuple[int, int, int, int]]:
+        if not user_ids:
+            return []
+        pool = await self._get_pool()
+        rows = await pool.fetch("""
+            SELECT user_id, channel_id, joined, request_sent FROM user_channels
+            WHERE user_id = ANY($1::bigint[])
+        """, user_ids)
+        return [tuple(row) for row in rows]
+
+    # Content CRUD operatsiyalari
+    async def set_content(self, title: str, text_content: str,
+                          image_path: str = None, campaign_id: int = None):
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                # Avvalgi contentni deaktiv qilish (shu kampaniyada)
+                await conn.execute(
+                    "UPDATE content SET is_active = 0 WHERE campaign_id IS NOT DISTINCT FROM $1::INTEGER",
+                    campaign_id
+                )
+                await conn.execute("""
+                    INSERT INTO content (title, text_content, image_path, campaign_id)
+                    VALUES ($1, $2, $3, $4)
+                """, title, text_content, image_path, campaign_id)
+        self.content_version += 1
+
+    async def set_invitation_image(self, image_path: str, campaign_id: int = None):
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                content_id = await conn.fetchval("""
+                    SELECT id FROM content
+                    WHERE is_active = 1 AND campaign_id IS NOT DISTINCT FROM $1::INTEGER
+                    ORDER BY created_at DESC LIMIT 1
+                """, campaign_id)
+                if content_id:
+                    await conn.execute(
+                        "UPDATE content SET invitation_image = $1 WHERE id = $2",
+                        image_path, content_id
+                    )
+                else:
+                    await conn.execute("""
+                        INSERT INTO content (title, text_content, invitation_image, campaign_id)
+                        VALUES ($1, $2, $3, $4)
+                    """, "Bepul Darsliklar", "", image_path, campaign_id)
+        self.content_version += 1
+
+    async def get_invitation_image(self, campaign_id: int = None) -> str:
+        # Kampaniyaniki bo'lmasa - standart content
+        return await self._fetchval("""
+            SELECT invitation_image FROM content
+            WHERE is_active = 1 AND invitation_image IS NOT NULL
+            AND (campaign_id IS NULL OR campaign_id = $1)
+            ORDER BY campaign_id IS NULL, created_at DESC LIMIT 1
+        """, campaign_id)
+
+    async def get_active_content(self, campaign_id: int = None) -> Optional[Dict]:
+        # Kampaniyaniki bo'lmasa - standart content
+        return await self._fetchrow("""
+            SELECT * FROM content
+            WHERE is_active = 1 AND (campaign_id IS NULL OR campaign_id = $1)
+            ORDER BY campaign_id IS NULL, created_at DESC LIMIT 1
+        """, campaign_id)
+
+    # Kampaniyalar
+    async def get_campaigns(self) -> List[Dict]:
+        return await self._fetch("SELECT * FROM campaigns ORDER BY id")
+
+    async def save_campaign(self, slug: str, title: Optional[str],
+                            required_referrals: Optional[int],
+                            reward_link: Optional[str]) -> Dict:
+        # None berilgan maydonlar o'zgarmaydi
+        row = await self._fetchrow("""
+            INSERT INTO campaigns (slug, title, required_referrals, reward_link)
+            VALUES ($1, $2, $3, $4)
+            ON CONFLICT (slug) DO UPDATE SET
+                title = COALESCE(EXCLUDED.title, campaigns.title),
+                required_referrals = COALESCE(EXCLUDED.required_referrals, campaigns.required_referrals),
+                reward_link = COALESCE(EXCLUDED.reward_link, campaigns.reward_link)
+            RETURNING *
+        """, slug, title, required_referrals, reward_link)
+        self.campaigns_version += 1
+        return row
+
+    # Statistika
+    async def get_stats(self) -> Dict:
+        return await self._fetchrow("""
+            SELECT (SELECT COUNT(*) FROM users) AS total_users,
+                   (SELECT COUNT(*) FROM users WHERE completed_task = 1) AS completed_users,
+                   (SELECT COUNT(*) FROM channels WHERE is_active = 1) AS active_channels
+        """)
+
+    async def get_completed_users(self) -> List[Dict]:
+        """Vazifani bajargan barcha foydalanuvchilarni olish"""
+        return await self._fetch("""
+            SELECT telegram_id, username, first_name, last_name,
+                   referral_count, completed_task, created_at
+            FROM users
+            WHERE completed_task = 1
+            ORDER BY created_at DESC
+        """)
+
+    async def get_all_users(self) -> List[Dict]:
+        """Barcha foydalanuvchilarni olish"""
+        return await self._fetch("""
+            SELECT telegram_id, username, first_name, last_name,
+                   referral_count, completed_task, created_at
+            FROM users
+            ORDER BY created_at DESC
+        """)
+
+    async def iter_users_export(self, chunk_size: int = 1000) -> AsyncIterator[List[Tuple]]:
+        """Foydalanuvchilarni eksport uchun bo'laklab (keyset) olish"""
+        await self.flush_writes()
+        last_id = None
+        pool = await self._get_pool()
+        while True:
+            rows = await pool.fetch(f"""
+                SELECT u.telegram_id, u.username, u.first_name, u.last_name,
+                       u.referral_code, u.referred_by, u.referral_count,
+                       u.completed_task,
+                       (SELECT COUNT(*) FROM user_channels uc
+                        JOIN channels c ON c.id = uc.channel_id AND c.is_active = 1
+                        WHERE uc.user_id = u.telegram_id AND uc.joined = 1
+                        AND {USER_CAMPAIGN_CHANNEL_SQL}),
+                       (SELECT COUNT(*) FROM user_channels uc
+                        JOIN channels c ON c.id = uc.channel_id AND c.is_active = 1
+                        WHERE uc.user_id = u.telegram_id
+                        AND uc.request_sent = 1 AND uc.joined = 0
+                        AND {USER_CAMPAIGN_CHANNEL_SQL}),
+                       (SELECT COUNT(*) FROM channels c
+                        WHERE c.is_active = 1 AND {USER_CAMPAIGN_CHANNEL_SQL}),
+                       u.created_at
+                FROM users u
+                WHERE $1::BIGINT IS NULL OR u.telegram_id > $1
+                ORDER BY u.telegram_id
+                LIMIT $2
+            """, last_id, chunk_size)
+
+            if not rows:
+                return
+            yield [tuple(row) for row in rows]
+            last_id = rows[-1][0]
+
+    # Referral analitikasi
+    async def _record_signup(self, conn: asyncpg.Connection):
+        """Yangi foydalanuvchini kunlik analitikaga qo'shish (tranzaksiya ichida)"""
+        await conn.execute("""
+            INSERT INTO referral_daily (day, new_users)
+            VALUES (CURRENT_DATE, 1)
+            ON CONFLICT (day) DO UPDATE SET new_users = referral_daily.new_users + 1
+        """)
+
+    async def _record_referral(self, conn: asyncpg.Connection, telegram_id: int, referred_by: int):
+        """Hisoblangan referalni daraxtga qo'shish - butun shoxcha bilan (tranzaksiya ichida)"""
+        branch = """
+            WITH up(ancestor, depth) AS (
+                SELECT ancestor, depth FROM referral_closure WHERE descendant = $2
+                UNION ALL SELECT $2::BIGINT, 0
+            ), down(descendant, depth) AS (
+                SELECT descendant, depth FROM referral_closure WHERE ancestor = $1
+                UNION ALL SELECT $1::BIGINT, 0
+            )
+        """
+        await conn.execute(branch + """
+            INSERT INTO referral_subtree (ancestor, size, max_depth)
+            SELECT up.ancestor, COUNT(*), MAX(up.depth + down.depth + 1)
+            FROM up, down
+            GROUP BY up.ancestor
+            ON CONFLICT (ancestor) DO UPDATE SET
+                size = referral_subtree.size + EXCLUDED.size,
+                max_depth = GREATEST(referral_subtree.max_depth, EXCLUDED.max_depth)
+        """, telegram_id, referred_by)
+
+        await conn.execute(branch + """
+            INSERT INTO referral_closure (ancestor, descendant, depth)
+            SELECT up.ancestor, down.descendant, up.depth + down.depth + 1
+            FROM up, down
+            ON CONFLICT DO NOTHING
+        """, telegram_id, referred_by)
+
+        await conn.execute("""
+            UPDATE referral_daily SET referred_users = referred_users + 1
+            WHERE day = (SELECT created_at::DATE FROM users WHERE telegram_id = $1)
+        """, telegram_id)
+        await conn.execute("""
+            UPDATE referral_daily SET referrals_made = referrals_made + 1
+            WHERE day = (SELECT created_at::DATE FROM users WHERE telegram_id = $1)
+        """, referred_by)
+
+    async def _backfill_referrals(self, conn: asyncpg.Connection):
+        """Hisoblangan referallardan (`referral_credits`) analitika jadvallarini qayta qurish"""
+        await conn.execute("TRUNCATE referral_closure, referral_subtree, referral_daily")
+        await conn.execute("""
+            WITH RECURSIVE tree(ancestor, descendant, depth) AS (
+                SELECT referrer_id, user_id, 1 FROM referral_credits
+                UNION ALL
+                SELECT c.referrer_id, t.descendant, t.depth + 1
+                FROM tree t JOIN referral_credits c ON c.user_id = t.ancestor
+                WHERE t.depth < 1000
+            )
+            INSERT INTO referral_closure (ancestor, descendant, depth)
+            SELECT ancestor, descendant, MIN(depth) FROM tree
+            GROUP BY ancestor, descendant
+        """)
+        await conn.execute("""
+            INSERT INTO referral_subtree (ancestor, size, max_depth)
+            SELECT ancestor, COUNT(*), MAX(depth) FROM referral_closure
+            GROUP BY ancestor
+        """)
+        await conn.execute("""
+            INSERT INTO referral_daily (day, new_users, referred_users, referrals_made)
+            SELECT d.day, d.new_users, d.referred_users, COALESCE(m.made, 0)
+            FROM (
+                SELECT u.created_at::DATE AS day, COUNT(*) AS new_users,
+                       COUNT(c.user_id) AS referred_users
+                FROM users u LEFT JOIN referral_credits c ON c.user_id = u.telegram_id
+                GROUP BY u.created_at::DATE
+            ) d
+            LEFT JOIN (
+                SELECT u.created_at::DATE AS day, COUNT(*) AS made
+                FROM referral_credits c JOIN users u ON u.telegram_id = c.referrer_id
+                GROUP BY u.created_at::DATE
+            ) m ON m.day = d.day
+        """)
+
+    async def get_top_referrers(self, limit: int = 10) -> List[Dict]:
+        """To'g'ridan-to'g'ri referallar soni bo'yicha TOP"""
+        return await self._fetch("""
+            SELECT telegram_id, username, first_name, referral_count
+            FROM users WHERE referral_count > 0
+            ORDER BY referral_count DESC LIMIT $1
+        """, limit)
+
+    async def get_top_cascades(self, limit: int = 10) -> List[Dict]:
+        """Kaskad (barcha bosqichlar) hajmi bo'yicha TOP"""
+        return await self._fetch("""
+            SELECT s.ancestor AS telegram_id, u.username, u.first_name,
+                   s.size, s.max_depth
+            FROM referral_subtree s
+            LEFT JOIN users u ON u.telegram_id = s.ancestor
+            ORDER BY s.size DESC LIMIT $1
+        """, limit)
+
+    async def get_referral_subtree(self, telegram_id: int) -> Dict:
+        """Foydalanuvchi kaskadining hajmi va chuqurligi"""
+        row = await self._fetchrow("""
+            SELECT (SELECT size FROM referral_subtree WHERE ancestor = $1) AS size,
+                   (SELECT max_depth FROM referral_subtree WHERE ancestor = $1) AS max_depth,
+                   (SELECT MAX(depth) FROM referral_closure WHERE descendant = $1) AS level
+        """, telegram_id)
+        return {key: value or 0 for key, value in row.items()}
+
+    async def get_max_referral_depth(self) -> int:
+        return await self._fetchval("SELECT MAX(max_depth) FROM referral_subtree") or 0
+
+    async def get_viral_coefficients(self, days: int = 7) -> List[Dict]:
+        """Kunlik kogortalar bo'yicha viral koeffitsient (K = keltirilgan / yangi)"""
+        rows = await self._fetch("""
+            SELECT day::TEXT AS day, new_users, referred_users, referrals_made
+            FROM referral_daily ORDER BY day DESC LIMIT $1
+        """, days)
+        return [
+            dict(row, k=row['referrals_made'] / row['new_users'] if row['new_users'] else 0.0)
+            for row in rows
+        ]
+
+    # Shubhali referallar
+    async def add_referral_hold(self, referrer_id: int, user_id: int,
+                                score: int, reasons: str) -> bool:
+        try:
+            await self._execute("""
+                INSERT INTO referral_holds (referrer_id, user_id, score, reasons)
+                VALUES ($1, $2, $3, $4)
+            """, referrer_id, user_id, score, reasons)
+            return True
+        except asyncpg.UniqueViolationError:
+            return False
+
+    async def get_pending_holds(self, limit: int = 20) -> List[Dict]:
+        return await self._fetch("""
+            SELECT * FROM referral_holds WHERE status = 'pending'
+            ORDER BY id LIMIT $1
+        """, limit)
+
+    async def resolve_referral_hold(self, hold_id: int, approve: bool) -> Optional[Dict]:
+        """Kutilayotgan referalni tasdiqlash/rad etish (faqat bir marta)"""
+        return await self._fetchrow("""
+            UPDATE referral_holds SET status = $1
+            WHERE id = $2 AND status = 'pending'
+            RETURNING *
+        """, 'approved' if approve else 'rejected', hold_id)
+
+    # Bot holati
+    async def explain_query(self, query: str, args: Sequence) -> List[str]:
+        pool = await self._get_pool()
+        rows = await pool.fetch(EXPLAIN_PREFIX + query, *args)
+        return [row[0] for row in rows]
+
+    async def get_state(self, key: str) -> Optional[str]:
+        return await self._fetchval("SELECT value FROM bot_state WHERE key = $1", key)
+
+    async def set_state(self, key: str, value: str):
+        await self._execute("""
+            INSERT INTO bot_state (key, value, updated_at)
+            VALUES ($1, $2, CURRENT_TIMESTAMP)
+            ON CONFLICT (key) DO UPDATE SET
+                value = EXCLUDED.value,
+                updated_at = EXCLUDED.updated_at
+        """, key, value)
+
+    # Xabar matnlari
+    async def get_templates(self) -> Dict[str, str]:
+        rows = await self._fetch("SELECT name, body FROM templates")
+        return {row['name']: row['body'] for row in rows}
+
+    async def set_template(self, name: str, body: str):
+        await self._execute("""
+            INSERT INTO templates (name, body, updated_at)
+            VALUES ($1, $2, CURRENT_TIMESTAMP)
+            ON CONFLICT (name) DO UPDATE SET
+                body = EXCLUDED.body,
+                updated_at = EXCLUDED.updated_at
+        """, name, body)
+        self.templates_version += 1
+
+    async def delete_template(self, name: str) -> bool:
+        status = await self._execute("DELETE FROM templates WHERE name = $1", name)
+        self.templates_version += 1
+        return _rowcount(status) > 0
+
+    # Eslatmalar
+    async def get_reminder_candidates(self, stage: str, created_before: datetime,
+                                      after_id: int, limit: int) -> List[Tuple[int, Optional[int], int]]:
+        pool = await self._get_pool()
+        rows = await pool.fetch(f"""
+            SELECT u.telegram_id, u.campaign_id, u.referral_count FROM users u
+            WHERE u.completed_task = 0 AND u.telegram_id > $1 AND u.created_at < $2
+            AND NOT EXISTS (
+                SELECT 1 FROM reminders r WHERE r.user_id = u.telegram_id AND r.stage = $3
+            )
+            AND {FUNNEL_STAGES[stage]}
+            ORDER BY u.telegram_id LIMIT $4
+        """, after_id, created_before, stage, limit)
+        return [tuple(row) for row in rows]
+
+    async def claim_reminders(self, stage: str, user_ids: List[int]) -> List[int]:
+        pool = await self._get_pool()
+        rows = await pool.fetch("""
+            INSERT INTO reminders (user_id, stage)
+            SELECT user_id, $2 FROM unnest($1::BIGINT[]) AS user_id
+            ON CONFLICT (user_id, stage) DO NOTHING
+            RETURNING user_id
+        """, user_ids, stage)
+        return [row[0] for row in rows]
+
+    async def release_reminder(self, stage: str, user_id: int):
+        await self._execute("DELETE FROM reminders WHERE user_id = $1 AND stage = $2", user_id, stage)
+
+    async def get_reminder_stats(self) -> Dict[str, int]:
+        rows = await self._fetch("SELECT stage, COUNT(*) AS sent FROM reminders GROUP BY stage")
+        return {row['stage']: row['sent'] for row in rows}
+
+    # Umumiy xabarlar
+    async def _count_segment(self, segment: Segment) -> int:
+        where, params = compile_segment(segment, lambda index: f'${index}')
+        return await self._fetchval(f"SELECT COUNT(*) FROM users u WHERE {where}", *params)
+
+    async def get_user_ids_page(self, after_id: int, limit: int,
+                                segment: Segment = Segment()) -> List[int]:
+        """telegram_id bo'yicha keyset: `after_id` dan keyingi segment foydalanuvchilari"""
+        where, params = compile_segment(segment, lambda index: f'${index}', start=2)
+        pool = await self._get_pool()
+        rows = await pool.fetch(f"""
+            SELECT u.telegram_id FROM users u
+            WHERE u.telegram_id > $1 AND {where}
+            ORDER BY u.telegram_id LIMIT ${len(params) + 2}
+        """, after_id, *params, limit)
+        return [row[0] for row in rows]
+
+    async def create_broadcast(self, admin_chat_id: int, text: Optional[str],
+                               photo: Optional[str], total: int, segment: str = "all",
+                               send_delay: float = None, source_chat_id: int = None,
+                               source_message_ids: str = None) -> Dict:
+        return await self._fetchrow("""
+            INSERT INTO broadcasts
+            (admin_chat_id, text, photo, total, segment, send_delay,
+             source_chat_id, source_message_ids)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+            RETURNING *
+        """, admin_chat_id, text, photo, total, segment, send_delay,
+            source_chat_id, source_message_ids)
+
+    async def save_broadcast(self, broadcast: Dict):
+        """Holat, kursor, progress xabari va sanagichlarni saqlash (checkpoint)"""
+        counters = ', '.join(
+            f'{name} = ${index}' for index, name in enumerate(self.BROADCAST_COUNTERS, 4)
+        )
+        await self._execute(f"""
+            UPDATE broadcasts SET
+                status = $1, last_user_id = $2, progress_message_id = $3,
+                {counters},
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = ${len(self.BROADCAST_COUNTERS) + 4}
+        """, broadcast['status'], broadcast['last_user_id'], broadcast['progress_message_id'],
+            *(broadcast[name] for name in self.BROADCAST_COUNTERS), broadcast['id'])
+
+    async def get_unfinished_broadcasts(self) -> List[Dict]:
+        return await self._fetch("""
+            SELECT * FROM broadcasts WHERE status IN ('running', 'paused')
+            ORDER BY id
+        """)
+
+    # Rejalashtirilgan xabar yuborishlar
+    async def create_schedule(self, admin_chat_id: int, text: Optional[str], photo: Optional[str],
+                              segment: str, run_at: int, interval: int = None,
+                              spread: int = 0, source_chat_id: int = None,
+                              source_message_ids: str = None) -> Dict:
+        return await self._fetchrow("""
+            INSERT INTO scheduled_broadcasts
+            (admin_chat_id, text, photo, segment, run_at, interval_seconds, spread_seconds,
+             source_chat_id, source_message_ids)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+            RETURNING *
+        """, admin_chat_id, text, photo, segment, run_at, interval, spread,
+            source_chat_id, source_message_ids)
+
+    async def get_due_schedules(self, now: int) -> List[Dict]:
+        """Vaqti kelgan aktiv rejalar (run_at bo'yicha)"""
+        return await self._fetch("""
+            SELECT * FROM scheduled_broadcasts
+            WHERE status = 'active' AND run_at <= $1
+            ORDER BY run_at, id
+        """, now)
+
+    async def get_schedules(self) -> List[Dict]:
+        return await self._fetch("""
+            SELECT * FROM scheduled_broadcasts WHERE status = 'active'
+            ORDER BY run_at, id
+        """)
+
+    async def claim_schedule(self, schedule_id: int, run_at: int,
+                             next_run_at: Optional[int]) -> bool:
+        status = await self._execute("""
+            UPDATE scheduled_broadcasts SET run_at = $1, status = $2
+            WHERE id = $3 AND run_at = $4 AND status = 'active'
+        """, next_run_at if next_run_at is not None else run_at,
+            'active' if next_run_at is not None else 'done', schedule_id, run_at)
+        return _rowcount(status) > 0
+
+    async def release_schedule(self, schedule_id: int, run_at: int, claimed_run_at: int) -> bool:
+        status = await self._execute("""
+            UPDATE scheduled_broadcasts SET run_at = $1, status = 'active'
+            WHERE id = $2 AND run_at = $3 AND status IN ('active', 'done')
+        """, run_at, schedule_id, claimed_run_at)
+        return _rowcount(status) > 0
+
+    async def set_schedule_broadcast(self, schedule_id: int, broadcast_id: int):
+        await self._execute("""
+            UPDATE scheduled_broadcasts SET last_broadcast_id = $1 WHERE id = $2
+        """, broadcast_id, schedule_id)
+
+    async def cancel_schedule(self, schedule_id: int) -> bool:
+        status = await self._execute("""
+            UPDATE scheduled_broadcasts SET status = 'cancelled'
+            WHERE id = $1 AND status = 'active'
+        """, schedule_id)
+        return _rowcount(status) > 0
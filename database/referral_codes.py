@@ -0,0 +1,66 @@
+import hashlib
+import string
+from typing import Optional
+
+from config import settings
+
+ALPHABET = string.digits + string.ascii_letters
+# users.id ning 40 bitli kalitli almashtirishi -> 7 ta base62 belgi (62^7 > 2^40)
+BLOCK_BITS = 40
+HALF_BITS = BLOCK_BITS // 2
+HALF_MASK = (1 << HALF_BITS) - 1
+ROUNDS = 4
+CODE_LENGTH = 7
+
+
+class ReferralCodec:
+    """users.id <-> referral kod (kalitli Feistel almashtirishi + base62)
+
+    Almashtirish o'zaro bir qiymatli - kodlar takrorlanmaydi, qayta urinish
+    kerak emas. Kalitsiz ketma-ket id'larni taxmin qilib bo'lmaydi.
+    """
+
+    def __init__(self, secret: bytes):
+        self._key = hashlib.sha256(secret).digest()
+
+    def _round(self, number: int, value: int) -> int:
+        digest = hashlib.blake2b(
+            value.to_bytes(4, 'big'), digest_size=4, key=self._key, person=bytes([number]) * 16
+        ).digest()
+        return int.from_bytes(digest, 'big') & HALF_MASK
+
+    def encode(self, user_id: int) -> str:
+        if not 0 <= user_id < 1 << BLOCK_BITS:
+            raise ValueError(f"user id {BLOCK_BITS} bitdan katta: {user_id}")
+        left, right = user_id >> HALF_BITS, user_id & HALF_MASK
+        for number in range(ROUNDS):
+            left, right = right, left ^ self._round(number, right)
+        value = (left << HALF_BITS) | right
+
+        chars = []
+        for _ in range(CODE_LENGTH):
+            value, digit = divmod(value, len(ALPHABET))
+            chars.append(ALPHABET[digit])
+        return "".join(reversed(chars))
+
+    def decode(self, code: str) -> Optional[int]:
+        """Kod -> users.id. Bu formatdagi kod bo'lmasa - None"""
+        if len(code) != CODE_LENGTH:
+            return None
+        value = 0
+        for char in code:
+            digit = ALPHABET.find(char)
+            if digit < 0:
+                return None
+            value = value * len(ALPHABET) + digit
+        if value >> BLOCK_BITS:
+            return None
+
+        left, right = value >> HALF_BITS, value & HALF_MASK
+        for number in reversed(range(ROUNDS)):
+            left, right = right ^ self._round(number, left), left
+        return (left << HALF_BITS) | right
+
+
+# Kalit berilmasa - bot tokenidan olinadi
+referral_codec = ReferralCodec((settings.REFERRAL_SECRET or settings.BOT_TOKEN or "").encode())
@@ -0,0 +1,146 @@
+import aiosqlite
+
+# Referral daraxti analitikasi (closure jadvali):
+# `referral_closure` har bir (ajdod, avlod) juftligini saqlaydi, shuning uchun
+# ko'p bosqichli so'rovlar rekursiyasiz - indeks bo'yicha bajariladi.
+# Kunlik yangi foydalanuvchilar `create_user` da, referal bog'lanishlari esa
+# referal hisoblanganda (`add_referral_credit`) o'sha tranzaksiyada yoziladi -
+# anti-fraud ushlab qolgan/rad etgan referallar analitikaga tushmaydi.
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS referral_closure (
+        ancestor INTEGER NOT NULL,
+        descendant INTEGER NOT NULL,
+        depth INTEGER NOT NULL,
+        PRIMARY KEY (ancestor, descendant)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_referral_closure_descendant ON referral_closure (descendant)",
+    # Har bir referrer uchun kaskad hajmi va chuqurligi
+    """
+    CREATE TABLE IF NOT EXISTS referral_subtree (
+        ancestor INTEGER PRIMARY KEY,
+        size INTEGER NOT NULL DEFAULT 0,
+        max_depth INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_referral_subtree_size ON referral_subtree (size)",
+    "CREATE INDEX IF NOT EXISTS idx_referral_subtree_depth ON referral_subtree (max_depth)",
+    # Kunlik kogortalar: shu kuni qo'shilganlar va ular keltirgan referallar
+    """
+    CREATE TABLE IF NOT EXISTS referral_daily (
+        day TEXT PRIMARY KEY,
+        new_users INTEGER NOT NULL DEFAULT 0,
+        referred_users INTEGER NOT NULL DEFAULT 0,
+        referrals_made INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_users_referral_count ON users (referral_count)",
+    "CREATE INDEX IF NOT EXISTS idx_users_referred_by ON users (referred_by)",
+]
+
+
+async def create_schema(db: aiosqlite.Connection, rebuild: bool = False):
+    """Analitika jadvallarini yaratish va bir martalik to'ldirish (`rebuild` - qayta qurish)"""
+    for statement in SCHEMA:
+        await db.execute(statement)
+
+    async with db.execute("SELECT 1 FROM referral_daily LIMIT 1") as cursor:
+        initialized = await cursor.fetchone()
+    async with db.execute("SELECT 1 FROM users LIMIT 1") as cursor:
+        has_users = await cursor.fetchone()
+
+    if (rebuild or not initialized) and has_users:
+        await backfill(db)
+
+
+async def backfill(db: aiosqlite.Connection):
+    """Hisoblangan referallardan (`referral_credits`) jadvallarni qayta qurish"""
+    await db.execute("DELETE FROM referral_closure")
+    await db.execute("DELETE FROM referral_subtree")
+    await db.execute("DELETE FROM referral_daily")
+
+    await db.execute("""
+        WITH RECURSIVE tree(ancestor, descendant, depth) AS (
+            SELECT referrer_id, user_id, 1 FROM referral_credits
+            UNION ALL
+            SELECT c.referrer_id, t.descendant, t.depth + 1
+            FROM tree t JOIN referral_credits c ON c.user_id = t.ancestor
+            WHERE t.depth < 1000
+        )
+        INSERT OR IGNORE INTO referral_closure (ancestor, descendant, depth)
+        SELECT ancestor, descendant, depth FROM tree
+    """)
+    await db.execute("""
+        INSERT INTO referral_subtree (ancestor, size, max_depth)
+        SELECT ancestor, COUNT(*), MAX(depth) FROM referral_closure
+        GROUP BY ancestor
+    """)
+    await db.execute("""
+        INSERT INTO referral_daily (day, new_users, referred_users)
+        SELECT date(u.created_at), COUNT(*), COUNT(c.user_id)
+        FROM users u LEFT JOIN referral_credits c ON c.user_id = u.telegram_id
+        GROUP BY date(u.created_at)
+    """)
+    await db.execute("""
+        UPDATE referral_daily SET referrals_made = (
+            SELECT COUNT(*) FROM referral_credits c
+            JOIN users u ON u.telegram_id = c.referrer_id
+            WHERE date(u.created_at) = referral_daily.day
+        )
+    """)
+
+
+async def record_signup(db: aiosqlite.Connection):
+    """Yangi foydalanuvchini kunlik analitikaga qo'shish (commit chaqiruvchida)"""
+    await db.execute("""
+        INSERT INTO referral_daily (day, new_users)
+        VALUES (date('now'), 1)
+        ON CONFLICT(day) DO UPDATE SET new_users = new_users + 1
+    """)
+
+
+async def record_referral(db: aiosqlite.Connection, telegram_id: int, referred_by: int):
+    """Hisoblangan referalni daraxtga qo'shish (commit chaqiruvchida)
+
+    Referal kechikib (admin tasdiqlagandan keyin) hisoblansa, foydalanuvchining
+    o'z avlodlari allaqachon bo'lishi mumkin - butun shoxcha ulanadi.
+    """
+    # Referrer va uning ajdodlari x foydalanuvchi va uning avlodlari
+    branch = """
+        WITH up(ancestor, depth) AS (
+            SELECT ancestor, depth FROM referral_closure WHERE descendant = :referrer
+            UNION ALL SELECT :referrer, 0
+        ), down(descendant, depth) AS (
+            SELECT descendant, depth FROM referral_closure WHERE ancestor = :user
+            UNION ALL SELECT :user, 0
+        )
+    """
+    params = {"user": telegram_id, "referrer": referred_by}
+
+    await db.execute(branch + """
+        INSERT INTO referral_subtree (ancestor, size, max_depth)
+        SELECT up.ancestor, COUNT(*), MAX(up.depth + down.depth + 1)
+        FROM up, down
+        GROUP BY up.ancestor
+        ON CONFLICT(ancestor) DO UPDATE SET
+            size = size + excluded.size,
+            max_depth = MAX(max_depth, excluded.max_depth)
+    """, params)
+
+    await db.execute(branch + """
+        INSERT OR IGNORE INTO referral_closure (ancestor, descendant, depth)
+        SELECT up.ancestor, down.descendant, up.depth + down.depth + 1
+        FROM up, down
+    """, params)
+
+    # Taklif qilingan foydalanuvchi kogortasi va referrer kogortasining viral koeffitsienti uchun
+    await db.execute("""
+        UPDATE referral_daily SET referred_users = referred_users + 1
+        WHERE day = (SELECT date(created_at) FROM users WHERE telegram_id = ?)
+    """, (telegram_id,))
+    await db.execute("""
+        UPDATE referral_daily SET referrals_made = referrals_made + 1
+        WHERE day = (SELECT date(created_at) FROM users WHERE telegram_id = ?)
+    """, (referred_by,))
@@ -0,0 +1,163 @@
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Callable, List, Optional, Tuple
+
+# Auditoriya segmenti - filtrlar VA bilan birlashtiriladi:
+#   all                      - barcha foydalanuvchilar
+#   completed / not_completed
+#   joined_all               - barcha aktiv kanallarga qo'shilgan
+#   pending                  - kamida bitta kanalga so'rovi kutilmoqda
+#   referrals=3..5           - referallar soni oralig'i (3.. yoki ..5 ham bo'ladi)
+#   since=2024-01-01         - shu sanadan (shu jumladan) keyin ro'yxatdan o'tgan
+#   until=2024-02-01         - shu sanadan oldin ro'yxatdan o'tgan
+#   campaign=spring          - shu kampaniya foydalanuvchilari (campaign=default - kampaniyasizlar)
+SEGMENT_HELP = (
+    "all | completed | not_completed | joined_all | pending | "
+    "referrals=3..5 | since=YYYY-MM-DD | until=YYYY-MM-DD | campaign=slug"
+)
+DEFAULT_CAMPAIGN = "default"
+
+# Foydalanuvchiga tegishli kanallar: umumiy (campaign_id NULL) va o'z kampaniyasiniki
+USER_CAMPAIGN_CHANNEL_SQL = "(c.campaign_id IS NULL OR c.campaign_id = u.campaign_id)"
+
+
+def campaign_channel_sql(user_param: str) -> str:
+    """USER_CAMPAIGN_CHANNEL_SQL - `users u` join qilinmagan so'rovlar uchun"""
+    return (f"(c.campaign_id IS NULL OR c.campaign_id = "
+            f"(SELECT campaign_id FROM users WHERE telegram_id = {user_param}))")
+
+
+# Aktiv kanallar bo'yicha foydalanuvchi holati (user_channels (user_id, channel_id) indeksi)
+JOINED_COUNT_SQL = f"""(SELECT COUNT(*) FROM user_channels uc
+    JOIN channels c ON c.id = uc.channel_id AND c.is_active = 1
+    WHERE uc.user_id = u.telegram_id AND uc.joined = 1 AND {USER_CAMPAIGN_CHANNEL_SQL})"""
+ACTIVE_COUNT_SQL = f"(SELECT COUNT(*) FROM channels c WHERE c.is_active = 1 AND {USER_CAMPAIGN_CHANNEL_SQL})"
+PENDING_SQL = f"""EXISTS (SELECT 1 FROM user_channels uc
+    JOIN channels c ON c.id = uc.channel_id AND c.is_active = 1
+    WHERE uc.user_id = u.telegram_id AND uc.request_sent = 1 AND uc.joined = 0
+    AND {USER_CAMPAIGN_CHANNEL_SQL})"""
+
+# Vazifani bajarmaganlar voronkasi bosqichlari (eslatmalar uchun)
+FUNNEL_STAGES = {
+    # Hali barcha kanallarga qo'shilmagan
+    "channels": f"{JOINED_COUNT_SQL} < {ACTIVE_COUNT_SQL}",
+    # Kanallarga qo'shilgan, referallari yetmaydi
+    "referrals": f"{ACTIVE_COUNT_SQL} > 0 AND {JOINED_COUNT_SQL} = {ACTIVE_COUNT_SQL}",
+}
+
+
+@dataclass(frozen=True)
+class Segment:
+    completed: Optional[bool] = None
+    joined_all: bool = False
+    pending: bool = False
+    min_referrals: Optional[int] = None
+    max_referrals: Optional[int] = None
+    since: Optional[date] = None
+    until: Optional[date] = None
+    campaign: Optional[str] = None
+
+    def __str__(self) -> str:
+        """Kanonik ko'rinish - parse_segment() bilan qayta o'qiladi"""
+        tokens = []
+        if self.completed is not None:
+            tokens.append("completed" if self.completed else "not_completed")
+        if self.joined_all:
+            tokens.append("joined_all")
+        if self.pending:
+            tokens.append("pending")
+        if self.min_referrals is not None or self.max_referrals is not None:
+            low = "" if self.min_referrals is None else self.min_referrals
+            high = "" if self.max_referrals is None else self.max_referrals
+            tokens.append(f"referrals={low}..{high}")
+        if self.since:
+            tokens.append(f"since={self.since.isoformat()}")
+        if self.until:
+            tokens.append(f"until={self.until.isoformat()}")
+        if self.campaign:
+            tokens.append(f"campaign={self.campaign}")
+        return " ".join(tokens) or "all"
+
+
+def _parse_int(value: str) -> Optional[int]:
+    if value == "":
+        return None
+    if not value.isdigit():
+        raise ValueError(f"Noto'g'ri son: {value}")
+    return int(value)
+
+
+def _parse_date(value: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Noto'g'ri sana (YYYY-MM-DD): {value}")
+
+
+def parse_segment(text: Optional[str]) -> Segment:
+    """Filtr matnini Segment'ga aylantirish. Xato bo'lsa - ValueError"""
+    fields = {}
+    for token in (text or "").lower().split():
+        key, _, value = token.partition("=")
+        if token in ("all", "hammasi"):
+            continue
+        elif token in ("completed", "not_completed"):
+            fields["completed"] = token == "completed"
+        elif token in ("joined_all", "pending"):
+            fields[token] = True
+        elif key == "referrals" and value:
+            low, dots, high = value.partition("..")
+            if not dots:
+                low = high = value
+            fields["min_referrals"] = _parse_int(low)
+            fields["max_referrals"] = _parse_int(high)
+        elif key in ("since", "until") and value:
+            fields[key] = _parse_date(value)
+        elif key == "campaign" and value:
+            fields["campaign"] = value
+        else:
+            raise ValueError(f"Noma'lum filtr: {token}")
+
+    segment = Segment(**fields)
+    if (segment.min_referrals is not None and segment.max_referrals is not None
+            and segment.min_referrals > segment.max_referrals):
+        raise ValueError("referrals: boshlanishi oxiridan katta")
+    if segment.since and segment.until and segment.since >= segment.until:
+        raise ValueError("since sanasi until dan oldin bo'lishi kerak")
+    return segment
+
+
+def compile_segment(segment: Segment, placeholder: Callable[[int], str],
+                    start: int = 1) -> Tuple[str, List]:
+    """Segmentni `users u` uchun WHERE shartiga aylantirish
+
+    `placeholder(n)` - backend parametri (SQLite: ?, PostgreSQL: $n),
+    `start` - birinchi parametr raqami. Sanalar datetime sifatida qaytariladi.
+    """
+    clauses = []
+    params = []
+
+    def param(value) -> str:
+        params.append(value)
+        return placeholder(start + len(params) - 1)
+
+    if segment.completed is not None:
+        clauses.append(f"u.completed_task = {param(1 if segment.completed else 0)}")
+    if segment.min_referrals is not None:
+        clauses.append(f"u.referral_count >= {param(segment.min_referrals)}")
+    if segment.max_referrals is not None:
+        clauses.append(f"u.referral_count <= {param(segment.max_referrals)}")
+    if segment.since:
+        clauses.append(f"u.created_at >= {param(datetime.combine(segment.since, datetime.min.time()))}")
+    if segment.until:
+        clauses.append(f"u.created_at < {param(datetime.combine(segment.until, datetime.min.time()))}")
+    if segment.campaign == DEFAULT_CAMPAIGN:
+        clauses.append("u.campaign_id IS NULL")
+    elif segment.campaign:
+        clauses.append(f"u.campaign_id = (SELECT id FROM campaigns WHERE slug = {param(segment.campaign)})")
+    if segment.joined_all:
+        clauses.append(f"{ACTIVE_COUNT_SQL} > 0 AND {JOINED_COUNT_SQL} = {ACTIVE_COUNT_SQL}")
+    if segment.pending:
+        clauses.append(PENDING_SQL)
+
+    return " AND ".join(clauses) or "1 = 1", params
@@ -0,0 +1,265 @@
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATABASE_DIR = os.path.join(PROJECT_ROOT, "database") + os.sep
+THIS_FILE = os.path.abspath(__file__)
+
+# Normallashtirilgan SQL keshi shundan oshsa tozalanadi (f-string IN ro'yxatlari)
+NORMALIZE_CACHE_SIZE = 10000
+# Har bir so'rov uchun shuncha chaqiruv joyi saqlanadi
+MAX_SITES = 20
+# Rejasi tekshiriladigan so'rov turlari
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+# SQLite: "SCAN users" (butun jadval/indeks), PostgreSQL: "Seq Scan on users"
+FULL_SCAN = re.compile(r"^\s*SCAN (\S+)|Seq Scan")
+# SQLite: ichki so'rov natijalari (ularni skanerlash - jadval skani emas)
+SUBQUERY = re.compile(r"^\s*(?:CO-ROUTINE|MATERIALIZE) (\S+)")
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w$])\d+(?:\.\d+)?\b")
+_PLACEHOLDERS = re.compile(r"\?(?:\s*,\s*\?)+")
+
+
+def normalize_sql(sql: str) -> str:
+    """Literallarni ? ga, (?, ?, ?) ro'yxatlarini (?...) ga almashtirib, bitta qatorga"""
+    sql = _WHITESPACE.sub(" ", sql).strip()
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    return _PLACEHOLDERS.sub("?...", sql)
+
+
+def full_scans(plan: List[str]) -> List[str]:
+    """Rejadagi butun jadval/indeks skanlari (ichki so'rovlar va SCAN CONSTANT ROW dan tashqari)"""
+    subqueries = {match.group(1) for match in map(SUBQUERY.match, plan) if match}
+    subqueries.add("CONSTANT")
+    scans = []
+    for line in plan:
+        match = FULL_SCAN.search(line)
+        if match and match.group(1) not in subqueries:
+            scans.append(line.strip())
+    return scans
+
+
+def call_site() -> str:
+    """Database metodi va uni chaqirgan loyiha kodi: "_get_user <- handlers/user.py:120 start_handler\""""
+    frame = sys._getframe(2)
+    method = None
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(PROJECT_ROOT) and filename != THIS_FILE:
+            if filename.startswith(DATABASE_DIR):
+                if method is None:
+                    method = frame.f_code.co_name
+            else:
+                caller = f"{os.path.relpath(filename, PROJECT_ROOT)}:{frame.f_lineno} {frame.f_code.co_name}"
+                return f"{method} <- {caller}" if method else caller
+        frame = frame.f_back
+    return method or "?"
+
+
+class StatementStats:
+    """Bitta normallashtirilgan so'rov bo'yicha jami"""
+
+    __slots__ = (
+        "sql", "calls", "total", "max", "rows", "sites",
+        "sample_sql", "sample_args", "plan", "scans"
+    )
+
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.sites: Counter = Counter()
+        # EXPLAIN uchun oxirgi haqiqiy so'rov (faqat xotirada, faylga yozilmaydi)
+        self.sample_sql: Optional[str] = None
+        self.sample_args: Sequence = ()
+        self.plan: Optional[List[str]] = None
+        self.scans: List[str] = []
+
+    def fetched(self, rows: int, elapsed: float):
+        self.rows += rows
+        self.total += elapsed
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "sql": self.sql,
+            "calls": self.calls,
+            "total_ms": round(self.total * 1000, 3),
+            "avg_ms": round(self.total / self.calls * 1000, 3) if self.calls else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+            "rows": self.rows,
+            "sites": dict(self.sites.most_common(5)),
+            "plan": self.plan,
+            "full_scans": self.scans,
+        }
+
+
+class QueryTracer:
+    """So'rovlarni normallashtirilgan SQL bo'yicha yig'ish: vaqt, qatorlar, chaqiruv joylari
+
+    Eng ko'p vaqt olgan so'rovlar uchun reja (EXPLAIN [QUERY PLAN]) olinadi
+    va butun jadvalni o'qiydiganlari belgilanadi.
+    """
+
+    def __init__(self):
+        self.started_at = datetime.utcnow()
+        self.statements: Dict[str, StatementStats] = {}
+        self._normalized: Dict[str, str] = {}
+
+    def record(self, sql: str, args: Sequence, elapsed: float, rows: int = -1,
+               site: Optional[str] = None) -> StatementStats:
+        normalized = self._normalized.get(sql)
+        if normalized is None:
+            if len(self._normalized) >= NORMALIZE_CACHE_SIZE:
+                self._normalized.clear()
+            normalized = self._normalized[sql] = normalize_sql(sql)
+
+        entry = self.statements.get(normalized)
+        if entry is None:
+            entry = self.statements[normalized] = StatementStats(normalized)
+        entry.calls += 1
+        entry.total += elapsed
+        if elapsed > entry.max:
+            entry.max = elapsed
+        if rows > 0:
+            entry.rows += rows
+        if site and (site in entry.sites or len(entry.sites) < MAX_SITES):
+            entry.sites[site] += 1
+        entry.sample_sql = sql
+        entry.sample_args = args
+        return entry
+
+    def top(self, limit: int = 10) -> List[StatementStats]:
+        """Jami vaqt bo'yicha eng og'ir so'rovlar"""
+        return sorted(self.statements.values(), key=lambda entry: entry.total, reverse=True)[:limit]
+
+    async def explain_slowest(self, explain: Callable[[str, Sequence], Awaitable[List[str]]],
+                              limit: int = 5) -> int:
+        """Eng og'ir `limit` ta so'rov rejasini olish (hali olinmaganlari). Qaytaradi: tekshirilganlar soni"""
+        explained = 0
+        for entry in self.top(limit):
+            if entry.plan is not None or not entry.sample_sql:
+                continue
+            if not entry.sql.upper().startswith(EXPLAINABLE):
+                continue
+            try:
+                entry.plan = await explain(entry.sample_sql, entry.sample_args)
+            except Exception as e:
+                entry.plan = [f"EXPLAIN xatosi: {e}"]
+            entry.scans = full_scans(entry.plan)
+            explained += 1
+        return explained
+
+    def dump(self, path: str):
+        """Hisobotni JSON faylga yozish (sinxron - alohida oqimda chaqiring)"""
+        report = {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "dumped_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "statements": [entry.to_dict() for entry in self.top(len(self.statements))],
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    def reset(self):
+        self.started_at = datetime.utcnow()
+        self.statements.clear()
+
+
+class TracedCursor:
+    """aiosqlite kursori - o'qilgan qatorlar va o'qish vaqti so'rov hisobiga qo'shiladi"""
+
+    __slots__ = ("_cursor", "_entry")
+
+    def __init__(self, cursor, entry: StatementStats):
+        self._cursor = cursor
+        self._entry = entry
+
+    def __getattr__(self, name: str):
+        return getattr(self._cursor, name)
+
+    async def fetchone(self):
+        started = time.perf_counter()
+        row = await self._cursor.fetchone()
+        self._entry.fetched(row is not None, time.perf_counter() - started)
+        return row
+
+    async def fetchmany(self, size: int = None):
+        started = time.perf_counter()
+        rows = await self._cursor.fetchmany(size)
+        self._entry.fetched(len(rows), time.perf_counter() - started)
+        return rows
+
+    async def fetchall(self):
+        started = time.perf_counter()
+        rows = await self._cursor.fetchall()
+        self._entry.fetched(len(rows), time.perf_counter() - started)
+        return rows
+
+    async def close(self):
+        await self._cursor.close()
+
+
+class TracedResult:
+    """`await db.execute(...)` va `async with db.execute(...)` ikkalasi uchun"""
+
+    __slots__ = ("_coro", "_cursor")
+
+    def __init__(self, coro: Awaitable[TracedCursor]):
+        self._coro = coro
+        self._cursor = None
+
+    def __await__(self):
+        return self._coro.__await__()
+
+    async def __aenter__(self) -> TracedCursor:
+        self._cursor = await self._coro
+        return self._cursor
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._cursor.close()
+
+
+class TracedConnection:
+    """aiosqlite ulanishi - har bir execute/executemany QueryTracer'ga yoziladi"""
+
+    __slots__ = ("_conn", "_tracer")
+
+    def __init__(self, conn, tracer: QueryTracer):
+        object.__setattr__(self, "_conn", conn)
+        object.__setattr__(self, "_tracer", tracer)
+
+    def __getattr__(self, name: str):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name: str, value):
+        # row_factory va h.k. - asl ulanishga
+        setattr(self._conn, name, value)
+
+    def execute(self, sql: str, parameters: Sequence = None) -> TracedResult:
+        return TracedResult(self._run(self._conn.execute, sql, parameters or (), call_site()))
+
+    def executemany(self, sql: str, parameters) -> TracedResult:
+        # Qatorlar ro'yxati EXPLAIN uchun kerak emas - birinchisi yetarli
+        parameters = list(parameters)
+        return TracedResult(self._run(
+            self._conn.executemany, sql, parameters, call_site(), parameters[0] if parameters else ()
+        ))
+
+    async def _run(self, method, sql: str, parameters, site: str, sample_args: Sequence = None) -> TracedCursor:
+        started = time.perf_counter()
+        cursor = await method(sql, parameters)
+        entry = self._tracer.record(
+            sql, parameters if sample_args is None else sample_args,
+            time.perf_counter() - started, cursor.rowcount, site
+        )
+        return TracedCursor(cursor, entry)
@@ -0,0 +1,86 @@
+from collections import OrderedDict
+from typing import Dict, Optional
+
+# users jadvali ustunlari
+USER_FIELDS = (
+    'id', 'telegram_id', 'username', 'first_name', 'last_name', 'referral_code',
+    'referred_by', 'completed_task', 'referral_count', 'created_at', 'campaign_id'
+)
+
+
+class UserRecord:
+    """users qatorining ixcham ko'rinishi (dict o'rniga __slots__)"""
+
+    __slots__ = USER_FIELDS
+
+    def __init__(self, row: Dict):
+        for name in USER_FIELDS:
+            setattr(self, name, row.get(name))
+
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in USER_FIELDS}
+
+
+class UserIndex:
+    """Foydalanuvchilar keshi - telegram_id va referral_code bo'yicha (LRU)
+
+    Yozuvlar Storage'dagi create_user / add_referral_credit / complete_task
+    orqali yangilanadi. O'qish paytida yozuv bo'lsa (`version` o'zgarsa),
+    o'qilgan qator keshlanmaydi - eskirgan qiymat qolib ketmasligi uchun.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._by_id: "OrderedDict[int, UserRecord]" = OrderedDict()
+        self._by_code: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def get(self, telegram_id: int) -> Optional[Dict]:
+        record = self._by_id.get(telegram_id)
+        if record is None:
+            self.misses += 1
+            return None
+        self._by_id.move_to_end(telegram_id)
+        self.hits += 1
+        return record.to_dict()
+
+    def get_by_referral(self, referral_code: str) -> Optional[Dict]:
+        telegram_id = self._by_code.get(referral_code)
+        if telegram_id is None:
+            self.misses += 1
+            return None
+        return self.get(telegram_id)
+
+    def put(self, row: Optional[Dict], version: int = None):
+        """Qatorni keshlash. `version` berilsa - shundan beri yozuv bo'lmagan bo'lsagina"""
+        if row is None or not self.max_size or (version is not None and version != self.version):
+            return
+
+        record = UserRecord(row)
+        old = self._by_id.pop(record.telegram_id, None)
+        if old is not None and old.referral_code != record.referral_code:
+            self._by_code.pop(old.referral_code, None)
+        self._by_id[record.telegram_id] = record
+        self._by_code[record.referral_code] = record.telegram_id
+
+        while len(self._by_id) > self.max_size:
+            _, evicted = self._by_id.popitem(last=False)
+            self._by_code.pop(evicted.referral_code, None)
+
+    def update(self, telegram_id: int, **fields):
+        """Keshdagi yozuvni database'dagi o'zgarishga moslash"""
+        self.version += 1
+        record = self._by_id.get(telegram_id)
+        if record is not None:
+            for name, value in fields.items():
+                setattr(record, name, value)
+
+    def clear(self):
+        self.version += 1
+        self._by_id.clear()
+        self._by_code.clear()
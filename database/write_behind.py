@@ -0,0 +1,114 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (joined, request_sent, joined_at)
+ChannelState = Tuple[int, int, datetime]
+# (user_id, channel_id, joined, request_sent, joined_at)
+ChannelRow = Tuple[int, int, int, int, datetime]
+
+
+class UserChannelWriteBuffer:
+    """user_channels yozuvlarini yig'ib, bitta tranzaksiyada yozish (write-behind)
+
+    Yozuvlar har `interval` soniyada yoki `max_rows` ga yetganda yoziladi.
+    Hali yozilmagan holatlar `overlay()` orqali o'qishlarga qo'shiladi.
+    """
+
+    def __init__(self, write: Callable[[List[ChannelRow]], Awaitable[None]],
+                 interval: float = 0.2, max_rows: int = 500):
+        self._write = write
+        self.interval = interval
+        self.max_rows = max_rows
+        # user_id -> {channel_id: holat}
+        self._pending: Dict[int, Dict[int, ChannelState]] = {}
+        self._pending_rows = 0
+        # Hozir yozilayotgan (commit qilinmagan) holatlar
+        self._inflight: Dict[int, Dict[int, ChannelState]] = {}
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        self._flush_requested = False
+
+    def __len__(self) -> int:
+        return self._pending_rows
+
+    def add(self, user_id: int, channel_id: int, joined: int, request_sent: int):
+        """Holatni navbatga qo'shish (eski holat ustidan yoziladi)"""
+        channels = self._pending.setdefault(user_id, {})
+        if channel_id not in channels:
+            self._pending_rows += 1
+        channels[channel_id] = (joined, request_sent, datetime.utcnow().replace(microsecond=0))
+
+        if self._pending_rows >= self.max_rows:
+            if not self._flush_requested:
+                self._flush_requested = True
+                asyncio.create_task(self.flush())
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    def overlay(self, user_id: int) -> Dict[int, ChannelState]:
+        """Foydalanuvchining hali yozilmagan holatlari"""
+        inflight = self._inflight.get(user_id)
+        pending = self._pending.get(user_id)
+        if not inflight:
+            return pending or {}
+        if not pending:
+            return inflight
+        return {**inflight, **pending}
+
+    def discard(self, user_id: int):
+        """Foydalanuvchining navbatdagi holatlarini bekor qilish"""
+        channels = self._pending.pop(user_id, None)
+        if channels:
+            self._pending_rows -= len(channels)
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(self.interval)
+        finally:
+            self._timer = None
+        await self.flush()
+
+    async def flush(self):
+        """Navbatdagi barcha holatlarni bitta tranzaksiyada yozish"""
+        async with self._lock:
+            self._flush_requested = False
+            if not self._pending:
+                return
+
+            self._inflight, self._pending = self._pending, {}
+            self._pending_rows = 0
+            rows = [
+                (user_id, channel_id, joined, request_sent, joined_at)
+                for user_id, channels in self._inflight.items()
+                for channel_id, (joined, request_sent, joined_at) in channels.items()
+            ]
+            try:
+                await self._write(rows)
+            except Exception as e:
+                logger.error(f"user_channels yozishda xato ({len(rows)} ta): {e}")
+                # Yangiroq holat bo'lmagan yozuvlarni navbatga qaytarish
+                for user_id, channels in self._inflight.items():
+                    pending = self._pending.setdefault(user_id, {})
+                    for channel_id, state in channels.items():
+                        if channel_id not in pending:
+                            pending[channel_id] = state
+                            self._pending_rows += 1
+                if self._timer is None:
+                    self._timer = asyncio.create_task(self._flush_later())
+            finally:
+                self._inflight = {}
+
+    async def close(self):
+        """To'xtatish: taymerni bekor qilish va qolganlarni yozish"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
+        if self._pending_rows:
+            logger.error(f"user_channels: {self._pending_rows} ta yozuv saqlanmadi")
+            if self._timer is not None:
+                self._timer.cancel()
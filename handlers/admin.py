@@ -1,27 +1,53 @@
 import asyncio
 import logging
-from aiogram import Router, F
-from aiogram.types import Message, ReplyKeyboardRemove
-from aiogram.filters import Command
+import os
+import re
+from typing import Dict, Optional
+from aiogram import Router, F, html
+from aiogram.types import Message, ReplyKeyboardRemove, BufferedInputFile, FSInputFile
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
 
 from config import settings
 from database.database import db
+from database.segments import DEFAULT_CAMPAIGN, SEGMENT_HELP, Segment, parse_segment
 from keyboards.keyboards import get_admin_keyboard, get_start_keyboard, get_cancel_keyboard
+from utils.broadcast import start_broadcast
+from utils.campaigns import (
+    CAMPAIGN_PREFIX, SLUG_PATTERN, campaigns, required_referrals, reward_link, success_message
+)
+from utils.media import file_ids, media_groups, message_source
+from utils.channels import (
+    detect_channel_type, export_channels, parse_channel_lines,
+    parse_channels_document, validate_channels
+)
+from utils.export import write_csv_gz
+from utils.health import render_health
+from utils.helpers import credit_referral
+from utils.scheduler import SCHEDULE_HELP, format_time, parse_schedule
+from utils.templates import TEMPLATES, compile_template, templates
+from utils.watchdog import loop_watchdog, render_stalls
 
 router = Router()
 logger = logging.getLogger(__name__)
 
+MAX_IMPORT_FILE_SIZE = 1024 * 1024  # 1 MB
+EXPORT_CHUNK_SIZE = 1000
+# /queries: shuncha so'rov ko'rsatiladi, rejasi olinadi
+QUERY_REPORT_SIZE = 8
+
 
 class AdminStates(StatesGroup):
     waiting_for_channel_data = State()
     waiting_for_channel_to_remove = State()
     waiting_for_content = State()
     waiting_for_invitation_image = State()
+    waiting_for_segment = State()
     waiting_for_broadcast = State()
+    waiting_for_scheduled_message = State()
     waiting_for_clear_confirmation = State()
+    waiting_for_template = State()
 
 
 def is_admin(user_id: int) -> bool:
@@ -66,7 +92,9 @@ async def add_channel_start(message: Message, state: FSMContext):
         "1. Botni kanalga admin qiling\n"
         "2. Kanalda botni mention qiling\n"
         "3. Bot loglarida chat ID ko'rinadi\n\n"
-        "🔗 <b>Yoki invite linkni to'g'ridan-to'g'ri ishlatishingiz mumkin!</b>",
+        "🔗 <b>Yoki invite linkni to'g'ridan-to'g'ri ishlatishingiz mumkin!</b>\n\n"
+        "📦 <b>Ommaviy import:</b> har bir qatorda bitta kanal yoki "
+        "CSV/JSON fayl (<code>channel_id,channel_name,channel_link</code>) yuboring.",
         reply_markup=get_cancel_keyboard()
     )
     await state.set_state(AdminStates.waiting_for_channel_data)
@@ -80,6 +108,21 @@ async def add_channel_process(message: Message, state: FSMContext):
         await message.answer("❌ Bekor qilindi.", reply_markup=get_admin_keyboard())
         return
 
+    # Fayl yoki ko'p qatorli matn - ommaviy import
+    if message.document or (message.text and len(message.text.strip().splitlines()) > 1):
+        try:
+            await add_channels_bulk(message)
+        except Exception as e:
+            logger.error(f"Kanallarni import qilishda xato: {e}")
+            await message.answer("❌ Import qilishda xato yuz berdi!", reply_markup=get_admin_keyboard())
+        finally:
+            await state.clear()
+        return
+
+    if not message.text:
+        await message.answer("❌ Matn yoki CSV/JSON fayl yuboring!")
+        return
+
     try:
         parts = message.text.split('|')
         if len(parts) != 3:
@@ -97,27 +140,13 @@ async def add_channel_process(message: Message, state: FSMContext):
         channel_link = parts[2].strip()
 
         # Channel ID formatini tekshirish va avtomatik aniqlash
-        channel_type = "Unknown"
-
-        if channel_id.startswith('-100'):
-            # Chat ID format
-            try:
-                int(channel_id)  # Raqam ekanligini tekshirish
-                channel_type = "Private (Chat ID)"
-            except ValueError:
+        channel_type = detect_channel_type(channel_id)
+
+        if channel_type is None:
+            if channel_id.startswith('-100'):
                 await message.answer("❌ Chat ID raqam bo'lishi kerak! Misol: -1001234567890")
                 return
 
-        elif channel_id.startswith('@'):
-            # Username format
-            channel_type = "Public (Username)"
-
-        elif channel_id.startswith('https://t.me/+'):
-            # Invite link format - bu holatda link ni ID sifatida saqlaymiz
-            channel_type = "Private (Invite Link)"
-            # Invite linkdan foydalanish uchun linkni ID sifatida saqlaymiz
-
-        else:
             await message.answer(
                 "❌ Kanal ID/Link noto'g'ri formatda!\n\n"
                 "✅ Private kanal (Chat ID): <code>-1001234567890</code>\n"
@@ -159,6 +188,86 @@ async def add_channel_process(message: Message, state: FSMContext):
     await state.clear()
 
 
+async def add_channels_bulk(message: Message):
+    """Ko'p qatorli matn yoki CSV/JSON fayldan kanallarni import qilish"""
+    if message.document:
+        if message.document.file_size and message.document.file_size > MAX_IMPORT_FILE_SIZE:
+            await message.answer("❌ Fayl juda katta!", reply_markup=get_admin_keyboard())
+            return
+        buffer = await message.bot.download(message.document)
+        rows, errors = parse_channels_document(message.document.file_name or "", buffer.getvalue())
+    else:
+        rows, errors = parse_channel_lines(message.text)
+
+    # Bot API orqali parallel tekshirish
+    rows, api_errors = await validate_channels(message.bot, rows)
+    errors.extend(api_errors)
+
+    saved_count = await db.add_channels(rows)
+
+    report = (
+        f"📦 <b>Kanallar importi yakunlandi</b>\n\n"
+        f"✅ Saqlandi: {saved_count}\n"
+        f"❌ Xatolar: {len(errors)}"
+    )
+    if errors:
+        report += "\n\n" + "\n".join(html.quote(error) for error in errors[:20])
+        if len(errors) > 20:
+            report += f"\n... va yana {len(errors) - 20} ta"
+
+    await message.answer(report, reply_markup=get_admin_keyboard())
+
+
+@router.message(F.text == "📤 Kanallar eksporti")
+@router.message(Command("export_channels"))
+async def export_channels_handler(message: Message, command: Optional[CommandObject] = None):
+    """Aktiv kanallarni CSV/JSON fayl sifatida yuborish"""
+    if not is_admin(message.from_user.id):
+        return
+
+    channels = await db.get_active_channels()
+    if not channels:
+        await message.answer("❌ Aktiv kanallar yo'q!", reply_markup=get_admin_keyboard())
+        return
+
+    fmt = "json" if command and command.args and command.args.strip().lower() == "json" else "csv"
+    document = BufferedInputFile(export_channels(channels, fmt), filename=f"channels.{fmt}")
+    await message.answer_document(
+        document,
+        caption=f"📤 Aktiv kanallar: {len(channels)}",
+        reply_markup=get_admin_keyboard()
+    )
+
+
+@router.message(F.text == "📥 Foydalanuvchilar eksporti")
+@router.message(Command("export_users"))
+async def export_users_handler(message: Message):
+    """Foydalanuvchilarni .csv.gz fayl sifatida yuborish"""
+    if not is_admin(message.from_user.id):
+        return
+
+    status_message = await message.answer("⏳ Eksport tayyorlanmoqda...")
+
+    path = None
+    try:
+        path, total = await write_csv_gz(
+            db.USERS_EXPORT_COLUMNS,
+            db.iter_users_export(chunk_size=EXPORT_CHUNK_SIZE)
+        )
+        await message.answer_document(
+            FSInputFile(path, filename="users.csv.gz"),
+            caption=f"📥 Jami foydalanuvchilar: {total}",
+            reply_markup=get_admin_keyboard()
+        )
+        await status_message.delete()
+    except Exception as e:
+        logger.error(f"Foydalanuvchilarni eksport qilishda xato: {e}")
+        await message.answer("❌ Xato yuz berdi!", reply_markup=get_admin_keyboard())
+    finally:
+        if path:
+            await asyncio.to_thread(os.remove, path)
+
+
 @router.message(F.text == "➖ Kanal o'chirish")
 async def remove_channel_start(message: Message, state: FSMContext):
     """Kanal o'chirishni boshlash"""
@@ -227,14 +336,112 @@ async def show_stats(message: Message):
     await message.answer(stats_text, reply_markup=get_admin_keyboard())
 
 
+@router.message(Command("referrals"))
+async def referral_analytics_handler(message: Message, command: CommandObject):
+    """Referral daraxti analitikasi: TOP referrerlar, kaskadlar, viral koeffitsient"""
+    if not is_admin(message.from_user.id):
+        return
+
+    # Bitta foydalanuvchi kaskadi: /referrals <telegram_id>
+    if command.args and command.args.strip().lstrip('-').isdigit():
+        telegram_id = int(command.args.strip())
+        user = await db.get_user(telegram_id)
+        if not user:
+            await message.answer("❌ Foydalanuvchi topilmadi!")
+            return
+        subtree = await db.get_referral_subtree(telegram_id)
+        await message.answer(
+            f"🌳 <b>Kaskad: {telegram_id}</b>\n\n"
+            f"👥 To'g'ridan-to'g'ri referallar: {user['referral_count']}\n"
+            f"🌐 Kaskad hajmi (barcha bosqichlar): {subtree['size']}\n"
+            f"📏 Kaskad chuqurligi: {subtree['max_depth']}\n"
+            f"⬆️ Daraxtdagi bosqichi: {subtree['level']}"
+        )
+        return
+
+    top_referrers = await db.get_top_referrers(10)
+    top_cascades = await db.get_top_cascades(10)
+    max_depth = await db.get_max_referral_depth()
+    daily = await db.get_viral_coefficients(7)
+
+    text = "🌳 <b>Referral analitikasi</b>\n\n"
+    text += f"📏 Eng chuqur kaskad: {max_depth} bosqich\n\n"
+
+    text += "🏆 <b>TOP referrerlar:</b>\n"
+    for i, user in enumerate(top_referrers, 1):
+        name = html.quote(user['username'] or user['first_name'] or str(user['telegram_id']))
+        text += f"{i}. {name} - {user['referral_count']}\n"
+
+    text += "\n🌐 <b>TOP kaskadlar:</b>\n"
+    for i, row in enumerate(top_cascades, 1):
+        name = html.quote(row['username'] or row['first_name'] or str(row['telegram_id']))
+        text += f"{i}. {name} - {row['size']} (chuqurlik {row['max_depth']})\n"
+
+    text += "\n📈 <b>Viral koeffitsient (kunlik kogorta):</b>\n"
+    for row in daily:
+        text += (f"• {row['day']}: K={row['k']:.2f} "
+                 f"(yangi {row['new_users']}, referal orqali {row['referred_users']})\n")
+
+    await message.answer(text)
+
+
+@router.message(Command("holds"))
+async def referral_holds_handler(message: Message):
+    """Anti-fraud tomonidan ushlab qolingan referallar"""
+    if not is_admin(message.from_user.id):
+        return
+
+    holds = await db.get_pending_holds(20)
+    if not holds:
+        await message.answer("✅ Tekshiruvni kutayotgan referallar yo'q.")
+        return
+
+    text = "🕵️ <b>Shubhali referallar:</b>\n\n"
+    for hold in holds:
+        text += (
+            f"#{hold['id']} {hold['referrer_id']} ← {hold['user_id']} "
+            f"(ball: {hold['score']})\n"
+            f"   {html.quote(hold['reasons'] or '')}\n"
+            f"   /approve_{hold['id']}  /reject_{hold['id']}\n"
+        )
+    await message.answer(text)
+
+
+@router.message(Command(re.compile(r"(approve|reject)_(\d+)")))
+async def resolve_referral_hold_handler(message: Message, command: CommandObject):
+    """Shubhali referalni tasdiqlash yoki rad etish"""
+    if not is_admin(message.from_user.id):
+        return
+
+    action, hold_id = command.regexp_match.groups()
+    approve = action == "approve"
+    hold = await db.resolve_referral_hold(int(hold_id), approve)
+    if not hold:
+        await message.answer("❌ Topilmadi yoki allaqachon ko'rib chiqilgan.")
+        return
+
+    if approve:
+        await credit_referral(message.bot, hold['referrer_id'], hold['user_id'])
+        await message.answer(f"✅ #{hold_id} tasdiqlandi - referal hisoblandi.")
+    else:
+        await message.answer(f"🚫 #{hold_id} rad etildi.")
+
+
 @router.message(F.text == "📝 Content o'rnatish")
 async def set_content_start(message: Message, state: FSMContext):
     """Content o'rnatishni boshlash"""
     if not is_admin(message.from_user.id):
         return
 
+    await ask_content(message, state)
+
+
+async def ask_content(message: Message, state: FSMContext, campaign: Optional[Dict] = None):
+    """Content so'rash (campaign berilsa - shu kampaniya uchun)"""
+    await state.update_data(campaign_id=campaign['id'] if campaign else None)
+    target = f"🎯 Kampaniya: <b>{html.quote(campaign['slug'])}</b>\n\n" if campaign else ""
     await message.answer(
-        "📝 Yangi content yuklang.\n\n"
+        f"{target}📝 Yangi content yuklang.\n\n"
         "Quyidagi formatda yuboring:\n"
         "<code>Sarlavha|Matn content</code>\n\n"
         "Yoki faqat rasm ham yuborishingiz mumkin.\n\n"
@@ -280,7 +487,8 @@ async def set_content_process(message: Message, state: FSMContext):
                 else:
                     text_content = message.caption.strip()
 
-        await db.set_content(title, text_content, image_path)
+        campaign_id = (await state.get_data()).get('campaign_id')
+        await db.set_content(title, text_content, image_path, campaign_id)
 
         await message.answer(
             f"✅ Content o'rnatildi!\n\n"
@@ -303,11 +511,20 @@ async def set_invitation_image_start(message: Message, state: FSMContext):
     if not is_admin(message.from_user.id):
         return
 
-    current_image = await db.get_invitation_image()
+    await ask_invitation_image(message, state)
+
+
+async def ask_invitation_image(message: Message, state: FSMContext, campaign: Optional[Dict] = None):
+    """Taklif rasmini so'rash (campaign berilsa - shu kampaniya uchun)"""
+    campaign_id = campaign['id'] if campaign else None
+    await state.update_data(campaign_id=campaign_id)
+    current_image = await db.get_invitation_image(campaign_id)
     status_text = "✅ O'rnatilgan" if current_image else "❌ O'rnatilmagan"
+    target = f"🎯 Kampaniya: <b>{html.quote(campaign['slug'])}</b>\n" if campaign else ""
 
     await message.answer(
         f"🖼 <b>Taklif posti uchun rasm yuklash</b>\n\n"
+        f"{target}"
         f"📊 Hozirgi holat: {status_text}\n\n"
         f"Bu rasm taklif posti bilan birga foydalanuvchilarga ko'rsatiladi.\n\n"
         f"📷 Yangi rasm yuklang:",
@@ -349,7 +566,9 @@ async def set_invitation_image_process(message: Message, state: FSMContext):
         await message.bot.download_file(file_info.file_path, local_path)
 
         # Database'dagi contentni yangilash
-        await db.set_invitation_image(local_path)
+        await db.set_invitation_image(local_path, (await state.get_data()).get('campaign_id'))
+        # Foydalanuvchilarga yuborishda fayl qayta yuklanmasin
+        await file_ids.set(local_path, photo.file_id)
 
         await message.answer(
             f"✅ Taklif rasmi muvaffaqiyatli yuklandi va saqlandi!\n\n"
@@ -436,51 +655,55 @@ async def remove_all_channels_process(message: Message, state: FSMContext):
     await state.clear()
 
 
-async def safe_send_message(bot, user_id: int, text: str = None, photo: str = None, caption: str = None):
-    """Xavfsiz xabar yuborish - xatolarni handle qiladi"""
-    try:
-        if photo:
-            await bot.send_photo(
-                chat_id=user_id,
-                photo=photo,
-                caption=caption,
-                parse_mode="HTML"
-            )
-        else:
-            await bot.send_message(
-                chat_id=user_id,
-                text=text,
-                parse_mode="HTML"
-            )
-        return True, None
-    except TelegramForbiddenError:
-        # Foydalanuvchi botni block qilgan
-        return False, "blocked"
-    except TelegramBadRequest as e:
-        if "chat not found" in str(e).lower():
-            # Foydalanuvchi accountini delete qilgan
-            return False, "deleted"
-        elif "user is deactivated" in str(e).lower():
-            # Account deactive
-            return False, "deactivated"
-        else:
-            # Boshqa bad request xatolari
-            return False, f"bad_request: {str(e)}"
-    except Exception as e:
-        # Boshqa xatolar
-        return False, f"error: {str(e)}"
-
-
 @router.message(F.text == "📢 Xabar yuborish")
 async def broadcast_start(message: Message, state: FSMContext):
-    """Umumiy xabar yuborishni boshlash"""
+    """Umumiy xabar yuborishni boshlash - avval auditoriya"""
     if not is_admin(message.from_user.id):
         return
 
     await message.answer(
-        "📢 Barcha foydalanuvchilarga yuborilecek xabarni kiriting:\n\n"
+        "🎯 Auditoriyani kiriting (filtrlar bo'sh joy bilan, barchasi bajarilishi kerak):\n\n"
+        f"<code>{SEGMENT_HELP}</code>\n\n"
+        "💡 Masalan: <code>joined_all not_completed</code>\n"
+        "👥 Barcha foydalanuvchilar uchun: <code>all</code>",
+        reply_markup=get_cancel_keyboard()
+    )
+    await state.set_state(AdminStates.waiting_for_segment)
+
+
+async def preview_segment(message: Message, text: Optional[str]) -> Optional[Segment]:
+    """Filtrni tekshirish va foydalanuvchilar sonini ko'rsatish"""
+    try:
+        segment = parse_segment(text)
+    except ValueError as e:
+        await message.answer(f"❌ {html.quote(str(e))}\n\n<code>{SEGMENT_HELP}</code>")
+        return None
+
+    count = await db.count_segment(segment)
+    await message.answer(
+        f"🎯 Auditoriya: <code>{segment}</code>\n"
+        f"👥 Foydalanuvchilar: <b>{count}</b>"
+    )
+    return segment if count else None
+
+
+@router.message(AdminStates.waiting_for_segment)
+async def broadcast_segment_process(message: Message, state: FSMContext):
+    """Auditoriyani tanlash va sonini ko'rsatish"""
+    if message.text == "❌ Bekor qilish":
+        await state.clear()
+        await message.answer("❌ Bekor qilindi.", reply_markup=get_admin_keyboard())
+        return
+
+    segment = await preview_segment(message, message.text)
+    if not segment:
+        return
+
+    await state.update_data(segment=str(segment))
+    await message.answer(
+        "📢 Yuboriladigan xabarni kiriting:\n\n"
         "💡 HTML formatidan foydalanishingiz mumkin.\n"
-        "📷 Rasm ham yuborishingiz mumkin.",
+        "📷 Rasm, video, hujjat, albom va boshqa xabarlar ham yuborishingiz mumkin.",
         reply_markup=get_cancel_keyboard()
     )
     await state.set_state(AdminStates.waiting_for_broadcast)
@@ -494,14 +717,14 @@ async def broadcast_process(message: Message, state: FSMContext):
         await message.answer("❌ Bekor qilindi.", reply_markup=get_admin_keyboard())
         return
 
-    # Barcha foydalanuvchilarni olish
-    all_users = await db.get_all_users()
-
-    if not all_users:
-        await message.answer("❌ Hozircha foydalanuvchilar yo'q.", reply_markup=get_admin_keyboard())
-        await state.clear()
+    messages = await media_groups.collect(message)
+    if messages is None:
+        # Albomning keyingi qismi - birinchi qism handleri yig'ib oladi
         return
 
+    data = await state.get_data()
+    segment = parse_segment(data.get('segment'))
+
     # Xabar mazmuni
     broadcast_text = message.text if message.text else message.caption
     broadcast_photo = None
@@ -510,115 +733,27 @@ async def broadcast_process(message: Message, state: FSMContext):
     if message.photo:
         broadcast_photo = message.photo[-1].file_id
 
-    # Xabar yuborish jarayoni
-    sent_count = 0
-    blocked_count = 0
-    deleted_count = 0
-    error_count = 0
-
-    error_details = {
-        "blocked": 0,
-        "deleted": 0,
-        "deactivated": 0,
-        "other": 0
-    }
-
-    # Progress xabari
-    progress_message = await message.answer(
-        f"📤 Xabar yuborish boshlandi...\n👥 Jami: {len(all_users)} foydalanuvchi"
+    # Fonda yuboriladi: kursor database'da saqlanadi, bot qayta ishga tushsa davom etadi
+    broadcast = await start_broadcast(
+        message.bot, message.chat.id, broadcast_text, broadcast_photo, segment,
+        source_chat_id=message.chat.id, source_message_ids=message_source(messages)
     )
+    await message.answer(
+        f"📤 Xabar yuborish #{broadcast['id']} fonda boshlandi.\n"
+        f"🎯 Auditoriya: <code>{segment}</code>\n"
+        f"👥 Jami: {broadcast['total']} foydalanuvchi",
+        reply_markup=get_admin_keyboard()
+    )
+    await state.clear()
 
-    batch_size = 10  # Har necha xabardan keyin progress yangilash
-    last_update = 0
-
-    for i, user in enumerate(all_users, 1):
-        # Xabar yuborish
-        success, error_type = await safe_send_message(
-            bot=message.bot,
-            user_id=user['telegram_id'],
-            text=broadcast_text,
-            photo=broadcast_photo,
-            caption=broadcast_text if broadcast_photo else None
-        )
 
-        if success:
-            sent_count += 1
-        else:
-            # Xato turini categorize qilish
-            if error_type == "blocked":
-                error_details["blocked"] += 1
-            elif error_type == "deleted":
-                error_details["deleted"] += 1
-            elif error_type == "deactivated":
-                error_details["deactivated"] += 1
-            else:
-                error_details["other"] += 1
-
-        # Progress yangilash (har 10 ta yoki oxirgi xabar)
-        if i % batch_size == 0 or i == len(all_users):
-            try:
-                total_errors = sum(error_details.values())
-                progress_text = f"""📤 Xabar yuborish davom etmoqda...
-
-✅ Yuborildi: {sent_count}
-❌ Jami xatolar: {total_errors}
-  • 🚫 Bloklagan: {error_details['blocked']}
-  • 🗑 O'chirgan: {error_details['deleted']}
-  • ⏸ Deaktiv: {error_details['deactivated']}
-  • ❓ Boshqa: {error_details['other']}
-
-📊 Progress: {i}/{len(all_users)} ({(i / len(all_users) * 100):.1f}%)"""
-
-                await progress_message.edit_text(progress_text)
-                last_update = i
-            except TelegramBadRequest as edit_error:
-                # Agar edit qilib bo'lmasa, yangi xabar yuborish
-                if "message can't be edited" in str(edit_error).lower():
-                    try:
-                        await progress_message.delete()
-                    except:
-                        pass
-
-                    total_errors = sum(error_details.values())
-                    progress_message = await message.answer(f"""📤 Xabar yuborish davom etmoqda...
-
-✅ Yuborildi: {sent_count}
-❌ Jami xatolar: {total_errors}
-
-📊 Progress: {i}/{len(all_users)} ({(i / len(all_users) * 100):.1f}%)""")
-            except Exception as e:
-                logger.error(f"Progress yangilashda xato: {e}")
-
-        # Telegram rate limit uchun kechikish
-        await asyncio.sleep(0.05)  # 50ms
-
-    # Yakuniy natija
-    total_errors = sum(error_details.values())
-    final_message = f"""📊 <b>Xabar yuborish yakunlandi!</b>
-
-✅ Muvaffaqiyatli: {sent_count}
-❌ Jami xatolar: {total_errors}
-👥 Jami foydalanuvchi: {len(all_users)}
-
-<b>📋 Xato tafsilotlari:</b>
-🚫 Botni bloklagan: {error_details['blocked']}
-🗑 Accountni o'chirgan: {error_details['deleted']}
-⏸ Deaktiv account: {error_details['deactivated']}
-❓ Boshqa xatolar: {error_details['other']}
-
-📈 Muvaffaqiyat darajasi: {(sent_count / len(all_users) * 100):.1f}%"""
-
-    try:
-        await progress_message.edit_text(final_message)
-    except TelegramBadRequest:
-        # Agar edit qilib bo'lmasa, yangi xabar yuborish
-        try:
-            await progress_message.delete()
-        except:
-            pass
-        await message.answer(final_message, reply_markup=get_admin_keyboard())
+@router.message(Command("segment"))
+async def segment_preview_handler(message: Message, command: CommandObject):
+    """Auditoriya hajmini oldindan ko'rish: /segment joined_all not_completed"""
+    if not is_admin(message.from_user.id):
+        return
 
-    await state.clear()
+    await preview_segment(message, command.args)
 
 
 @router.message(F.text == "🔙 Orqaga")
@@ -634,49 +769,416 @@ async def back_to_user_mode(message: Message, state: FSMContext):
     )
 
 
+@router.message(Command("schedule"))
+async def schedule_handler(message: Message, command: CommandObject, state: FSMContext):
+    """Xabar yuborishni rejalashtirish yoki rejalar ro'yxati"""
+    if not is_admin(message.from_user.id):
+        return
+
+    if not command.args:
+        schedules = await db.get_schedules()
+        text = "🗓 <b>Rejalashtirilgan xabarlar:</b>\n\n" if schedules else "🗓 Rejalar yo'q.\n\n"
+        for schedule in schedules:
+            repeat = f", har {schedule['interval_seconds'] // 60} daqiqada" if schedule['interval_seconds'] else ""
+            text += (
+                f"#{schedule['id']} ⏰ {format_time(schedule['run_at'])}{repeat}\n"
+                f"   🎯 {html.quote(schedule['segment'])}  /unschedule_{schedule['id']}\n"
+            )
+        await message.answer(text + "\n" + SCHEDULE_HELP)
+        return
+
+    try:
+        run_at, interval, spread, segment = parse_schedule(command.args)
+    except ValueError as e:
+        await message.answer(f"❌ {html.quote(str(e))}\n\n{SCHEDULE_HELP}")
+        return
+
+    count = await db.count_segment(segment)
+    await state.update_data(
+        schedule={'run_at': run_at, 'interval': interval, 'spread': spread, 'segment': str(segment)}
+    )
+    await message.answer(
+        f"⏰ Vaqt: {format_time(run_at)}\n"
+        f"🎯 Auditoriya: <code>{segment}</code> (hozir {count} ta)\n\n"
+        "📢 Yuboriladigan xabarni kiriting (matn, rasm, video, albom...):\n"
+        "⚠️ Yuborilguncha bu xabarni o'chirmang - undan nusxa olinadi.",
+        reply_markup=get_cancel_keyboard()
+    )
+    await state.set_state(AdminStates.waiting_for_scheduled_message)
+
+
+@router.message(AdminStates.waiting_for_scheduled_message)
+async def schedule_message_process(message: Message, state: FSMContext):
+    """Rejalashtirilgan xabar mazmunini saqlash"""
+    if message.text == "❌ Bekor qilish":
+        await state.clear()
+        await message.answer("❌ Bekor qilindi.", reply_markup=get_admin_keyboard())
+        return
+
+    messages = await media_groups.collect(message)
+    if messages is None:
+        return
+
+    data = (await state.get_data())['schedule']
+    schedule = await db.create_schedule(
+        message.chat.id,
+        message.text if message.text else message.caption,
+        message.photo[-1].file_id if message.photo else None,
+        data['segment'], data['run_at'], data['interval'], data['spread'],
+        source_chat_id=message.chat.id, source_message_ids=message_source(messages)
+    )
+    await message.answer(
+        f"✅ Reja #{schedule['id']} saqlandi: {format_time(schedule['run_at'])}\n"
+        f"❌ Bekor qilish: /unschedule_{schedule['id']}",
+        reply_markup=get_admin_keyboard()
+    )
+    await state.clear()
+
+
+@router.message(Command(re.compile(r"unschedule_(\d+)")))
+async def unschedule_handler(message: Message, command: CommandObject):
+    """Rejani bekor qilish"""
+    if not is_admin(message.from_user.id):
+        return
+
+    schedule_id = int(command.regexp_match.group(1))
+    if await db.cancel_schedule(schedule_id):
+        await message.answer(f"🗑 Reja #{schedule_id} bekor qilindi.")
+    else:
+        await message.answer("❌ Topilmadi yoki allaqachon yakunlangan.")
+
+
 @router.message(Command("msg"))
 async def broadcast_message_handler(message: Message):
-    """Barcha vazifani bajargan foydalanuvchilarga xabar yuborish - Tuzatilgan versiya"""
+    """Barcha vazifani bajargan foydalanuvchilarga muvaffaqiyat xabarini yuborish
 
-    # Vazifani bajargan barcha foydalanuvchilarni olish
-    completed_users = await db.get_completed_users()
+    Har bir kampaniya o'z havolasini oladi - kampaniya bo'yicha alohida yuboriladi.
+    """
+    if not is_admin(message.from_user.id):
+        return
+
+    started = []
+    for campaign in [None] + await campaigns.all():
+        segment = Segment(completed=True, campaign=campaign['slug'] if campaign else DEFAULT_CAMPAIGN)
+        if not await db.count_segment(segment):
+            continue
+        broadcast = await start_broadcast(
+            message.bot, message.chat.id, await success_message(campaign), None, segment
+        )
+        started.append(broadcast)
 
-    if not completed_users:
+    if not started:
         await message.answer("❌ Hozircha vazifani bajargan foydalanuvchilar yo'q.")
         return
 
-    success_message = """Tabriklayman, siz muvaffaqiyatli ro'yxatdan o'tdingiz 🥳
+    for broadcast in started:
+        await message.answer(
+            f"📤 Xabar yuborish #{broadcast['id']} fonda boshlandi.\n"
+            f"🎯 Auditoriya: {broadcast['segment']}\n"
+            f"👥 Jami: {broadcast['total']} foydalanuvchi"
+        )
 
-https://t.me/+mnyDxW0Zsug3MmRi
 
-Darsliklar shu kanalga yuboriladi. Qo'shilib oling!"""
+async def get_campaign_arg(message: Message, command: CommandObject) -> Optional[Dict]:
+    """Buyruqdagi kampaniya slugi bo'yicha kampaniya (topilmasa - xabar yuboriladi)"""
+    slug = (command.args or "").strip().lower()
+    campaign = await campaigns.by_slug(slug) if slug else None
+    if not campaign:
+        await message.answer("❌ Kampaniya topilmadi. Ro'yxat: /campaigns")
+    return campaign
 
-    # Xabar yuborish jarayoni
-    sent_count = 0
-    error_details = {
-        "blocked": 0,
-        "deleted": 0,
-        "deactivated": 0,
-        "other": 0
-    }
 
-    # Progress xabari
-    progress_message = await message.answer(
-        f"📤 Xabar yuborish boshlandi...\n👥 Jami: {len(completed_users)} foydalanuvchi")
+@router.message(Command("campaigns"))
+async def campaigns_handler(message: Message):
+    """Kampaniyalar ro'yxati: havola, shartlar, foydalanuvchilar soni"""
+    if not is_admin(message.from_user.id):
+        return
 
-    for i, user in enumerate(completed_users, 1):
-        success, error_type = await safe_send_message(
-            bot=message.bot,
-            user_id=user['telegram_id'],
-            text=success_message
+    bot_info = await message.bot.me()
+    text = "🎯 <b>Kampaniyalar:</b>\n\n"
+    for campaign in [None] + await campaigns.all():
+        slug = campaign['slug'] if campaign else DEFAULT_CAMPAIGN
+        users = await db.count_segment(Segment(campaign=slug))
+        completed = await db.count_segment(Segment(completed=True, campaign=slug))
+        link = f"https://t.me/{bot_info.username}?start={CAMPAIGN_PREFIX}{slug}" if campaign else f"https://t.me/{bot_info.username}"
+        title = html.quote(campaign['title'] or slug) if campaign else "Standart"
+        text += (
+            f"• <b>{title}</b> (<code>{slug}</code>)\n"
+            f"   🔗 {link}\n"
+            f"   👥 {users} ta, ✅ {completed} ta, shart: {required_referrals(campaign)} ta referal\n"
+            f"   🎁 {reward_link(campaign)}\n"
         )
+    text += (
+        "\n➕ Yaratish/o'zgartirish: <code>/campaign slug [referrals=6] [link=https://t.me/+...] [Nomi]</code>\n"
+        "📺 Kanal: <code>/campaign_channel kanal_id slug|all</code>\n"
+        "📝 Content: <code>/campaign_content slug</code>, 🖼 rasm: <code>/campaign_image slug</code>"
+    )
+    await message.answer(text, disable_web_page_preview=True)
 
-        if success:
-            sent_count += 1
+
+@router.message(Command("campaign"))
+async def campaign_save_handler(message: Message, command: CommandObject):
+    """Kampaniya yaratish yoki sozlamalarini o'zgartirish"""
+    if not is_admin(message.from_user.id):
+        return
+
+    args = (command.args or "").split()
+    if not args:
+        await message.answer("❌ Format: <code>/campaign slug [referrals=6] [link=URL] [Nomi]</code>")
+        return
+
+    slug = args[0].lower()
+    if not SLUG_PATTERN.match(slug) or slug == DEFAULT_CAMPAIGN:
+        await message.answer("❌ Slug: 1-32 ta kichik lotin harfi, raqam yoki _ (default emas).")
+        return
+
+    referrals, link, title = None, None, []
+    for arg in args[1:]:
+        key, _, value = arg.partition("=")
+        if key == "referrals" and value.isdigit() and int(value) > 0:
+            referrals = int(value)
+        elif key == "link" and value.startswith("https://"):
+            link = value
         else:
-            if error_type == "blocked":
-                error_details["blocked"] += 1
-            elif error_type == "deleted":
-                error_details["deleted"] += 1
-            elif error_type == "deactivated":
-                error_details["deactivated"] += 1
\ No newline at end of file
+            title.append(arg)
+
+    campaign = await db.save_campaign(slug, " ".join(title) or None, referrals, link)
+    bot_info = await message.bot.me()
+    await message.answer(
+        f"✅ Kampaniya saqlandi: <b>{html.quote(campaign['title'] or slug)}</b>\n"
+        f"🔗 https://t.me/{bot_info.username}?start={CAMPAIGN_PREFIX}{slug}\n"
+        f"👥 Shart: {required_referrals(campaign)} ta referal\n"
+        f"🎁 {reward_link(campaign)}",
+        disable_web_page_preview=True
+    )
+
+
+@router.message(Command("campaign_channel"))
+async def campaign_channel_handler(message: Message, command: CommandObject):
+    """Kanalni kampaniyaga bog'lash (all - barcha kampaniyalar uchun umumiy)"""
+    if not is_admin(message.from_user.id):
+        return
+
+    args = (command.args or "").split()
+    if len(args) != 2:
+        await message.answer("❌ Format: <code>/campaign_channel kanal_id slug|all</code>")
+        return
+
+    channel_id, slug = args[0], args[1].lower()
+    campaign = None
+    if slug != "all":
+        campaign = await campaigns.by_slug(slug)
+        if not campaign:
+            await message.answer("❌ Kampaniya topilmadi. Ro'yxat: /campaigns")
+            return
+
+    if await db.set_channel_campaign(channel_id, campaign['id'] if campaign else None):
+        target = f"kampaniya <b>{html.quote(slug)}</b>" if campaign else "barcha kampaniyalar"
+        await message.answer(f"✅ {html.quote(channel_id)} kanali: {target}")
+    else:
+        await message.answer("❌ Aktiv kanal topilmadi!")
+
+
+@router.message(Command("campaign_content"))
+async def campaign_content_handler(message: Message, command: CommandObject, state: FSMContext):
+    """Kampaniya taklif posti matni"""
+    if not is_admin(message.from_user.id):
+        return
+
+    campaign = await get_campaign_arg(message, command)
+    if campaign:
+        await ask_content(message, state, campaign)
+
+
+@router.message(Command("campaign_image"))
+async def campaign_image_handler(message: Message, command: CommandObject, state: FSMContext):
+    """Kampaniya taklif rasmi"""
+    if not is_admin(message.from_user.id):
+        return
+
+    campaign = await get_campaign_arg(message, command)
+    if campaign:
+        await ask_invitation_image(message, state, campaign)
+
+
+@router.message(Command("templates"))
+async def templates_handler(message: Message):
+    """O'zgartirish mumkin bo'lgan xabar matnlari ro'yxati"""
+    if not is_admin(message.from_user.id):
+        return
+
+    text = "✏️ <b>Xabar matnlari:</b>\n\n"
+    for name, spec in TEMPLATES.items():
+        mark = "✏️" if await templates.is_custom(name) else "▫️"
+        variables = " ".join(f"{{{variable}}}" for variable in spec.variables)
+        text += f"{mark} <code>{name}</code> - {html.quote(spec.description)}"
+        text += f" <code>{variables}</code>\n" if variables else "\n"
+    text += (
+        "\n✏️ - o'zgartirilgan\n"
+        "O'zgartirish: <code>/template nom</code>\n"
+        "Standartga qaytarish: <code>/template_reset nom</code>"
+    )
+    await message.answer(text)
+
+
+@router.message(Command("template"))
+async def template_edit_handler(message: Message, command: CommandObject, state: FSMContext):
+    """Matnni ko'rsatish va yangisini so'rash"""
+    if not is_admin(message.from_user.id):
+        return
+
+    name = (command.args or "").strip()
+    if name not in TEMPLATES:
+        await message.answer("❌ Bunday matn yo'q. Ro'yxat: /templates")
+        return
+
+    spec = TEMPLATES[name]
+    variables = ", ".join(f"{{{variable}}}" for variable in spec.variables) or "yo'q"
+    await message.answer(
+        f"✏️ <b>{name}</b> - {html.quote(spec.description)}\n"
+        f"O'zgaruvchilar: <code>{variables}</code>\n\n"
+        f"Hozirgi matn:\n<pre>{html.quote(await templates.body(name))}</pre>\n\n"
+        "📝 Yangi matnni yuboring (formatlash saqlanadi):",
+        reply_markup=get_cancel_keyboard()
+    )
+    await state.update_data(template=name)
+    await state.set_state(AdminStates.waiting_for_template)
+
+
+@router.message(AdminStates.waiting_for_template)
+async def template_save_process(message: Message, state: FSMContext):
+    """Yangi matnni tekshirib saqlash - bot qayta ishga tushirilmaydi"""
+    if message.text == "❌ Bekor qilish":
+        await state.clear()
+        await message.answer("❌ Bekor qilindi.", reply_markup=get_admin_keyboard())
+        return
+
+    if not message.text:
+        await message.answer("❌ Iltimos, matn yuboring!")
+        return
+
+    name = (await state.get_data())['template']
+    body = message.html_text
+    try:
+        compile_template(name, body)
+    except ValueError as e:
+        await message.answer(f"❌ {html.quote(str(e))}\n\nQayta yuboring yoki bekor qiling.")
+        return
+
+    await db.set_template(name, body)
+    await state.clear()
+    await message.answer(f"✅ <code>{name}</code> matni yangilandi.", reply_markup=get_admin_keyboard())
+
+
+@router.message(Command("template_reset"))
+async def template_reset_handler(message: Message, command: CommandObject):
+    """Matnni standartga qaytarish"""
+    if not is_admin(message.from_user.id):
+        return
+
+    name = (command.args or "").strip()
+    if name not in TEMPLATES:
+        await message.answer("❌ Bunday matn yo'q. Ro'yxat: /templates")
+        return
+
+    if await db.delete_template(name):
+        await message.answer(f"✅ <code>{name}</code> standart matnga qaytarildi.")
+    else:
+        await message.answer(f"ℹ️ <code>{name}</code> allaqachon standart.")
+
+
+@router.message(Command("reminders"))
+async def reminders_handler(message: Message):
+    """Vazifani bajarmaganlarga yuborilgan eslatmalar"""
+    if not is_admin(message.from_user.id):
+        return
+
+    stats = await db.get_reminder_stats()
+    status = (
+        f"har {int(settings.REMINDER_INTERVAL // 60)} daqiqada, /start dan "
+        f"{int(settings.REMINDER_DELAY // 3600)} soat keyin, {settings.REMINDER_RATE:g} xabar/s"
+        if settings.REMINDER_INTERVAL > 0 else "o'chirilgan"
+    )
+    await message.answer(
+        f"🔔 <b>Eslatmalar</b> ({status})\n\n"
+        f"📺 Kanallarga qo'shilmaganlar: {stats.get('channels', 0)}\n"
+        f"👥 Referallari yetmaganlar: {stats.get('referrals', 0)}\n\n"
+        "✏️ Matnlar: <code>/template reminder_channels</code>, <code>/template reminder_referrals</code>"
+    )
+
+
+@router.message(Command("health"))
+async def health_handler(message: Message):
+    """Botning hozirgi holati: event loop, handlerlar, database, keshlar, navbatlar"""
+    if not is_admin(message.from_user.id):
+        return
+
+    await message.answer(await render_health())
+
+
+@router.message(Command("stalls"))
+async def stalls_handler(message: Message, command: CommandObject):
+    """Event loop'ni bloklagan joylar (LOOP_WATCHDOG_MS yoqilgan bo'lsa)"""
+    if not is_admin(message.from_user.id):
+        return
+
+    if not loop_watchdog:
+        await message.answer(
+            "ℹ️ Watchdog o'chirilgan. Yoqish: <code>LOOP_WATCHDOG_MS=100</code> (millisekund) va botni qayta ishga tushiring."
+        )
+        return
+
+    if (command.args or "").strip() == "reset":
+        loop_watchdog.reset()
+        await message.answer("✅ To'xtashlar tozalandi.")
+        return
+
+    await message.answer(render_stalls(loop_watchdog))
+
+
+@router.message(Command("queries"))
+async def queries_handler(message: Message, command: CommandObject):
+    """Eng ko'p vaqt olgan database so'rovlari, rejasi bilan (DB_TRACE=1 bo'lsa)"""
+    if not is_admin(message.from_user.id):
+        return
+
+    tracer = db.tracer
+    if not tracer:
+        await message.answer(
+            "ℹ️ So'rovlar kuzatilmayapti. Yoqish: <code>DB_TRACE=1</code> va botni qayta ishga tushiring."
+        )
+        return
+
+    action = (command.args or "").strip()
+    if action == "reset":
+        tracer.reset()
+        await message.answer("✅ So'rovlar statistikasi tozalandi.")
+        return
+
+    await tracer.explain_slowest(db.explain_query, QUERY_REPORT_SIZE)
+    if action == "dump":
+        await asyncio.to_thread(tracer.dump, settings.DB_TRACE_FILE)
+        await message.answer_document(
+            FSInputFile(settings.DB_TRACE_FILE),
+            caption=f"🗄 {len(tracer.statements)} ta so'rov"
+        )
+        return
+
+    entries = tracer.top(QUERY_REPORT_SIZE)
+    if not entries:
+        await message.answer("ℹ️ Hali so'rovlar yo'q.")
+        return
+
+    lines = [f"🗄 <b>Eng og'ir so'rovlar</b> ({tracer.started_at:%d.%m %H:%M} UTC dan beri)"]
+    for number, entry in enumerate(entries, 1):
+        site = entry.sites.most_common(1)[0][0] if entry.sites else "noma'lum"
+        lines.append(
+            f"\n<b>{number}.</b> jami {entry.total * 1000:.0f} ms, {entry.calls} marta, "
+            f"o'rtacha {entry.total / entry.calls * 1000:.2f} ms, {entry.rows / entry.calls:.1f} qator\n"
+            f"<code>{html.quote(entry.sql[:160])}</code>\n"
+            f"📍 {html.quote(site)}"
+        )
+        if entry.scans:
+            lines.append(f"⚠️ To'liq skan: {html.quote('; '.join(entry.scans)[:200])}")
+    lines.append("\nFayl: <code>/queries dump</code>, tozalash: <code>/queries reset</code>")
+    await message.answer("\n".join(lines))
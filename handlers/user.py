@@ -1,6 +1,7 @@
 import logging
+from typing import Dict, List, Optional, Tuple
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.types import Message, CallbackQuery
 from aiogram.filters import CommandStart, Command
 from aiogram.fsm.context import FSMContext
 from aiogram.utils.keyboard import InlineKeyboardBuilder
@@ -8,10 +9,58 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 from config import settings
 from database.database import db
 from keyboards.keyboards import get_start_keyboard, get_offer_keyboard
+from utils.antifraud import fraud_detector
+from utils.cache import VersionedCache
+from utils.campaigns import campaigns, parse_campaign_payload, required_referrals, reward_link
+from utils.helpers import credit_referral
+from utils.media import file_ids
+from utils.templates import templates
 
 router = Router()
 logger = logging.getLogger(__name__)
 
+# Kanal/content/matnlar versiyasi bo'yicha oldindan render qilingan matnlar (kampaniya bo'yicha)
+render_cache = VersionedCache("Matnlar")
+
+
+def render_channel_list(channels: List[Dict]) -> str:
+    """Xush kelibsiz matnidagi kanallar ro'yxati"""
+    parts = []
+    # Har bir kanal uchun ma'lumot qo'shish
+    for channel in channels:
+        parts.append(f"📌 <b>{channel['channel_name']}</b>\n")
+        if channel['channel_link']:
+            parts.append(f"🔗 {channel['channel_link']}\n\n")
+    return "".join(parts)
+
+
+async def get_welcome_text(channels: Optional[List[Dict]] = None, campaign_id: int = None) -> str:
+    """Xush kelibsiz matni (kanallar yoki matn o'zgarmaguncha keshdan)"""
+    version = (db.channels_version, db.templates_version)
+    welcome_text = render_cache.get(("welcome", campaign_id), version)
+    if welcome_text is None:
+        # Kanallar ma'lumotini database'dan olish (agar berilmagan bo'lsa)
+        if channels is None:
+            channels = await db.get_campaign_channels(campaign_id)
+        if channels:
+            welcome_text = await templates.render("welcome", channels=render_channel_list(channels))
+        else:
+            welcome_text = await templates.render("welcome_empty")
+        render_cache.set(("welcome", campaign_id), version, welcome_text)
+    return welcome_text
+
+
+async def get_offer_content(campaign_id: int = None) -> Tuple[Optional[Dict], Optional[str]]:
+    """Aktiv content va taklif rasmi (content o'zgarmaguncha keshdan)"""
+    version = db.content_version
+    cached = render_cache.get(("offer", campaign_id), version)
+    if cached is None:
+        content = await db.get_active_content(campaign_id)
+        invitation_image = await db.get_invitation_image(campaign_id)
+        cached = (content, invitation_image)
+        render_cache.set(("offer", campaign_id), version, cached)
+    return cached
+
 
 @router.message(CommandStart())
 async def start_handler(message: Message, state: FSMContext):
@@ -23,102 +72,72 @@ async def start_handler(message: Message, state: FSMContext):
     first_name = message.from_user.first_name
     last_name = message.from_user.last_name
 
-    # Referral kodni tekshirish
+    # Kampaniya havolasi (c_<slug>) yoki referral kodni tekshirish
     referred_by = None
+    campaign_id = None
     if len(message.text.split()) > 1:
-        referral_code = message.text.split()[1]
-        referrer = await db.get_user_by_referral(referral_code)
-        if referrer:
-            referred_by = referrer['telegram_id']
+        payload = message.text.split()[1]
+        slug = parse_campaign_payload(payload)
+        if slug:
+            campaign = await campaigns.by_slug(slug)
+            if campaign:
+                campaign_id = campaign['id']
+        else:
+            referrer = await db.get_user_by_referral(payload)
+            if referrer:
+                referred_by = referrer['telegram_id']
+                # Taklif qilingan foydalanuvchi referrer kampaniyasiga qo'shiladi
+                campaign_id = referrer['campaign_id']
+
+    # Foydalanuvchi va kanallar holati - bitta so'rovda
+    dashboard = await db.get_user_dashboard(telegram_id, campaign_id)
 
     # Foydalanuvchini tekshirish yoki yaratish
-    user = await db.get_user(telegram_id)
+    user = dashboard['user']
     if not user:
         user = await db.create_user(
             telegram_id=telegram_id,
             username=username,
             first_name=first_name,
             last_name=last_name,
-            referred_by=referred_by
+            referred_by=referred_by,
+            campaign_id=campaign_id
         )
 
         # Agar referral orqali kelgan bo'lsa, referrerni sanagichini oshirish
-        if referred_by:
-            await db.update_referral_count(referred_by)
-
-            # Referrerni vazifasi bajarilganligini tekshirish
-            referrer_user = await db.get_user(referred_by)
-            if referrer_user['referral_count'] >= settings.REQUIRED_REFERRALS:
-                await db.complete_task(referred_by)
-
-                # Referrerni xabardor qilish
-                try:
-                    success_message = """
-Tabriklayman, siz muvaffaqiyatli ro'yxatdan o'tdingiz 🥳
-
-https://t.me/+mnyDxW0Zsug3MmRi
-
-Darsliklar shu kanalga yuboriladi. Qo'shilib oling!
-                    """
-                    await message.bot.send_message(referred_by, success_message)
-                except Exception as e:
-                    logger.error(f"Referrerga xabar yuborishda xato: {e}")
-
-    # Kanallar ma'lumotini database'dan olish
-    channels = await db.get_active_channels()
-
-    if channels:
-        welcome_text = """
-Bepul darsliklarni qo'lga kiritish uchun quyidagi kanallarga a'zo bo'ling👇
-
-<b>📺 Kanallar:</b>
-
-"""
-        # Har bir kanal uchun ma'lumot qo'shish
-        for channel in channels:
-            welcome_text += f"📌 <b>{channel['channel_name']}</b>\n"
-            if channel['channel_link']:
-                welcome_text += f"🔗 {channel['channel_link']}\n\n"
-
-        welcome_text += "✅ Barcha kanallarga a'zo bo'lgandan so'ng \"Tekshirish\" tugmasini bosing!"
-    else:
-        welcome_text = """
-👋 Assalomu alaykum!
-
-🎓 Bepul darsliklar olish uchun botdan foydalaning.
-
-⚠️ Hozirda aktiv kanallar yo'q. Admin bilan bog'laning.
-        """
-
+        # (create_user None qaytarsa - foydalanuvchi parallel so'rovda yaratilgan)
+        if user and referred_by:
+            # Shubhali referallar admin tekshiruviga qoldiriladi
+            score, reasons = fraud_detector.check(
+                referred_by, telegram_id, username, last_name
+            )
+            if score >= settings.FRAUD_SCORE_THRESHOLD:
+                await db.add_referral_hold(referred_by, telegram_id, score, ", ".join(reasons))
+                logger.warning(f"Shubhali referal: {referred_by} <- {telegram_id} ({score}: {reasons})")
+            else:
+                if reasons:
+                    logger.info(f"Referal belgilandi (hisoblandi): {referred_by} <- {telegram_id} ({reasons})")
+                await credit_referral(message.bot, referred_by, telegram_id)
+
+    # Mavjud foydalanuvchi o'z kampaniyasida qoladi
+    if user:
+        campaign_id = user['campaign_id']
+    welcome_text = await get_welcome_text(dashboard['channels'], campaign_id)
     await message.answer(welcome_text, reply_markup=get_start_keyboard())
 
 
 @router.message(F.text == "✅ Tekshirish")
 async def check_membership_handler(message: Message):
-    #  Darsliklarni olish
-    link = 'https://t.me/+mnyDxW0Zsug3MmRi'
+    #  Darsliklarni olish (foydalanuvchi kampaniyasi havolasi)
+    user = await db.get_user(message.from_user.id)
+    campaign = await campaigns.get(user['campaign_id'] if user else None)
     keyboard = InlineKeyboardBuilder()
-    keyboard.button(text=" Darsliklarni olish", url=link)
+    keyboard.button(text=await templates.render("check_membership_button"), url=reward_link(campaign))
 
-    await message.answer('''
-    HAR TOMONLAMA RIVOJLANISHNI ISTAGANLAR UCHUN 🔝
-
-✨ Assalomu alaykum, muslimam!
-
-Bu yerda 5 nafar mutaxassis o'z tajribasi va bilimlarini jamlab, siz uchun bepul darslik tayyorlashdi. Har bir mavzu — rivojingiz uchun muhim:
-
-📌 Gulruh – "Hammasi blogdan boshlanadi"
-📌 Ayilen – Oila qurishga tayyorgarlik va qo'rquvlarni yengish
-📌 Mohinur Barista – Koreyada yashash va o'qish imkoniyatlari
-📌 Xilola Qayumova – "Homiladorlar bilishi shart"
-📌 Sojida Karimova – Sog'lom munosabatlar siri
-
-📖 Bu loyiha sizga maksimal foyda berish va yangi imkoniyatlarga yo'l ochish uchun takrorlanmas imkon.
-
-Yagona shart - bot bergan taklif postini atigi 6 ta yaqiningizga yuborish, xolos!
-
-Darsliklar jamlangan kanalga linkni olish uchun👇
-    ''', reply_markup=keyboard.as_markup())
+    await message.answer(
+        await templates.render("check_membership", referrals=required_referrals(campaign)),
+        reply_markup=keyboard.as_markup()
+    )
 
 
 @router.message(F.text == "Taklif postini olish")
@@ -132,7 +151,7 @@ async def send_offer_post(message: Message):
         return
 
     # Referral linkni yaratish
-    bot_info = await message.bot.get_me()
+    bot_info = await message.bot.me()
     bot_username = bot_info.username
     referral_link = f"https://t.me/{bot_username}?start={user['referral_code']}"
 
@@ -141,47 +160,30 @@ async def send_offer_post(message: Message):
     builder.button(text="🔥 Ishtirok etish", url=referral_link)
 
     # Database'dan taklif posti matnini olish
-    content = await db.get_active_content()
-    invitation_post_text = content['text_content'] if content and content['text_content'] else """
-✨ Bepul darslik loyihasi start oldi!
-
-5 nafar mutaxassis siz uchun turli sohalarda bepul darslar tayyorlashdi:
-🌱 Blog yuritish  
-🌱 Oila qurishga tayyorgarlik
-🌱 Koreyada o'qish va yashash
-🌱 Homiladorlikda muhim ma'lumotlar
-🌱 Sog'lom munosabatlar
-
-✅ Hayotning eng muhim bosqichlarida kerak bo'ladigan bilimlarni bir joyda jamladik. Endi siz ham mutaxassislardan eshitasiz, mutlaqo BEPUL!
-
-👇 Ishtirok etish tugmasini bosing va darslikni birinchi bo'lib qo'lga kiriting!
-    """
+    content, invitation_image = await get_offer_content(user['campaign_id'])
+    invitation_post_text = (
+        content['text_content'] if content and content['text_content'] else await templates.render("offer")
+    )
 
     # Taklif rasmi tugma bilan birga yuborish
-    invitation_image = await db.get_invitation_image()
     if invitation_image:
         try:
-            import os
-            if os.path.exists(invitation_image):
-                photo_file = FSInputFile(invitation_image)
-                await message.answer_photo(
-                    photo=photo_file,
-                    caption=invitation_post_text,
-                    reply_markup=builder.as_markup()
-                )
-            else:
-                await message.answer_photo(
-                    photo=invitation_image,
-                    caption=invitation_post_text,
-                    reply_markup=builder.as_markup()
-                )
+            # Lokal fayl faqat birinchi marta yuklanadi, keyin - keshdagi file_id
+            sent = await message.answer_photo(
+                photo=await file_ids.resolve(invitation_image),
+                caption=invitation_post_text,
+                reply_markup=builder.as_markup()
+            )
+            await file_ids.remember(invitation_image, sent)
         except Exception as e:
+            # Eskirgan file_id bo'lishi mumkin - keyingi safar fayl qayta yuklanadi
+            await file_ids.forget(invitation_image)
             logger.error(f"Taklif rasmi yuborishda xato: {e}")
             await message.answer(invitation_post_text, reply_markup=builder.as_markup())
     else:
         await message.answer(invitation_post_text, reply_markup=builder.as_markup())
 
-    await message.answer("Muvaffaqiyat tilayman! 🚀", reply_markup=get_start_keyboard())
+    await message.answer(await templates.render("offer_done"), reply_markup=get_start_keyboard())
 
 
 
@@ -191,22 +193,6 @@ async def send_offer_post(message: Message):
 @router.message(F.text == "ℹ️ Yordam")
 async def help_handler(message: Message):
     """Yordam ma'lumotlari"""
-    help_text = """
-ℹ️ <b>Bot haqida ma'lumot:</b>
-
-🎯 <b>Maqsad:</b> Bepul darsliklar olish
-
-📋 <b>Qadamlar:</b>
-1️⃣ Barcha kanallarga qo'shiling
-2️⃣ Sizning linkingiz orqali 6 ta odam qo'shiling
-3️⃣ Darsliklarni oling!
-
-🔗 <b>Linkni qanday ulashish:</b>
-• Do'stlaringizga yuboring
-• Ijtimoiy tarmoqlarda ulashing
-• Guruplarda bo'lishing
-
-❓ <b>Savollaringiz bo'lsa:</b>
-Admin bilan bog'laning
-    """
-    await message.answer(help_text)
\ No newline at end of file
+    user = await db.get_user(message.from_user.id)
+    campaign = await campaigns.get(user['campaign_id'] if user else None)
+    await message.answer(await templates.render("help", referrals=required_referrals(campaign)))
@@ -1,8 +1,11 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from typing import List, Dict
+from functools import lru_cache
+from typing import List, Dict, Tuple
 
 
+# Statik keyboardlar bir marta yaratiladi va qayta ishlatiladi
+@lru_cache(maxsize=None)
 def get_start_keyboard() -> ReplyKeyboardMarkup:
     """Boshlang'ich keyboard"""
     keyboard = ReplyKeyboardMarkup(
@@ -15,6 +18,7 @@ def get_start_keyboard() -> ReplyKeyboardMarkup:
     return keyboard
 
 
+@lru_cache(maxsize=None)
 def get_admin_keyboard() -> ReplyKeyboardMarkup:
     """Admin keyboard"""
     keyboard = ReplyKeyboardMarkup(
@@ -22,7 +26,8 @@ def get_admin_keyboard() -> ReplyKeyboardMarkup:
             [KeyboardButton(text="➕ Kanal qo'shish"), KeyboardButton(text="➖ Kanal o'chirish")],
             [KeyboardButton(text="🗑 Barcha kanallarni o'chirish"), KeyboardButton(text="📊 Statistika")],
             [KeyboardButton(text="📝 Content o'rnatish"), KeyboardButton(text="🖼 Taklif rasmi")],
-            [KeyboardButton(text="📢 Xabar yuborish"), KeyboardButton(text="🔙 Orqaga")]
+            [KeyboardButton(text="📢 Xabar yuborish"), KeyboardButton(text="📤 Kanallar eksporti")],
+            [KeyboardButton(text="📥 Foydalanuvchilar eksporti"), KeyboardButton(text="🔙 Orqaga")]
         ],
         resize_keyboard=True
     )
@@ -31,24 +36,35 @@ def get_admin_keyboard() -> ReplyKeyboardMarkup:
 
 def get_channels_keyboard(channels: List[Dict], user_channels: List[Dict]) -> InlineKeyboardMarkup:
     """Kanallar ro'yxati keyboard"""
-    builder = InlineKeyboardBuilder()
-
     # User qo'shilgan kanallarni tekshirish
     joined_channels = {ch['channel_id']: ch.get('joined', 0) for ch in user_channels}
 
-    for channel in channels:
-        status = "✅" if joined_channels.get(str(channel['id']), 0) else "❌"
-        text = f"{status} {channel['channel_name']}"
+    key = tuple(
+        (channel['id'], channel['channel_name'], channel['channel_link'],
+         bool(joined_channels.get(str(channel['id']), 0)))
+        for channel in channels
+    )
+    return _build_channels_keyboard(key)
+
+
+@lru_cache(maxsize=1024)
+def _build_channels_keyboard(key: Tuple[Tuple, ...]) -> InlineKeyboardMarkup:
+    """Kanallar keyboardini (id, nom, link, holat) kaliti bo'yicha yaratish"""
+    builder = InlineKeyboardBuilder()
+
+    for channel_pk, channel_name, channel_link, joined in key:
+        status = "✅" if joined else "❌"
+        text = f"{status} {channel_name}"
 
-        if channel['channel_link']:
+        if channel_link:
             builder.button(
                 text=text,
-                url=channel['channel_link']
+                url=channel_link
             )
         else:
             builder.button(
                 text=text,
-                callback_data=f"channel_{channel['id']}"
+                callback_data=f"channel_{channel_pk}"
             )
 
     builder.button(
@@ -60,6 +76,7 @@ def get_channels_keyboard(channels: List[Dict], user_channels: List[Dict]) -> In
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def get_offer_keyboard() -> ReplyKeyboardMarkup:
     """Taklif posti olish uchun keyboard"""
     keyboard = ReplyKeyboardMarkup(
@@ -70,6 +87,7 @@ def get_offer_keyboard() -> ReplyKeyboardMarkup:
     )
     return keyboard
 
+@lru_cache(maxsize=None)
 def get_cancel_keyboard() -> ReplyKeyboardMarkup:
     """Bekor qilish keyboard"""
     keyboard = ReplyKeyboardMarkup(
@@ -1,61 +1,75 @@
 import asyncio
+import importlib
 import logging
+import time
+from typing import List
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 
 from config import settings
 from database.database import db
-from handlers import user, admin
-
-# Logging sozlash
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+from utils.antifraud import load_fraud_state, persist_fraud_state, save_fraud_state
+from utils.broadcast import pause_broadcasts, resume_broadcasts
+from utils.idempotency import update_deduplicator
+from utils.health import loop_monitor
+from utils.lifecycle import InFlightMiddleware, in_flight, install_signal_handlers
+from utils.logs import log_context_middleware, log_pipeline, run_log_summaries, send_errors
+from utils.reminders import run_reminders
+from utils.reverify import run_reverification
+from utils.scheduler import run_scheduler
+from utils.templates import templates
+from utils.watchdog import loop_watchdog
+
+# Logging sozlash (navbat orqali, alohida oqimda yoziladi)
+log_pipeline.start()
 logger = logging.getLogger(__name__)
 
 
-async def main():
-    # Database initializatsiya
-    await db.init_db()
-
-    # Standart kanallarni qo'shish (faqat agar mavjud bo'lmasa)
+# Router'lar shu tartibda ulanadi
+HANDLER_MODULES = ("handlers.user", "handlers.admin")
 
+DEFAULT_CONTENT_TITLE = "Bepul Bilimlar Loyihasi"
 
 
-    # Mavjud kanallarni tekshirish
-    existing_channels = await db.get_active_channels()
-    existing_channel_ids = [ch['channel_id'] for ch in existing_channels]
+def load_handlers():
+    """Handler modullarini import qilish (alohida oqimda - database bilan parallel)"""
+    return [importlib.import_module(name) for name in HANDLER_MODULES]
 
 
+async def ensure_default_content():
+    """Standart contentni o'rnatish (faqat agar mavjud bo'lmasa)"""
+    if await db.get_active_content():
+        logger.info("ℹ️ Content allaqachon mavjud - yangilanmadi")
+        return
+    await db.set_content(DEFAULT_CONTENT_TITLE, await templates.render("offer"))
+    logger.info("✅ Standart content o'rnatildi")
 
-    # Standart contentni o'rnatish (faqat agar mavjud bo'lmasa)
-    existing_content = await db.get_active_content()
-    if not existing_content:
-        default_content_title = "Bepul Bilimlar Loyihasi"
-        default_content_text = """
-✨ Bepul darslik loyihasi start oldi!
 
-5 nafar mutaxassis siz uchun turli sohalarda bepul darslar tayyorlashdi:
-🌱 Blog yuritish
-🌱 Oila qurishga tayyorgarlik
-🌱 Koreyada o'qish va yashash
-🌱 Homiladorlikda muhim ma'lumotlar
-🌱 Sog'lom munosabatlar
+async def warm_up(bot: Bot, user_handlers):
+    """Keshlarni oldindan to'ldirish: bot ma'lumoti, xush kelibsiz matni, taklif posti"""
+    async def content():
+        await ensure_default_content()
+        await user_handlers.get_offer_content()
 
-✅ Hayotning eng muhim bosqichlarida kerak bo'ladigan bilimlarni bir joyda jamladik. Endi siz ham mutaxassislardan eshitasiz, mutlaqo BEPUL!
+    results = await asyncio.gather(
+        bot.me(), user_handlers.get_welcome_text(), content(),
+        return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            logger.warning(f"Keshni to'ldirishda xato: {result}")
 
-👉 Ishtirok etish tugmasini bosing va darslikni birinchi bo'lib qo'lga kiriting!
-        """.strip()
 
-        # Standart contentni o'rnatish
-        await db.set_content(default_content_title, default_content_text)
-        logger.info("✅ Standart content o'rnatildi")
-    else:
-        logger.info("ℹ️ Content allaqachon mavjud - yangilanmadi")
+async def main():
+    started = time.perf_counter()
 
-    print("✅ Database va kanallar tekshirildi!")
+    # Database va handler importlari parallel
+    migrated, handler_modules = await asyncio.gather(
+        db.init_db(),
+        asyncio.to_thread(load_handlers)
+    )
+    logger.info("✅ Sxema yangilandi" if migrated else "ℹ️ Sxema o'zgarmagan - migratsiya o'tkazib yuborildi")
 
     # Bot va dispatcher yaratish
     bot = Bot(
@@ -66,14 +80,115 @@ async def main():
     dp = Dispatcher()
 
     # Handlerlarni ro'yxatdan o'tkazish
-    dp.include_router(user.router)
-    dp.include_router(admin.router)
+    for module in handler_modules:
+        dp.include_router(module.router)
+
+    # Anti-fraud oynalarini tiklash va keshlarni parallel to'ldirish
+    user_handlers = handler_modules[HANDLER_MODULES.index("handlers.user")]
+    await asyncio.gather(
+        load_fraud_state(db), update_deduplicator.load(db), warm_up(bot, user_handlers)
+    )
+    background_tasks = [
+        asyncio.create_task(persist_fraud_state(db)),
+        asyncio.create_task(update_deduplicator.persist(db)),
+        asyncio.create_task(run_log_summaries()),
+        asyncio.create_task(loop_monitor.run())
+    ]
+
+    # To'xtatilgan xabar yuborishlarni davom ettirish, keyin rejalashtiruvchi
+    resumed = await resume_broadcasts(bot)
+    if resumed:
+        logger.info(f"📤 {resumed} ta xabar yuborish davom ettirildi")
+    background_tasks.append(asyncio.create_task(run_scheduler(bot)))
+    if settings.REVERIFY_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(run_reverification(bot)))
+    if settings.REMINDER_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(run_reminders(bot)))
+
+    if loop_watchdog:
+        loop_watchdog.start()
+
+    # Log yozuvlariga update_id, user_id va handler nomi
+    dp.update.outer_middleware(log_context_middleware)
+    dp.message.middleware(log_context_middleware)
+    dp.callback_query.middleware(log_context_middleware)
+
+    # SIGINT/SIGTERM: polling to'xtatiladi, keyin shutdown() ishlaydi
+    dp.update.outer_middleware(in_flight)
+    # Qayta yuborilgan update'lar (timeout, qayta ishga tushirish) ikki marta ishlanmaydi
+    dp.update.outer_middleware(update_deduplicator)
+    stop_event = asyncio.Event()
+    install_signal_handlers(stop_event.set)
 
     # Botni ishga tushirish
-    logger.info("Bot ishga tushdi...")
-    logger.info("Bot nomi: @bepulbilim_bot (avtomatik aniqlanadi)")
-    await dp.start_polling(bot)
+    logger.info(f"Bot ishga tushdi ({time.perf_counter() - started:.2f} s)")
+    polling = asyncio.create_task(
+        dp.start_polling(bot, handle_signals=False, close_bot_session=False)
+    )
+    stopping = asyncio.create_task(stop_event.wait())
+    try:
+        await asyncio.wait((polling, stopping), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        stopping.cancel()
+        await shutdown(dp, bot, polling, in_flight, background_tasks)
+    # Polling xato bilan tugagan bo'lsa - uni ko'rsatish
+    if not polling.cancelled():
+        polling.result()
+
+
+async def save_query_trace():
+    """So'rovlar hisobotini (eng og'irlarining rejasi bilan) faylga yozish"""
+    try:
+        await db.tracer.explain_slowest(db.explain_query)
+        await asyncio.to_thread(db.tracer.dump, settings.DB_TRACE_FILE)
+        logger.info(f"🗄 So'rovlar hisoboti saqlandi: {settings.DB_TRACE_FILE}")
+    except Exception as e:
+        logger.error(f"So'rovlar hisobotini saqlashda xato: {e}")
+
+
+async def shutdown(dp: Dispatcher, bot: Bot, polling: asyncio.Task,
+                   in_flight: InFlightMiddleware, background_tasks: List[asyncio.Task]):
+    """Yangi update'larni to'xtatish, ishlanayotganlarni kutish, holatni saqlash"""
+    started = time.perf_counter()
+    deadline = started + settings.SHUTDOWN_TIMEOUT
+    logger.info("To'xtatish boshlandi...")
+
+    # Yangi update'larni qabul qilmaslik va polling'ni to'xtatish
+    in_flight.accepting = False
+    if not polling.done():
+        try:
+            await dp.stop_polling()
+        except RuntimeError:
+            # Polling hali boshlanmagan
+            polling.cancel()
+
+    # Fon vazifalari (rejalashtiruvchi yangi broadcast boshlamasligi uchun)
+    for task in background_tasks:
+        task.cancel()
+
+    # Ishlanayotgan handlerlar (ular yangi broadcast boshlashi mumkin), keyin broadcastlar
+    left = await in_flight.drain(deadline - time.perf_counter())
+    if left:
+        logger.warning(f"{left} ta update muddat ichida tugamadi")
+    paused = await pause_broadcasts(deadline - time.perf_counter())
+    if paused:
+        logger.info(f"⏸ {paused} ta xabar yuborish to'xtatildi (kursor saqlandi)")
+
+    # Anti-fraud oynalari, update high-water mark, navbatdagi (write-behind) yozuvlar va ulanishlar
+    await asyncio.gather(save_fraud_state(db), update_deduplicator.save(db))
+    if db.tracer:
+        await save_query_trace()
+    await db.close()
+    await bot.session.close()
+    if loop_watchdog:
+        loop_watchdog.stop()
+    send_errors.flush()
+    log_pipeline.report()
+    logger.info(f"Bot to'xtatildi ({time.perf_counter() - started:.2f} s)")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    try:
+        asyncio.run(main())
+    finally:
+        log_pipeline.stop()
\ No newline at end of file
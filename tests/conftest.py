@@ -0,0 +1,48 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.database import create_database  # noqa: E402
+
+# PostgreSQL testlari uchun bo'sh sinov bazasi - har bir testda public sxema tozalanadi.
+# Berilmasa PostgreSQL testlari o'tkazib yuboriladi
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL", "")
+
+
+@pytest.fixture
+def run():
+    """Korutinani testning o'z event loop'ida bajarish"""
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    loop.close()
+
+
+async def reset_postgres(url: str):
+    import asyncpg
+    conn = await asyncpg.connect(url)
+    try:
+        await conn.execute("DROP SCHEMA public CASCADE; CREATE SCHEMA public")
+    finally:
+        await conn.close()
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def db(request, run, tmp_path):
+    """Ikkala backend uchun toza, sxemasi yaratilgan ombor"""
+    if request.param == "postgres":
+        if not TEST_DATABASE_URL:
+            pytest.skip("TEST_DATABASE_URL berilmagan")
+        run(reset_postgres(TEST_DATABASE_URL))
+        storage = create_database(TEST_DATABASE_URL)
+    else:
+        storage = create_database(str(tmp_path / "test.db"))
+
+    # Yozuvlar faqat flush_writes() da - overlay testlari vaqtga bog'liq bo'lmasin
+    storage.user_channel_buffer.interval = 3600
+    run(storage.init_db())
+    yield storage
+    run(storage.close())
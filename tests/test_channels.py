@@ -0,0 +1,34 @@
+import json
+
+from utils.channels import parse_channel_lines, parse_channels_document
+
+
+def test_parse_csv_with_header_and_errors():
+    data = (
+        "channel_id,channel_name,channel_link\n"
+        "-1001,Kanal,https://t.me/+a\n"
+        "bad,Kanal,https://t.me/+b\n"
+    ).encode("utf-8-sig")
+    rows, errors = parse_channels_document("channels.csv", data)
+    assert rows == [("-1001", "Kanal", "https://t.me/+a")]
+    assert errors == ["3-qator: ID/Link noto'g'ri - bad"]
+
+
+def test_parse_json():
+    data = json.dumps([{"channel_id": "@kanal", "channel_name": "Kanal", "channel_link": "https://t.me/kanal"}, 1])
+    rows, errors = parse_channels_document("channels.JSON", data.encode())
+    assert rows == [("@kanal", "Kanal", "https://t.me/kanal")]
+    assert errors == ["2-element: obyekt bo'lishi kerak"]
+
+
+def test_parse_non_utf8_document():
+    # Excel'dan cp1251 da saqlangan CSV - xato qaytadi, istisno emas
+    data = "-1001,Канал,https://t.me/+a".encode("cp1251")
+    assert parse_channels_document("channels.csv", data) == ([], ["Fayl UTF-8 kodlashda bo'lishi kerak"])
+    assert parse_channels_document("channels.json", data) == ([], ["Fayl UTF-8 kodlashda bo'lishi kerak"])
+
+
+def test_parse_channel_lines_skips_blank():
+    rows, errors = parse_channel_lines("-1001|A|https://t.me/+a\n\n@b|B\n")
+    assert rows == [("-1001", "A", "https://t.me/+a")]
+    assert errors == ["3-qator: format noto'g'ri"]
@@ -0,0 +1,42 @@
+import pytest
+
+from utils import scheduler
+
+RUN_AT = 1_700_000_000
+
+
+@pytest.fixture
+def storage(db, monkeypatch):
+    """Rejalashtiruvchi global `db` o'rniga sinov omboridan foydalanadi"""
+    monkeypatch.setattr(scheduler, "db", db)
+    return db
+
+
+def test_failed_start_keeps_schedule_due(storage, run, monkeypatch):
+    one_off = run(storage.create_schedule(1, "salom", None, "", RUN_AT))
+    recurring = run(storage.create_schedule(1, "har kuni", None, "", RUN_AT, interval=86400))
+
+    async def failing_start(*args, **kwargs):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(scheduler, "start_broadcast", failing_start)
+    with pytest.raises(RuntimeError):
+        run(scheduler.run_due_schedules(None, now=RUN_AT + 60))
+    with pytest.raises(RuntimeError):
+        run(scheduler.run_due_schedules(None, now=RUN_AT + 60))
+    due = run(storage.get_due_schedules(RUN_AT + 60))
+    assert sorted(schedule['id'] for schedule in due) == [one_off['id'], recurring['id']]
+
+    started = []
+
+    async def start(*args, **kwargs):
+        started.append(args[2])
+        return {'id': len(started)}
+
+    monkeypatch.setattr(scheduler, "start_broadcast", start)
+    assert run(scheduler.run_due_schedules(None, now=RUN_AT + 60)) == 2
+    assert sorted(started) == ["har kuni", "salom"]
+    assert run(storage.get_due_schedules(RUN_AT + 60)) == []
+    # Takroriy reja keyingi kunga o'tadi, bir martalik - yakunlanadi
+    assert [schedule['id'] for schedule in run(storage.get_schedules())] == [recurring['id']]
+    assert run(storage.get_schedules())[0]['run_at'] == RUN_AT + 86400
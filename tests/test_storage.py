@@ -0,0 +1,201 @@
+from datetime import datetime, timedelta
+
+from database.segments import Segment
+
+
+async def add_channels(db, *names):
+    """Kanallarni qo'shib, {nom: channels.id} qaytarish"""
+    for number, name in enumerate(names, 1):
+        await db.add_channel(f"-100{number}", name, f"https://t.me/+{name}")
+    return {channel['channel_name']: channel['id'] for channel in await db.get_active_channels()}
+
+
+async def spring_campaign(db):
+    """Umumiy kanal + faqat "spring" kampaniyasi kanali"""
+    campaign = await db.save_campaign("spring", "Bahor", 2, None)
+    channels = await add_channels(db, "common", "spring_only")
+    await db.set_channel_campaign("-1002", campaign['id'])
+    return campaign, channels
+
+
+def names(channels):
+    return sorted(channel['channel_name'] for channel in channels)
+
+
+# Foydalanuvchilar va referral kodlar
+def test_create_user_assigns_referral_code(db, run):
+    user = run(db.create_user(1, "alice", "Alice", None))
+    assert user['telegram_id'] == 1
+    assert user['referral_code'] and not user['referral_code'].startswith("#")
+    assert run(db.get_user_by_referral(user['referral_code']))['telegram_id'] == 1
+
+    other = run(db.create_user(2, "bob", "Bob", None))
+    assert other['referral_code'] != user['referral_code']
+    assert run(db.get_user_by_referral("nope")) is None
+
+
+def test_create_user_twice_returns_none(db, run):
+    assert run(db.create_user(1, "alice", "Alice", None)) is not None
+    assert run(db.create_user(1, "alice", "Alice", None)) is None
+    assert run(db.get_stats())['total_users'] == 1
+
+
+# Referallar
+def test_referral_credit_is_idempotent(db, run):
+    run(db.create_user(1, "a", "A", None))
+    run(db.create_user(2, "b", "B", None, referred_by=1))
+    run(db.create_user(3, "c", "C", None, referred_by=1))
+
+    assert run(db.add_referral_credit(1, 2)) == 1
+    assert run(db.add_referral_credit(1, 2)) is None
+    assert run(db.add_referral_credit(1, 3)) == 2
+    assert run(db.get_user(1))['referral_count'] == 2
+
+
+def test_referral_tree_counts_only_credited(db, run):
+    for telegram_id, referred_by in ((1, None), (2, 1), (3, 1), (4, 3)):
+        run(db.create_user(telegram_id, "u", "U", None, referred_by=referred_by))
+    run(db.add_referral_credit(1, 2))
+    # 3 ushlab qolingan, lekin uning referali 4 hisoblangan
+    run(db.add_referral_hold(1, 3, 4, "test"))
+    run(db.add_referral_credit(3, 4))
+
+    assert run(db.get_referral_subtree(1))['size'] == 1
+    assert run(db.get_viral_coefficients(7))[0]['referred_users'] == 2
+
+    # Tasdiqlanganda butun shoxcha (3 va 4) ulanadi
+    run(db.add_referral_credit(1, 3))
+    subtree = run(db.get_referral_subtree(1))
+    assert (subtree['size'], subtree['max_depth']) == (3, 2)
+    assert run(db.get_referral_subtree(4))['level'] == 2
+    assert run(db.get_max_referral_depth()) == 2
+
+
+def test_complete_task_only_once(db, run):
+    run(db.create_user(1, "a", "A", None))
+    assert run(db.complete_task(1)) is True
+    assert run(db.complete_task(1)) is False
+    assert run(db.get_user(1))['completed_task'] == 1
+
+
+# Dashboard va write-behind overlay
+def test_dashboard_counts_channels(db, run):
+    channels = run(add_channels(db, "one", "two"))
+    run(db.create_user(1, "a", "A", None))
+    run(db.join_channel(1, channels["one"]))
+    run(db.flush_writes())
+
+    dashboard = run(db.get_user_dashboard(1))
+    assert dashboard['user']['telegram_id'] == 1
+    assert names(dashboard['channels']) == ["one", "two"]
+    assert (dashboard['total'], dashboard['joined'], dashboard['not_joined']) == (2, 1, 1)
+    assert dashboard['all_joined'] is False
+
+
+def test_dashboard_for_unknown_user(db, run):
+    run(add_channels(db, "one"))
+    dashboard = run(db.get_user_dashboard(42))
+    assert dashboard['user'] is None
+    assert dashboard['total'] == 1 and dashboard['joined'] == 0
+
+
+def test_overlay_visible_before_flush(db, run):
+    channels = run(add_channels(db, "one", "two"))
+    run(db.create_user(1, "a", "A", None))
+    run(db.join_channel(1, channels["one"]))
+    run(db.set_request_sent(1, channels["two"]))
+    assert len(db.user_channel_buffer) == 2
+
+    dashboard = run(db.get_user_dashboard(1))
+    assert (dashboard['joined'], dashboard['pending']) == (1, 1)
+    status = run(db.check_all_channels_joined_real(1))
+    assert (status['joined'], status['pending'], status['not_joined']) == (1, 1, 0)
+
+    run(db.join_channel(1, channels["two"]))
+    assert run(db.check_all_channels_joined(1)) is True
+
+    run(db.flush_writes())
+    assert len(db.user_channel_buffer) == 0
+    assert run(db.check_all_channels_joined(1)) is True
+    assert run(db.get_user_channel_status(1, channels["two"]))['joined'] == 1
+
+
+# Kampaniyalar
+def test_campaign_channels(db, run):
+    campaign, _ = run(spring_campaign(db))
+    assert names(run(db.get_campaign_channels(None))) == ["common"]
+    assert names(run(db.get_campaign_channels(campaign['id']))) == ["common", "spring_only"]
+
+
+def test_dashboard_campaign_for_new_and_existing_users(db, run):
+    campaign, _ = run(spring_campaign(db))
+    run(db.create_user(1, "a", "A", None))
+    run(db.create_user(2, "b", "B", None, campaign_id=campaign['id']))
+
+    # Yangi foydalanuvchi - havoladagi kampaniya bo'yicha
+    assert names(run(db.get_user_dashboard(3, campaign['id']))['channels']) == ["common", "spring_only"]
+    # Mavjud foydalanuvchi - faqat o'z kampaniyasi bo'yicha (havoladagisi e'tiborsiz)
+    assert names(run(db.get_user_dashboard(1, campaign['id']))['channels']) == ["common"]
+    assert names(run(db.get_user_dashboard(2))['channels']) == ["common", "spring_only"]
+
+
+def test_segment_campaign_filter(db, run):
+    campaign, _ = run(spring_campaign(db))
+    run(db.create_user(1, "a", "A", None))
+    run(db.create_user(2, "b", "B", None, campaign_id=campaign['id']))
+    run(db.create_user(3, "c", "C", None, campaign_id=campaign['id']))
+
+    assert run(db.count_segment(Segment(campaign="spring"))) == 2
+    assert run(db.count_segment(Segment(campaign="default"))) == 1
+    assert run(db.get_user_ids_page(0, 10, Segment(campaign="spring"))) == [2, 3]
+    assert run(db.get_users_campaign_page(1, 10)) == [(2, campaign['id']), (3, campaign['id'])]
+
+
+# Eksport
+def test_users_export_in_chunks(db, run):
+    campaign, channels = run(spring_campaign(db))
+    for telegram_id in range(1, 6):
+        run(db.create_user(telegram_id, f"u{telegram_id}", "U", None,
+                           campaign_id=campaign['id'] if telegram_id == 5 else None))
+    run(db.join_channel(1, channels["common"]))
+
+    async def collect():
+        return [list(chunk) async for chunk in db.iter_users_export(chunk_size=2)]
+
+    chunks = run(collect())
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    rows = [tuple(row) for chunk in chunks for row in chunk]
+    assert [row[0] for row in rows] == [1, 2, 3, 4, 5]
+    assert all(len(row) == len(db.USERS_EXPORT_COLUMNS) for row in rows)
+
+    columns = db.USERS_EXPORT_COLUMNS
+    first, last = dict(zip(columns, rows[0])), dict(zip(columns, rows[-1]))
+    # Navbatdagi yozuv eksportdan oldin yoziladi; kanallar - foydalanuvchi kampaniyasi bo'yicha
+    assert (first['joined_channels'], first['total_channels']) == (1, 1)
+    assert (last['joined_channels'], last['total_channels']) == (0, 2)
+
+
+# Eslatmalar
+def test_reminder_claim_and_release(db, run):
+    run(add_channels(db, "one"))
+    run(db.create_user(1, "a", "A", None))
+    run(db.create_user(2, "b", "B", None))
+    created_before = datetime.utcnow() + timedelta(minutes=1)
+
+    candidates = run(db.get_reminder_candidates("channels", created_before, 0, 10))
+    assert [row[0] for row in candidates] == [1, 2]
+    assert run(db.claim_reminders("channels", [1])) == [1]
+    assert run(db.claim_reminders("channels", [1, 2])) == [2]
+    assert run(db.get_reminder_candidates("channels", created_before, 0, 10)) == []
+
+    run(db.release_reminder("channels", 2))
+    assert [row[0] for row in run(db.get_reminder_candidates("channels", created_before, 0, 10))] == [2]
+    assert run(db.get_reminder_stats()) == {"channels": 1}
+
+
+# Bot holati
+def test_state_roundtrip(db, run):
+    assert run(db.get_state("key")) is None
+    run(db.set_state("key", "one"))
+    run(db.set_state("key", "two"))
+    assert run(db.get_state("key")) == "two"
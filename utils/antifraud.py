@@ -0,0 +1,128 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Deque, List, Optional, Tuple
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+STATE_KEY = "fraud_windows"
+
+
+class FraudDetector:
+    """Referral farming'ni aniqlash - xotiradagi cheklangan sliding window'lar
+
+    Tezlik belgilari (ko'p / ketma-ket ro'yxatdan o'tishlar) faqat taklif
+    qilingan akkauntning o'zida belgi (yangi akkaunt, bo'sh profil) bo'lsa
+    ballga qo'shiladi: havolasi guruhda tarqalgan haqiqiy referrer ushlab
+    qolinmaydi, u faqat sabablarda (log uchun) ko'rinadi.
+    """
+
+    def __init__(self, window: int = 600, burst_window: int = 30, velocity_limit: int = 5,
+                 burst_limit: int = 3, max_referrers: int = 10000):
+        self.window = window
+        self.burst_window = burst_window
+        self.velocity_limit = velocity_limit
+        self.burst_limit = burst_limit
+        self.max_referrers = max_referrers
+        # referrer_id -> oxirgi ro'yxatdan o'tishlar vaqtlari (LRU, cheklangan)
+        self._signups: "OrderedDict[int, Deque[float]]" = OrderedDict()
+        # Eng katta ko'rilgan telegram_id - akkaunt yoshini taxminlash uchun
+        self._max_user_id = 0
+
+    def _window_for(self, referrer_id: int) -> Deque[float]:
+        signups = self._signups.get(referrer_id)
+        if signups is None:
+            signups = deque(maxlen=self.velocity_limit * 4)
+            self._signups[referrer_id] = signups
+            if len(self._signups) > self.max_referrers:
+                self._signups.popitem(last=False)
+        else:
+            self._signups.move_to_end(referrer_id)
+        return signups
+
+    def check(self, referrer_id: int, user_id: int, username: Optional[str],
+              last_name: Optional[str], now: float = None) -> Tuple[int, List[str]]:
+        """Referralni baholash. Qaytaradi: (ball, sabablar)"""
+        now = now or time.time()
+        signups = self._window_for(referrer_id)
+        signups.append(now)
+
+        # Eskirgan yozuvlarni chiqarib tashlash
+        while signups and signups[0] < now - self.window:
+            signups.popleft()
+
+        rate_score = identity_score = 0
+        reasons = []
+
+        if len(signups) > self.velocity_limit:
+            rate_score += 2
+            reasons.append(f"tezlik: {len(signups)} ta / {self.window // 60} daqiqa")
+
+        burst = sum(1 for ts in signups if ts >= now - self.burst_window)
+        if burst >= self.burst_limit:
+            rate_score += 2
+            reasons.append(f"portlash: {burst} ta / {self.burst_window} soniya")
+
+        # Telegram ID lar o'sib boradi - eng yangi ID lar yangi akkauntlar
+        if self._max_user_id and user_id >= self._max_user_id * 0.998:
+            identity_score += 1
+            reasons.append("yangi akkaunt")
+        self._max_user_id = max(self._max_user_id, user_id)
+
+        if not username and not last_name:
+            identity_score += 1
+            reasons.append("bo'sh profil")
+
+        score = identity_score + rate_score if identity_score else 0
+        return score, reasons
+
+    def snapshot(self) -> str:
+        """Holatni saqlash uchun JSON"""
+        cutoff = time.time() - self.window
+        return json.dumps({
+            "max_user_id": self._max_user_id,
+            "signups": {
+                str(referrer_id): [ts for ts in signups if ts >= cutoff]
+                for referrer_id, signups in self._signups.items()
+                if signups and signups[-1] >= cutoff
+            }
+        })
+
+    def restore(self, data: str):
+        """Saqlangan holatni yuklash"""
+        state = json.loads(data)
+        self._max_user_id = state.get("max_user_id", 0)
+        for referrer_id, timestamps in state.get("signups", {}).items():
+            self._window_for(int(referrer_id)).extend(timestamps)
+
+
+fraud_detector = FraudDetector(velocity_limit=settings.FRAUD_VELOCITY_LIMIT)
+
+
+async def load_fraud_state(db):
+    """Oldingi ishga tushirishdagi oynalarni tiklash"""
+    data = await db.get_state(STATE_KEY)
+    if data:
+        try:
+            fraud_detector.restore(data)
+        except (ValueError, TypeError) as e:
+            logger.error(f"Fraud holatini yuklashda xato: {e}")
+
+
+async def save_fraud_state(db):
+    """Oynalarni database'ga saqlash"""
+    try:
+        await db.set_state(STATE_KEY, fraud_detector.snapshot())
+    except Exception as e:
+        logger.error(f"Fraud holatini saqlashda xato: {e}")
+
+
+async def persist_fraud_state(db, interval: int = 60):
+    """Oynalarni davriy ravishda database'ga saqlash"""
+    while True:
+        await asyncio.sleep(interval)
+        await save_fraud_state(db)
@@ -0,0 +1,366 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+from database.database import db
+from database.segments import Segment, parse_segment
+from keyboards.keyboards import get_admin_keyboard
+from utils.logs import EXPECTED_SEND_ERRORS, send_errors
+from utils.ratelimit import rate_limit_pauses
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 100
+# Har necha foydalanuvchidan keyin kursorni saqlash (kutilmaganda o'chsa - shuncha qayta yuboriladi)
+CHECKPOINT_EVERY = 50
+# Progress xabari eng ko'pi bilan shuncha soniyada bir yangilanadi (rate limit uchun)
+PROGRESS_INTERVAL = 5
+# Tezlik shu oxirgi soniyalar bo'yicha hisoblanadi
+RATE_WINDOW = 30
+SEND_DELAY = 0.05  # Telegram rate limit uchun
+# Telegram cheklovida (retry_after) shu marta kutib, o'sha foydalanuvchiga qayta yuboriladi
+SEND_RETRIES = 3
+
+
+def parse_message_ids(value: Optional[str]) -> List[int]:
+    return [int(item) for item in value.split(",")] if value else []
+
+
+async def _send_once(bot, user_id: int, text: str = None, photo: str = None, caption: str = None,
+                    from_chat_id: int = None, message_ids: List[int] = None):
+    """Bitta yuborish urinishi (xatolar chaqiruvchiga)"""
+    if len(message_ids or ()) > 1:
+        await bot.copy_messages(
+            chat_id=user_id,
+            from_chat_id=from_chat_id,
+            message_ids=message_ids
+        )
+    elif message_ids:
+        await bot.copy_message(
+            chat_id=user_id,
+            from_chat_id=from_chat_id,
+            message_id=message_ids[0]
+        )
+    elif photo:
+        await bot.send_photo(
+            chat_id=user_id,
+            photo=photo,
+            caption=caption,
+            parse_mode="HTML"
+        )
+    else:
+        await bot.send_message(
+            chat_id=user_id,
+            text=text,
+            parse_mode="HTML"
+        )
+
+
+async def safe_send_message(bot, user_id: int, text: str = None, photo: str = None, caption: str = None,
+                            from_chat_id: int = None, message_ids: List[int] = None,
+                            retries: int = SEND_RETRIES):
+    """Xavfsiz xabar yuborish - xatolarni handle qiladi
+
+    `message_ids` berilsa - admin xabari(lari)dan nusxa olinadi (fayllar
+    qayta yuklanmaydi, albom albomligicha qoladi). Telegram cheklovida
+    (flood control) aytilgan vaqt kutilib, ko'pi bilan `retries` marta
+    qayta yuboriladi - shundan keyingina xato qaytariladi.
+    """
+    attempt = 0
+    while True:
+        try:
+            await _send_once(bot, user_id, text, photo, caption, from_chat_id, message_ids)
+            return True, None
+        except TelegramForbiddenError:
+            # Foydalanuvchi botni block qilgan
+            return False, "blocked"
+        except TelegramRetryAfter as e:
+            # Telegram cheklovi (flood control) - kutib, o'sha foydalanuvchiga qayta
+            if attempt >= retries:
+                return False, f"retry_after: {e.retry_after}"
+            attempt += 1
+            rate_limit_pauses.record(e.retry_after)
+            await asyncio.sleep(e.retry_after)
+        except TelegramBadRequest as e:
+            if "chat not found" in str(e).lower():
+                # Foydalanuvchi accountini delete qilgan
+                return False, "deleted"
+            elif "user is deactivated" in str(e).lower():
+                # Account deactive
+                return False, "deactivated"
+            else:
+                # Boshqa bad request xatolari
+                return False, f"bad_request: {str(e)}"
+        except Exception as e:
+            # Boshqa xatolar
+            return False, f"error: {str(e)}"
+
+
+def format_eta(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+def render_progress(broadcast: Dict, rate: float = 0.0) -> str:
+    total_errors = broadcast['processed'] - broadcast['sent']
+    total = max(broadcast['total'], broadcast['processed'], 1)
+    remaining = max(broadcast['total'] - broadcast['processed'], 0)
+    speed = f"\n⚡ Tezlik: {rate:.1f} xabar/s" if rate else ""
+    eta = f" | ⏳ Qoldi: ~{format_eta(remaining / rate)}" if rate and remaining else ""
+    return f"""📤 Xabar yuborish davom etmoqda...
+
+✅ Yuborildi: {broadcast['sent']}
+❌ Jami xatolar: {total_errors}
+  • 🚫 Bloklagan: {broadcast['blocked']}
+  • 🗑 O'chirgan: {broadcast['deleted']}
+  • ⏸ Deaktiv: {broadcast['deactivated']}
+  • ❓ Boshqa: {broadcast['other']}
+
+📊 Progress: {broadcast['processed']}/{broadcast['total']} ({(broadcast['processed'] / total * 100):.1f}%){speed}{eta}"""
+
+
+def render_final(broadcast: Dict) -> str:
+    total_errors = broadcast['processed'] - broadcast['sent']
+    total = max(broadcast['processed'], 1)
+    return f"""📊 <b>Xabar yuborish yakunlandi!</b>
+
+✅ Muvaffaqiyatli: {broadcast['sent']}
+❌ Jami xatolar: {total_errors}
+👥 Jami foydalanuvchi: {broadcast['processed']}
+
+<b>📋 Xato tafsilotlari:</b>
+🚫 Botni bloklagan: {broadcast['blocked']}
+🗑 Accountni o'chirgan: {broadcast['deleted']}
+⏸ Deaktiv account: {broadcast['deactivated']}
+❓ Boshqa xatolar: {broadcast['other']}
+
+📈 Muvaffaqiyat darajasi: {(broadcast['sent'] / total * 100):.1f}%"""
+
+
+class ProgressReporter:
+    """Progress xabarini vaqt bo'yicha yangilash
+
+    Eng ko'pi bilan har `interval` soniyada, faqat sanagichlar o'zgarganda,
+    oxirgi holat bilan (oraliqdagi o'zgarishlar birlashtiriladi). Yuborish
+    tsikli tahrirlashni kutmaydi.
+    """
+
+    def __init__(self, job: "BroadcastJob", interval: float = PROGRESS_INTERVAL):
+        self.job = job
+        self.interval = interval
+        self._samples: Deque[Tuple[float, int]] = deque()
+        self._reported = None
+
+    def rate(self) -> float:
+        """Oxirgi RATE_WINDOW soniyadagi tezlik (xabar/soniya)"""
+        now = time.monotonic()
+        self._samples.append((now, self.job.broadcast['processed']))
+        while len(self._samples) > 2 and self._samples[0][0] < now - RATE_WINDOW:
+            self._samples.popleft()
+        (start, first), (end, last) = self._samples[0], self._samples[-1]
+        return (last - first) / (end - start) if end > start else 0.0
+
+    async def report(self):
+        rate = self.rate()
+        processed = self.job.broadcast['processed']
+        if processed == self._reported:
+            return
+        self._reported = processed
+        await self.job._show(render_progress(self.job.broadcast, rate))
+
+    async def run(self):
+        self.rate()
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.report()
+
+
+class BroadcastJob:
+    """Bitta umumiy xabar yuborish - keyset sahifalar bilan, kursor database'da"""
+
+    def __init__(self, bot: Bot, broadcast: Dict):
+        self.bot = bot
+        self.broadcast = broadcast
+        self.segment = parse_segment(broadcast['segment'])
+        self.message_ids = parse_message_ids(broadcast['source_message_ids'])
+        self.stopping = False
+        self.task: Optional[asyncio.Task] = None
+
+    async def _show(self, text: str, final: bool = False):
+        """Progress xabarini yangilash (tahrirlab bo'lmasa - yangisini yuborish)"""
+        broadcast = self.broadcast
+        chat_id = broadcast['admin_chat_id']
+        try:
+            if broadcast['progress_message_id']:
+                await self.bot.edit_message_text(
+                    text, chat_id=chat_id, message_id=broadcast['progress_message_id']
+                )
+                return
+        except TelegramBadRequest as e:
+            if "message is not modified" in str(e).lower():
+                return
+            try:
+                await self.bot.delete_message(chat_id, broadcast['progress_message_id'])
+            except Exception:
+                pass
+        except Exception as e:
+            logger.error(f"Progress yangilashda xato: {e}")
+            return
+
+        try:
+            sent = await self.bot.send_message(
+                chat_id, text, reply_markup=get_admin_keyboard() if final else None
+            )
+            broadcast['progress_message_id'] = sent.message_id
+        except Exception as e:
+            logger.error(f"Progress xabarini yuborishda xato: {e}")
+
+    async def _checkpoint(self, status: str = None):
+        if status:
+            self.broadcast['status'] = status
+        await db.save_broadcast(self.broadcast)
+
+    async def run(self):
+        broadcast = self.broadcast
+        broadcast['status'] = 'running'
+        if not broadcast['progress_message_id']:
+            await self._show(
+                f"📤 Xabar yuborish boshlandi...\n"
+                f"🎯 Auditoriya: {broadcast['segment']}\n"
+                f"👥 Jami: {broadcast['total']} foydalanuvchi"
+            )
+        await self._checkpoint()
+
+        reporter = asyncio.create_task(ProgressReporter(self).run())
+        try:
+            while not self.stopping:
+                user_ids = await db.get_user_ids_page(broadcast['last_user_id'], PAGE_SIZE, self.segment)
+                if not user_ids:
+                    break
+
+                for user_id in user_ids:
+                    if self.stopping:
+                        break
+                    success, error_type = await safe_send_message(
+                        bot=self.bot,
+                        user_id=user_id,
+                        text=broadcast['text'],
+                        photo=broadcast['photo'],
+                        caption=broadcast['text'] if broadcast['photo'] else None,
+                        from_chat_id=broadcast['source_chat_id'],
+                        message_ids=self.message_ids
+                    )
+                    if success:
+                        broadcast['sent'] += 1
+                    else:
+                        if error_type in EXPECTED_SEND_ERRORS:
+                            broadcast[error_type] += 1
+                        else:
+                            broadcast['other'] += 1
+                        send_errors.add(f"broadcast #{broadcast['id']}", error_type, user_id)
+                    broadcast['processed'] += 1
+                    broadcast['last_user_id'] = user_id
+
+                    if broadcast['processed'] % CHECKPOINT_EVERY == 0:
+                        await self._checkpoint()
+
+                    await asyncio.sleep(broadcast['send_delay'] or SEND_DELAY)
+        except asyncio.CancelledError:
+            # Deadline o'tib ketdi - turgan joyni saqlab chiqish
+            await self._checkpoint('paused')
+            raise
+        finally:
+            reporter.cancel()
+        # Oxirgi xabar progress yangilanishi bilan to'qnashmasligi uchun
+        await asyncio.wait([reporter])
+
+        if self.stopping:
+            await self._checkpoint('paused')
+            await self._show(
+                render_progress(broadcast)
+                + "\n\n⏸ Bot to'xtatildi - qayta ishga tushganda davom etadi."
+            )
+            return
+
+        await self._checkpoint('done')
+        await self._show(render_final(broadcast), final=True)
+
+
+running_jobs: Set[BroadcastJob] = set()
+
+
+def pending_sends() -> int:
+    """Ishlayotgan xabar yuborishlarda hali yuborilmagan xabarlar"""
+    return sum(
+        max(job.broadcast['total'] - job.broadcast['processed'], 0) for job in running_jobs
+    )
+
+
+def _spawn(job: BroadcastJob) -> BroadcastJob:
+    async def runner():
+        try:
+            await job.run()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Broadcast #{job.broadcast['id']} xatosi: {e}")
+            try:
+                await job._checkpoint('paused')
+            except Exception:
+                pass
+        finally:
+            running_jobs.discard(job)
+
+    running_jobs.add(job)
+    job.task = asyncio.create_task(runner())
+    return job
+
+
+async def start_broadcast(bot: Bot, admin_chat_id: int, text: Optional[str],
+                          photo: Optional[str], segment: Segment = Segment(),
+                          spread: int = 0, source_chat_id: int = None,
+                          source_message_ids: str = None) -> Dict:
+    """Yangi xabar yuborishni yaratish va fonda boshlash (segment bo'yicha)
+
+    `spread` (soniya) berilsa - yuborish shu oraliqqa tekis taqsimlanadi.
+    `source_message_ids` ("12,13") berilsa - `source_chat_id` dagi xabarlardan nusxa olinadi.
+    """
+    total = await db.count_segment(segment)
+    send_delay = max(SEND_DELAY, spread / total) if spread and total else None
+    broadcast = await db.create_broadcast(
+        admin_chat_id, text, photo, total, str(segment), send_delay,
+        source_chat_id, source_message_ids
+    )
+    _spawn(BroadcastJob(bot, broadcast))
+    return broadcast
+
+
+async def resume_broadcasts(bot: Bot) -> int:
+    """Oldingi ishga tushirishda to'xtatilgan xabar yuborishlarni davom ettirish"""
+    broadcasts = await db.get_unfinished_broadcasts()
+    for broadcast in broadcasts:
+        logger.info(f"Broadcast #{broadcast['id']} davom ettirilmoqda ({broadcast['processed']}/{broadcast['total']})")
+        _spawn(BroadcastJob(bot, broadcast))
+    return len(broadcasts)
+
+
+async def pause_broadcasts(timeout: float) -> int:
+    """Barcha xabar yuborishlarni to'xtatib, kursorlarini saqlash"""
+    jobs = list(running_jobs)
+    if not jobs:
+        return 0
+    for job in jobs:
+        job.stopping = True
+
+    _, pending = await asyncio.wait([job.task for job in jobs], timeout=max(timeout, 0.1))
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.wait(pending, timeout=1)
+    return len(jobs)
@@ -0,0 +1,29 @@
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+# Nomli keshlar (/health hisobotida ko'rsatiladi)
+caches: Dict[str, "VersionedCache"] = {}
+
+
+class VersionedCache:
+    """Versiya bo'yicha keshlangan qiymatlar (versiya o'zgarsa - qayta render)"""
+
+    def __init__(self, name: str = None):
+        self._values: Dict[Hashable, Tuple[int, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        if name:
+            caches[name] = self
+
+    def get(self, key: Hashable, version: int) -> Optional[Any]:
+        item = self._values.get(key)
+        if item is not None and item[0] == version:
+            self.hits += 1
+            return item[1]
+        self.misses += 1
+        return None
+
+    def set(self, key: Hashable, version: int, value: Any):
+        self._values[key] = (version, value)
+
+    def clear(self):
+        self._values.clear()
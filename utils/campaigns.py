@@ -0,0 +1,73 @@
+import re
+from typing import Dict, List, Optional
+
+from config import settings
+from database.database import db
+from utils.templates import templates
+
+# Kampaniya deep-link parametri: t.me/bot?start=c_<slug>
+CAMPAIGN_PREFIX = "c_"
+# Deep-link parametri 64 belgigacha, [A-Za-z0-9_-]; segment filtrlari kichik harfli
+SLUG_PATTERN = re.compile(r"^[a-z0-9_]{1,32}$")
+
+
+class CampaignRegistry:
+    """Kampaniyalar sozlamalari keshi (db.campaigns_version o'zgarmaguncha)"""
+
+    def __init__(self):
+        self._version = None
+        self._by_id: Dict[int, Dict] = {}
+        self._by_slug: Dict[str, Dict] = {}
+
+    async def _load(self):
+        version = db.campaigns_version
+        if version == self._version:
+            return
+        campaigns = await db.get_campaigns()
+        self._by_id = {campaign['id']: campaign for campaign in campaigns}
+        self._by_slug = {campaign['slug']: campaign for campaign in campaigns}
+        self._version = version
+
+    async def all(self) -> List[Dict]:
+        await self._load()
+        return list(self._by_id.values())
+
+    async def get(self, campaign_id: Optional[int]) -> Optional[Dict]:
+        """Kampaniya sozlamalari (None yoki topilmasa - standart kampaniya, None)"""
+        if campaign_id is None:
+            return None
+        await self._load()
+        return self._by_id.get(campaign_id)
+
+    async def by_slug(self, slug: str) -> Optional[Dict]:
+        await self._load()
+        campaign = self._by_slug.get(slug)
+        return campaign if campaign and campaign['is_active'] else None
+
+
+def parse_campaign_payload(payload: str) -> Optional[str]:
+    """/start parametridan kampaniya slugi (kampaniya havolasi bo'lmasa - None)"""
+    if payload.startswith(CAMPAIGN_PREFIX):
+        slug = payload[len(CAMPAIGN_PREFIX):].lower()
+        if SLUG_PATTERN.match(slug):
+            return slug
+    return None
+
+
+def required_referrals(campaign: Optional[Dict]) -> int:
+    if campaign and campaign['required_referrals']:
+        return campaign['required_referrals']
+    return settings.REQUIRED_REFERRALS
+
+
+def reward_link(campaign: Optional[Dict]) -> str:
+    if campaign and campaign['reward_link']:
+        return campaign['reward_link']
+    return settings.REWARD_LINK
+
+
+async def success_message(campaign: Optional[Dict]) -> str:
+    return await templates.render("success", link=reward_link(campaign))
+
+
+campaigns = CampaignRegistry()
@@ -0,0 +1,133 @@
+import asyncio
+import csv
+import io
+import json
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from aiogram import Bot
+
+logger = logging.getLogger(__name__)
+
+ChannelRow = Tuple[str, str, str]
+
+# Bot API'ga bir vaqtda yuboriladigan tekshiruv so'rovlari soni
+VALIDATION_CONCURRENCY = 10
+EXPORT_FIELDS = ("channel_id", "channel_name", "channel_link")
+
+
+def detect_channel_type(channel_id: str) -> Optional[str]:
+    """Kanal ID/Link turini aniqlash (noto'g'ri bo'lsa - None)"""
+    if channel_id.startswith('-100'):
+        # Chat ID format
+        try:
+            int(channel_id)  # Raqam ekanligini tekshirish
+        except ValueError:
+            return None
+        return "Private (Chat ID)"
+
+    if channel_id.startswith('@'):
+        # Username format
+        return "Public (Username)"
+
+    if channel_id.startswith('https://t.me/+'):
+        # Invite link format - bu holatda link ni ID sifatida saqlaymiz
+        return "Private (Invite Link)"
+
+    return None
+
+
+def _check_row(number: int, values: List[str], rows: List[ChannelRow], errors: List[str]):
+    """Bitta qatorni tekshirib, rows yoki errors ga qo'shish"""
+    if len(values) != 3:
+        errors.append(f"{number}-qator: format noto'g'ri")
+        return
+
+    channel_id, channel_name, channel_link = (value.strip() for value in values)
+    if not channel_name:
+        errors.append(f"{number}-qator: kanal nomi bo'sh")
+    elif detect_channel_type(channel_id) is None:
+        errors.append(f"{number}-qator: ID/Link noto'g'ri - {channel_id}")
+    else:
+        rows.append((channel_id, channel_name, channel_link))
+
+
+def parse_channel_lines(text: str) -> Tuple[List[ChannelRow], List[str]]:
+    """Ko'p qatorli `id|nom|link` matnini o'qish"""
+    rows: List[ChannelRow] = []
+    errors: List[str] = []
+    for number, line in enumerate(text.splitlines(), 1):
+        if line.strip():
+            _check_row(number, line.split('|'), rows, errors)
+    return rows, errors
+
+
+def parse_channels_document(filename: str, data: bytes) -> Tuple[List[ChannelRow], List[str]]:
+    """CSV yoki JSON fayldan kanallarni o'qish"""
+    try:
+        text = data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return [], ["Fayl UTF-8 kodlashda bo'lishi kerak"]
+    rows: List[ChannelRow] = []
+    errors: List[str] = []
+
+    if filename.lower().endswith('.json'):
+        try:
+            items = json.loads(text)
+        except ValueError as e:
+            return [], [f"JSON o'qilmadi: {e}"]
+        if not isinstance(items, list):
+            return [], ["JSON ro'yxat (list) bo'lishi kerak"]
+        for number, item in enumerate(items, 1):
+            if not isinstance(item, dict):
+                errors.append(f"{number}-element: obyekt bo'lishi kerak")
+                continue
+            values = [str(item.get(field) or '') for field in EXPORT_FIELDS]
+            _check_row(number, values, rows, errors)
+        return rows, errors
+
+    for number, values in enumerate(csv.reader(io.StringIO(text)), 1):
+        if not values or not any(value.strip() for value in values):
+            continue
+        # Sarlavha qatorini o'tkazib yuborish
+        if number == 1 and values[0].strip() == EXPORT_FIELDS[0]:
+            continue
+        _check_row(number, values, rows, errors)
+    return rows, errors
+
+
+async def validate_channels(bot: Bot, rows: List[ChannelRow]) -> Tuple[List[ChannelRow], List[str]]:
+    """Kanallarni Bot API orqali parallel tekshirish"""
+    semaphore = asyncio.Semaphore(VALIDATION_CONCURRENCY)
+
+    async def check(row: ChannelRow) -> Optional[str]:
+        channel_id = row[0]
+        # Invite link orqali get_chat ishlamaydi - tekshirilmaydi
+        if channel_id.startswith('https://'):
+            return None
+        async with semaphore:
+            try:
+                await bot.get_chat(channel_id)
+                return None
+            except Exception as e:
+                return f"{channel_id}: {e}"
+
+    results = await asyncio.gather(*(check(row) for row in rows))
+
+    valid_rows = [row for row, error in zip(rows, results) if error is None]
+    errors = [error for error in results if error is not None]
+    return valid_rows, errors
+
+
+def export_channels(channels: List[Dict], fmt: str = "csv") -> bytes:
+    """Kanallarni CSV yoki JSON formatida eksport qilish"""
+    if fmt == "json":
+        items = [{field: channel[field] for field in EXPORT_FIELDS} for channel in channels]
+        return json.dumps(items, ensure_ascii=False, indent=2).encode('utf-8')
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for channel in channels:
+        writer.writerow([channel[field] or '' for field in EXPORT_FIELDS])
+    return buffer.getvalue().encode('utf-8')
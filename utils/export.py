@@ -0,0 +1,37 @@
+import asyncio
+import csv
+import gzip
+import io
+import os
+import tempfile
+from typing import Any, AsyncIterator, List, Sequence, Tuple
+
+
+def _open_csv(path: str) -> Tuple[io.TextIOWrapper, Any]:
+    """Gzip bilan siqilgan CSV faylni ochish"""
+    file = io.TextIOWrapper(gzip.open(path, 'wb', compresslevel=6), encoding='utf-8', newline='')
+    return file, csv.writer(file)
+
+
+async def write_csv_gz(header: Sequence[str], chunks: AsyncIterator[List[Tuple]]) -> Tuple[str, int]:
+    """Bo'laklarni .csv.gz faylga yozish (fayl operatsiyalari - alohida threadda)
+
+    Xotirada bir vaqtda faqat bitta bo'lak turadi.
+    Qaytaradi: (fayl yo'li, yozilgan qatorlar soni)
+    """
+    fd, path = tempfile.mkstemp(suffix='.csv.gz')
+    os.close(fd)
+
+    file, writer = await asyncio.to_thread(_open_csv, path)
+    total = 0
+    try:
+        await asyncio.to_thread(writer.writerow, header)
+        async for rows in chunks:
+            await asyncio.to_thread(writer.writerows, rows)
+            total += len(rows)
+    except BaseException:
+        await asyncio.to_thread(file.close)
+        await asyncio.to_thread(os.remove, path)
+        raise
+    await asyncio.to_thread(file.close)
+    return path, total
@@ -0,0 +1,162 @@
+import asyncio
+import html
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from database.database import db
+from keyboards import keyboards
+from utils.broadcast import pending_sends, running_jobs
+from utils.cache import caches
+from utils.lifecycle import in_flight
+from utils.logs import log_pipeline
+from utils.ratelimit import rate_limit_pauses
+from utils.reminders import queued_reminders
+from utils.watchdog import loop_watchdog
+
+# Event loop kechikishi shu oraliqda o'lchanadi (soniya)
+LAG_INTERVAL = 0.5
+# "Oxirgi daqiqa" - shuncha o'lchov
+LAG_WINDOW = 120
+
+STARTED_AT = time.monotonic()
+
+
+class LoopLagMonitor:
+    """Event loop kechikishi: `interval` soniyalik uyqu qancha kech tugaganini o'lchash
+
+    Kechikish - loop'ni bloklagan sinxron kod (og'ir hisob, sinxron I/O) belgisi.
+    """
+
+    def __init__(self, interval: float = LAG_INTERVAL, window: int = LAG_WINDOW):
+        self.interval = interval
+        self.last = 0.0
+        self.peak = 0.0
+        self._recent: Deque[float] = deque(maxlen=window)
+
+    def record(self, lag: float):
+        lag = max(lag, 0.0)
+        self.last = lag
+        if lag > self.peak:
+            self.peak = lag
+        self._recent.append(lag)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.record(loop.time() - started - self.interval)
+
+    def snapshot(self) -> Dict[str, float]:
+        """Millisekundda: oxirgi, o'rtacha va eng katta (oxirgi daqiqa), eng katta (ishga tushgandan beri)"""
+        recent = self._recent
+        return {
+            'last_ms': self.last * 1000,
+            'avg_ms': sum(recent) / len(recent) * 1000 if recent else 0.0,
+            'max_ms': max(recent, default=0.0) * 1000,
+            'peak_ms': self.peak * 1000,
+        }
+
+
+def rss_bytes() -> Optional[int]:
+    """Jarayonning hozirgi xotirasi (RSS). Linux bo'lmasa - None"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def format_uptime(seconds: float) -> str:
+    days, seconds = divmod(int(seconds), 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    uptime = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+    return f"{days} kun {uptime}" if days else uptime
+
+
+def hit_ratio(hits: int, misses: int) -> str:
+    total = hits + misses
+    return f"{hits / total:.1%} ({hits}/{total})" if total else "so'rov yo'q"
+
+
+def keyboard_cache_stats() -> Dict[str, int]:
+    """keyboards modulidagi lru_cache'lar bo'yicha jami"""
+    hits = misses = 0
+    for value in vars(keyboards).values():
+        if callable(getattr(value, "cache_info", None)):
+            info = value.cache_info()
+            hits += info.hits
+            misses += info.misses
+    return {'hits': hits, 'misses': misses}
+
+
+async def render_health() -> str:
+    """/health hisoboti (sanagichlar + database'ga bitta sinov so'rovi)"""
+    started = time.perf_counter()
+    try:
+        await db.get_state("health_ping")
+        ping = f"{(time.perf_counter() - started) * 1000:.1f} ms"
+    except Exception as e:
+        ping = f"xato: {html.escape(str(e))}"
+
+    lag = loop_monitor.snapshot()
+    queries = db.query_stats.snapshot()
+    in_use, pool_size = db.pool_usage()
+    connections = (
+        f"{in_use}/{pool_size} band" if pool_size is not None
+        else f"{in_use} ochiq (eng ko'pi {db.query_stats.peak_active})"
+    )
+    rss = rss_bytes()
+    memory = f"{rss / 1024 / 1024:.1f} MB" if rss is not None else "noma'lum"
+    handler_avg = in_flight.total_time / in_flight.handled * 1000 if in_flight.handled else 0.0
+
+    cache_lines = [
+        f"  • Foydalanuvchilar: {hit_ratio(db.user_index.hits, db.user_index.misses)}, "
+        f"{len(db.user_index)}/{db.user_index.max_size} yozuv"
+    ]
+    cache_lines += [f"  • {name}: {hit_ratio(cache.hits, cache.misses)}" for name, cache in caches.items()]
+    cache_lines.append(f"  • Klaviaturalar: {hit_ratio(**keyboard_cache_stats())}")
+
+    if rate_limit_pauses.count:
+        ago = int(time.monotonic() - rate_limit_pauses.last_at)
+        pauses = (
+            f"{rate_limit_pauses.count} marta, jami {rate_limit_pauses.seconds:.0f} s "
+            f"(oxirgisi {format_uptime(ago)} oldin)"
+        )
+    else:
+        pauses = "yo'q"
+
+    log_queue = log_pipeline.handler.queue.qsize() if log_pipeline.handler else 0
+    stalls = (
+        f"{loop_watchdog.stalls} ta (> {loop_watchdog.threshold * 1000:.0f} ms, /stalls)"
+        if loop_watchdog else "watchdog o'chirilgan (LOOP_WATCHDOG_MS)"
+    )
+
+    return (
+        f"🩺 <b>Bot holati</b>\n\n"
+        f"⏱ Ishlash vaqti: {format_uptime(time.monotonic() - STARTED_AT)}\n"
+        f"🧠 Xotira (RSS): {memory}\n\n"
+        f"🔄 Event loop kechikishi: hozir {lag['last_ms']:.1f} ms, o'rtacha {lag['avg_ms']:.1f} ms, "
+        f"1 daqiqada max {lag['max_ms']:.1f} ms (ishga tushgandan beri {lag['peak_ms']:.0f} ms)\n"
+        f"🐢 Loop to'xtashlari: {stalls}\n"
+        f"📥 Handlerlar: ishlanmoqda {in_flight.active} (eng ko'pi {in_flight.peak}), "
+        f"jami {in_flight.handled}, xato {in_flight.failed}, o'rtacha {handler_avg:.1f} ms\n\n"
+        f"🗄 <b>Database</b>\n"
+        f"  • Ulanishlar: {connections}\n"
+        f"  • So'rovlar: {queries['count']}, xato {queries['errors']}\n"
+        f"  • Kechikish: o'rtacha {queries['avg_ms']:.1f} ms, p50 {queries['p50_ms']:.1f} ms, "
+        f"p95 {queries['p95_ms']:.1f} ms, max {queries['max_ms']:.0f} ms\n"
+        f"  • Ping: {ping}\n"
+        f"  • Yozish navbati: {len(db.user_channel_buffer)} qator\n\n"
+        f"💾 <b>Keshlar</b>\n" + "\n".join(cache_lines) + "\n\n"
+        f"📤 Yuborish navbati: xabar yuborish {pending_sends()} ({len(running_jobs)} ta), "
+        f"eslatmalar {queued_reminders()}\n"
+        f"🚦 Telegram cheklovlari: {pauses}\n"
+        f"📝 Loglar: navbatda {log_queue}, tashlab yuborilgan {log_pipeline.dropped}"
+    )
+
+
+loop_monitor = LoopLagMonitor()
@@ -3,9 +3,31 @@ import logging
 from typing import List
 from aiogram import Bot
 
+from database.database import db
+from utils.campaigns import campaigns, required_referrals, success_message
+from utils.logs import send_errors
+
 logger = logging.getLogger(__name__)
 
 
+async def credit_referral(bot: Bot, referrer_id: int, user_id: int):
+    """Referalni hisoblash (har bir foydalanuvchi uchun faqat bir marta)"""
+    referral_count = await db.add_referral_credit(referrer_id, user_id)
+    if referral_count is None:
+        # Allaqachon hisoblangan (qayta yuborilgan update yoki takroriy tasdiqlash)
+        return
+
+    # Referrerni vazifasi bajarilganligini tekshirish (referrer kampaniyasi shartlari bo'yicha)
+    referrer = await db.get_user(referrer_id)
+    campaign = await campaigns.get(referrer['campaign_id'] if referrer else None)
+    if referral_count >= required_referrals(campaign) and await db.complete_task(referrer_id):
+        # Referrerni xabardor qilish (faqat birinchi marta)
+        try:
+            await bot.send_message(referrer_id, await success_message(campaign))
+        except Exception as e:
+            logger.error(f"Referrerga xabar yuborishda xato: {e}")
+
+
 async def send_broadcast(bot: Bot, user_ids: List[int], text: str, photo: str = None):
     """Umumiy xabar yuborish"""
     success_count = 0
@@ -20,7 +42,7 @@ async def send_broadcast(bot: Bot, user_ids: List[int], text: str, photo: str =
             success_count += 1
             await asyncio.sleep(0.1)  # Rate limiting uchun
         except Exception as e:
-            logger.error(f"Foydalanuvchi {user_id} ga xabar yuborilmadi: {e}")
+            send_errors.add("send_broadcast", f"error: {e}", user_id)
             failed_count += 1
 
     return success_count, failed_count
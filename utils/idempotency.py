@@ -0,0 +1,126 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Set
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+STATE_KEY = "update_high_water"
+# Telegram bir hafta update bo'lmasa keyingi update_id ni tasodifiy tanlaydi -
+# shundan eski high-water mark hisobga olinmaydi
+MARK_MAX_AGE = 7 * 24 * 3600
+# Mark'dan shuncha pastga sakrash - takror emas, update_id lar qaytadan boshlangan
+RESET_GAP = 10000
+
+
+class UpdateDeduplicator(BaseMiddleware):
+    """Qayta yuborilgan update'larni (update_id bo'yicha) tashlab yuborish
+
+    Xotirada - oxirgi `max_size` ta update_id (LRU). Database'da - high-water
+    mark: undan kichik yoki teng barcha update'lar to'liq ishlangan, shuning
+    uchun qayta ishga tushgandan keyin ham takrorlar o'tkazib yuboriladi.
+
+    Telegram update_id lar doim o'sishini kafolatlamaydi: mark `MARK_MAX_AGE`
+    dan eski bo'lsa yoki update_id undan `RESET_GAP` dan ko'proq pastda
+    bo'lsa, mark tashlab yuboriladi va takrorlar faqat LRU bo'yicha aniqlanadi.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self.high_water = 0
+        self.skipped = 0
+        self._seen: "OrderedDict[int, None]" = OrderedDict()
+        self._inflight: Set[int] = set()
+        self._max_done = 0
+        self._saved = 0
+        # Oxirgi update (yoki yuklangan mark saqlangan) vaqti
+        self._active_at = 0.0
+
+    def _remember(self, update_id: int):
+        self._seen[update_id] = None
+        if len(self._seen) > self.max_size:
+            self._seen.popitem(last=False)
+
+    async def __call__(
+            self,
+            handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+            event: Update,
+            data: Dict[str, Any]
+    ) -> Any:
+        update_id = event.update_id
+        now = time.time()
+        if self.high_water and update_id <= self.high_water and update_id not in self._seen:
+            if now - self._active_at > MARK_MAX_AGE or self.high_water - update_id > RESET_GAP:
+                self._reset_mark(update_id)
+        self._active_at = now
+
+        if update_id <= self.high_water or update_id in self._seen:
+            self.skipped += 1
+            logger.info(f"Takroriy update o'tkazib yuborildi: {update_id}")
+            return UNHANDLED
+
+        self._remember(update_id)
+        self._inflight.add(update_id)
+        try:
+            return await handler(event, data)
+        finally:
+            self._inflight.discard(update_id)
+            self._max_done = max(self._max_done, update_id)
+
+    def _reset_mark(self, update_id: int):
+        logger.warning(
+            f"update_id {update_id} high-water mark'dan ({self.high_water}) ancha past yoki mark eski - "
+            f"mark tashlab yuborildi, takrorlar faqat xotiradagi ro'yxat bo'yicha"
+        )
+        self.high_water = self._max_done = self._saved = 0
+
+    def watermark(self) -> int:
+        """Undan kichik yoki teng hech bir update ishlanmayotgan eng katta update_id"""
+        done = max(self._max_done, self.high_water)
+        if self._inflight:
+            return min(done, min(self._inflight) - 1)
+        return done
+
+    async def load(self, db):
+        """Saqlangan high-water mark'ni yuklash (`MARK_MAX_AGE` dan eski bo'lsa - e'tiborsiz)"""
+        value = await db.get_state(STATE_KEY)
+        if not value:
+            return
+        try:
+            state = json.loads(value)
+            update_id, saved_at = int(state["update_id"]), float(state["saved_at"])
+        except (ValueError, TypeError, KeyError):
+            # Avvalgi format (faqat update_id) - qachon saqlangani noma'lum
+            logger.warning(f"{STATE_KEY} vaqtsiz yoki noto'g'ri: {value!r} - e'tiborsiz qoldirildi")
+            return
+        if time.time() - saved_at > MARK_MAX_AGE:
+            logger.info(f"{STATE_KEY} eskirgan ({update_id}) - e'tiborsiz qoldirildi")
+            return
+        self.high_water = self._saved = update_id
+        self._active_at = saved_at
+
+    async def save(self, db):
+        """High-water mark'ni saqlash (o'zgargan bo'lsa)"""
+        watermark = self.watermark()
+        if watermark <= self._saved:
+            return
+        try:
+            await db.set_state(STATE_KEY, json.dumps({"update_id": watermark, "saved_at": time.time()}))
+            self._saved = watermark
+        except Exception as e:
+            logger.error(f"{STATE_KEY} ni saqlashda xato: {e}")
+
+    async def persist(self, db, interval: float = 5):
+        """High-water mark'ni davriy ravishda saqlash"""
+        while True:
+            await asyncio.sleep(interval)
+            await self.save(db)
+
+
+update_deduplicator = UpdateDeduplicator()
@@ -0,0 +1,73 @@
+import asyncio
+import signal
+import time
+from contextlib import suppress
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import TelegramObject
+
+
+class InFlightMiddleware(BaseMiddleware):
+    """Ishlanayotgan update'larni sanash; to'xtatishda yangilarini qabul qilmaslik
+
+    Rad etilgan update'lar yo'qolmaydi: polling offset'i keyingi getUpdates
+    so'rovida tasdiqlanadi, u bo'lmagani uchun Telegram ularni qayta yuboradi.
+    """
+
+    def __init__(self):
+        self.accepting = True
+        self.active = 0
+        # /health sanagichlari
+        self.peak = 0
+        self.handled = 0
+        self.failed = 0
+        self.total_time = 0.0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        if not self.accepting:
+            return UNHANDLED
+
+        self.active += 1
+        if self.active > self.peak:
+            self.peak = self.active
+        self._idle.clear()
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.handled += 1
+            self.total_time += time.perf_counter() - started
+            self.active -= 1
+            if not self.active:
+                self._idle.set()
+
+    async def drain(self, timeout: float) -> int:
+        """Ishlanayotgan handlerlarni kutish. Qaytaradi: tugamay qolganlar soni"""
+        self.accepting = False
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self._idle.wait(), max(timeout, 0))
+        return self.active
+
+
+def install_signal_handlers(callback: Callable[[], Any]):
+    """SIGINT/SIGTERM da `callback` ni chaqirish"""
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        # Windows'da qo'llab-quvvatlanmaydi
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(sig, callback)
+
+
+in_flight = InFlightMiddleware()
@@ -0,0 +1,266 @@
+import asyncio
+import json
+import logging
+import queue
+import random
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# Foydalanuvchi xatosi emas - broadcast statistikasida ham sanaladi
+EXPECTED_SEND_ERRORS = ("blocked", "deleted", "deactivated")
+
+# Joriy update konteksti: update_id, user_id, handler
+log_context: ContextVar[Dict[str, Any]] = ContextVar("log_context", default={})
+
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    """"aiogram.event=0.1,utils.reminders=0" -> {logger nomi: ulush}"""
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, sep, rate = item.partition("=")
+        if not sep:
+            raise ValueError(f"LOG_SAMPLE_RATES: '{item}' - logger=ulush ko'rinishida bo'lishi kerak")
+        rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """INFO/DEBUG yozuvlarning faqat bir qismini o'tkazish (logger nomi prefiksi bo'yicha)
+
+    WARNING va undan yuqorisi har doim o'tadi.
+    """
+
+    def __init__(self, rates: Dict[str, float] = None):
+        super().__init__()
+        self.rates = rates or {}
+        self.dropped = 0
+        self._resolved: Dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate = 1.0
+            prefix = name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition(".")[0]
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self._rate(record.name)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        self.dropped += 1
+        return False
+
+
+class ContextQueueHandler(QueueHandler):
+    """Yozuvni navbatga qo'yish (yozish va JSON - alohida oqimda)
+
+    Navbat to'lsa yozuv tashlab yuboriladi - event loop kutib qolmaydi.
+    """
+
+    def __init__(self, log_queue: queue.SimpleQueue, max_size: int):
+        super().__init__(log_queue)
+        self.max_size = max_size
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Root'da boshqa handler yo'q - yozuvni nusxalamasdan o'zgartirish mumkin.
+        # Kontekst faqat shu yerda (event loop'da) ma'lum
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.context = log_context.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self.queue.qsize() >= self.max_size:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+
+class JsonFormatter(logging.Formatter):
+    """Bir qator - bitta JSON yozuv"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(getattr(record, "context", None) or {})
+        entry.update(getattr(record, "data", None) or {})
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Avvalgi matn formati + kontekst"""
+
+    def __init__(self):
+        super().__init__(TEXT_FORMAT)
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        text = super().formatMessage(record)
+        fields = {**(getattr(record, "context", None) or {}), **(getattr(record, "data", None) or {})}
+        if fields:
+            text += " [" + " ".join(f"{key}={value}" for key, value in fields.items()) + "]"
+        return text
+
+
+class LogPipeline:
+    """Root logger -> navbat -> alohida oqimda stdout
+
+    Event loop faqat yozuvni navbatga qo'yadi; formatlash (JSON) va yozish
+    QueueListener oqimida bajariladi.
+    """
+
+    def __init__(self):
+        self.handler: Optional[ContextQueueHandler] = None
+        self.sampler: Optional[SamplingFilter] = None
+        self.listener: Optional[QueueListener] = None
+        self._reported: Tuple[int, int] = (0, 0)
+
+    def start(self):
+        stream = logging.StreamHandler()
+        stream.setFormatter(JsonFormatter() if settings.LOG_FORMAT == "json" else TextFormatter())
+
+        self.handler = ContextQueueHandler(queue.SimpleQueue(), settings.LOG_QUEUE_SIZE)
+        self.sampler = SamplingFilter(parse_sample_rates(settings.LOG_SAMPLE_RATES))
+        self.handler.addFilter(self.sampler)
+
+        root = logging.getLogger()
+        root.handlers[:] = [self.handler]
+        root.setLevel(settings.LOG_LEVEL.upper())
+
+        self.listener = QueueListener(self.handler.queue, stream, respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self):
+        """Navbatdagi yozuvlarni yozib, oqimni to'xtatish"""
+        if self.listener:
+            self.listener.stop()
+            self.listener = None
+
+    @property
+    def dropped(self) -> int:
+        return self.handler.dropped if self.handler else 0
+
+    @property
+    def sampled_out(self) -> int:
+        return self.sampler.dropped if self.sampler else 0
+
+    def report(self):
+        """Oxirgi hisobotdan beri yo'qotilgan yozuvlar (navbat to'lgan / sampling)"""
+        dropped, sampled_out = self.dropped, self.sampled_out
+        last_dropped, last_sampled_out = self._reported
+        self._reported = (dropped, sampled_out)
+        if dropped > last_dropped:
+            logger.warning(
+                "Log navbati to'lgan: %d ta yozuv tashlab yuborildi", dropped - last_dropped,
+                extra={"data": {"dropped": dropped - last_dropped}}
+            )
+        if sampled_out > last_sampled_out:
+            logger.info(
+                "Sampling: %d ta yozuv o'tkazib yuborildi", sampled_out - last_sampled_out,
+                extra={"data": {"sampled_out": sampled_out - last_sampled_out}}
+            )
+
+
+class ErrorAggregator:
+    """Takrorlanuvchi yuborish xatolarini sanab, davriy bitta xulosa yozish
+
+    Har bir muvaffaqiyatsiz yuborish uchun alohida log o'rniga
+    (manba, xato turi) bo'yicha hisob va oxirgi misol saqlanadi.
+    """
+
+    def __init__(self):
+        self._counts: Dict[Tuple[str, str], int] = {}
+        self._examples: Dict[Tuple[str, str], Tuple[Optional[int], str]] = {}
+
+    def add(self, source: str, error: str, user_id: int = None):
+        # "bad_request: chat not found" -> bad_request
+        key = (source, error.partition(":")[0])
+        self._counts[key] = self._counts.get(key, 0) + 1
+        self._examples[key] = (user_id, error)
+
+    def flush(self):
+        if not self._counts:
+            return
+        counts, examples = self._counts, self._examples
+        self._counts, self._examples = {}, {}
+        for (source, kind), count in sorted(counts.items()):
+            user_id, error = examples[(source, kind)]
+            level = logging.INFO if kind in EXPECTED_SEND_ERRORS else logging.WARNING
+            logger.log(
+                level, "%s: %d ta yuborilmadi (%s), oxirgisi %s: %s", source, count, kind, user_id, error,
+                extra={"data": {"source": source, "error": kind, "count": count}}
+            )
+
+
+class LogContextMiddleware(BaseMiddleware):
+    """Update konteksti: shu update ichidagi barcha log yozuvlariga qo'shiladi
+
+    Update darajasida (outer) update_id va user_id, message/callback
+    darajasida (inner) handler nomi.
+    """
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        context = dict(log_context.get())
+        if isinstance(event, Update):
+            context["update_id"] = event.update_id
+        user = data.get("event_from_user")
+        if user is not None:
+            context["user_id"] = user.id
+        handler_object = data.get("handler")
+        if handler_object is not None:
+            callback = handler_object.callback
+            context["handler"] = f"{callback.__module__}.{callback.__name__}"
+
+        token = log_context.set(context)
+        try:
+            return await handler(event, data)
+        finally:
+            log_context.reset(token)
+
+
+async def run_log_summaries(interval: float = None):
+    """Yig'ilgan xatolar va yo'qotilgan yozuvlar xulosasini davriy yozish"""
+    interval = interval or settings.LOG_SUMMARY_INTERVAL
+    while True:
+        await asyncio.sleep(interval)
+        send_errors.flush()
+        log_pipeline.report()
+
+
+log_pipeline = LogPipeline()
+send_errors = ErrorAggregator()
+log_context_middleware = LogContextMiddleware()
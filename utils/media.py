@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import os
+from typing import Dict, List, Optional, Union
+
+from aiogram.types import FSInputFile, Message
+
+from database.database import db
+
+logger = logging.getLogger(__name__)
+
+STATE_PREFIX = "file_id:"
+# Albom qismlari orasidagi eng katta kutish (soniya)
+MEDIA_GROUP_DELAY = 1.0
+# Shu turlar HTML matn/rasm sifatida qayta yuboriladi, qolganlari - admin xabaridan nusxa
+SEND_CONTENT_TYPES = ("text", "photo")
+
+
+class MediaGroupCollector:
+    """Albom (media group) qismlarini bitta ro'yxatga yig'ish
+
+    Telegram albomning har bir qismini alohida update qilib yuboradi.
+    Birinchi qism handleri yangi qism kelmay qolguncha kutadi va butun
+    albomni qaytaradi, qolgan qismlar handleriga None qaytadi.
+    """
+
+    def __init__(self, delay: float = MEDIA_GROUP_DELAY):
+        self.delay = delay
+        self._groups: Dict[str, List[Message]] = {}
+
+    async def collect(self, message: Message) -> Optional[List[Message]]:
+        if not message.media_group_id:
+            return [message]
+
+        key = f"{message.chat.id}:{message.media_group_id}"
+        group = self._groups.get(key)
+        if group is not None:
+            group.append(message)
+            return None
+
+        group = self._groups[key] = [message]
+        try:
+            size = 0
+            while size != len(group):
+                size = len(group)
+                await asyncio.sleep(self.delay)
+        finally:
+            del self._groups[key]
+        return sorted(group, key=lambda item: item.message_id)
+
+
+class FileIdCache:
+    """Lokal fayllar uchun Telegram file_id keshi (xotirada va bot_state'da)
+
+    Lokal fayl faqat birinchi marta yuklanadi, keyin Telegram qaytargan
+    file_id ishlatiladi.
+    """
+
+    def __init__(self):
+        self._file_ids: Dict[str, str] = {}
+
+    async def get(self, path: str) -> Optional[str]:
+        file_id = self._file_ids.get(path)
+        if file_id is None:
+            file_id = await db.get_state(STATE_PREFIX + path)
+            if file_id:
+                self._file_ids[path] = file_id
+        return file_id
+
+    async def set(self, path: str, file_id: str):
+        if self._file_ids.get(path) == file_id:
+            return
+        self._file_ids[path] = file_id
+        try:
+            await db.set_state(STATE_PREFIX + path, file_id)
+        except Exception as e:
+            logger.error(f"file_id ni saqlashda xato ({path}): {e}")
+
+    async def forget(self, path: str):
+        if self._file_ids.pop(path, None):
+            await self.set(path, "")
+
+    async def resolve(self, photo: str) -> Union[str, FSInputFile]:
+        """Rasm: keshdagi file_id, lokal fayl yoki (o'zi file_id bo'lsa) o'zgarishsiz"""
+        file_id = self._file_ids.get(photo)
+        if file_id:
+            return file_id
+        if not os.path.exists(photo):
+            return photo
+        return await self.get(photo) or FSInputFile(photo)
+
+    async def remember(self, photo: str, message: Message):
+        """Yuborilgan xabardagi file_id ni lokal fayl uchun saqlash"""
+        if message.photo and not self._file_ids.get(photo) and os.path.exists(photo):
+            await self.set(photo, message.photo[-1].file_id)
+
+
+def message_source(messages: List[Message]) -> Optional[str]:
+    """Nusxa olinadigan xabarlar ("12,13,14"). Oddiy matn yoki bitta rasm uchun - None"""
+    if len(messages) == 1 and messages[0].content_type in SEND_CONTENT_TYPES:
+        return None
+    return ",".join(str(message.message_id) for message in messages)
+
+
+media_groups = MediaGroupCollector()
+file_ids = FileIdCache()
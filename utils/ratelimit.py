@@ -0,0 +1,38 @@
+import asyncio
+import time
+
+
+class PauseStats:
+    """Telegram cheklovlari (retry_after): soni va jami kutish - barcha yuboruvchilar bo'yicha"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.last_at = None
+
+    def record(self, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        self.last_at = time.monotonic()
+
+
+class RateLimiter:
+    """So'rovlarni soniyasiga `rate` tadan tez yubormaslik (fon vazifalari uchun)"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._next_call = 0.0
+
+    async def wait(self):
+        now = time.monotonic()
+        if self._next_call > now:
+            await asyncio.sleep(self._next_call - now)
+        self._next_call = max(now, self._next_call) + 1 / self.rate
+
+    def pause(self, seconds: float):
+        """Telegram cheklovi (retry_after) - byudjetni shu vaqtga surish"""
+        self._next_call = time.monotonic() + seconds
+        rate_limit_pauses.record(seconds)
+
+
+rate_limit_pauses = PauseStats()
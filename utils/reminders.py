@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from aiogram import Bot
+
+from config import settings
+from database.database import db
+from database.segments import FUNNEL_STAGES
+from utils.broadcast import safe_send_message
+from utils.campaigns import campaigns, required_referrals
+from utils.logs import send_errors
+from utils.ratelimit import RateLimiter
+from utils.templates import templates
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 50
+# Navbatdagi (hali yuborilmagan) eslatmalar shundan oshmaydi
+QUEUE_SIZE = 50
+# Vaqtinchalik xatolar (Telegram cheklovi, tarmoq) - band bekor qilinib, keyingi aylanishda qayta
+TRANSIENT_ERRORS = ("retry_after", "error")
+
+Reminder = Tuple[str, int, Optional[int], int]
+
+
+class ReminderPipeline:
+    """Vazifani bajarmaganlarga kechiktirilgan eslatmalar
+
+    Har bir aylanishda voronkaning har bir bosqichidagi (FUNNEL_STAGES),
+    /start dan `delay` soniya o'tgan foydalanuvchilar keyset sahifalar
+    bilan topilib navbatga qo'yiladi va soniyasiga `rate` tadan yuboriladi.
+    Eslatma database'da yuborishdan oldingina band qilinadi (foydalanuvchi
+    + bosqich bo'yicha bir marta); yuborilmay qolsa (to'xtatish, vaqtinchalik
+    xato) band bekor qilinadi - keyingi aylanishda qayta topiladi.
+    """
+
+    def __init__(self, bot: Bot, rate: float = None, delay: float = None):
+        self.bot = bot
+        self.delay = delay or settings.REMINDER_DELAY
+        self.limiter = RateLimiter(rate or settings.REMINDER_RATE)
+        self.queue: "asyncio.Queue[Reminder]" = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.sent = 0
+        self.failed = 0
+
+    async def collect(self) -> int:
+        """Bitta aylanish: eslatilmaganlarni navbatga qo'yish. Qaytaradi: navbatga qo'yilganlar soni"""
+        created_before = datetime.utcnow() - timedelta(seconds=self.delay)
+        queued = 0
+        for stage in FUNNEL_STAGES:
+            after_id = 0
+            while True:
+                rows = await db.get_reminder_candidates(stage, created_before, after_id, PAGE_SIZE)
+                if not rows:
+                    break
+                after_id = rows[-1][0]
+                for user_id, campaign_id, referral_count in rows:
+                    # Navbat to'lsa - yuborilishini kutadi
+                    await self.queue.put((stage, user_id, campaign_id, referral_count))
+                    queued += 1
+        return queued
+
+    async def render(self, stage: str, campaign_id: Optional[int], referral_count: int) -> str:
+        if stage == "referrals":
+            required = required_referrals(await campaigns.get(campaign_id))
+            return await templates.render(
+                "reminder_referrals", referrals=required, left=max(required - referral_count, 1)
+            )
+        return await templates.render("reminder_channels")
+
+    async def deliver(self):
+        """Navbatdagi eslatmalarni tezlik cheklovi bilan yuborish"""
+        while True:
+            stage, user_id, campaign_id, referral_count = await self.queue.get()
+            try:
+                await self.limiter.wait()
+                # Oldingi aylanishda navbatga qo'yilib, allaqachon yuborilgan bo'lishi mumkin
+                if not await db.claim_reminders(stage, [user_id]):
+                    continue
+                await self.send(stage, user_id, campaign_id, referral_count)
+            except Exception as e:
+                logger.error(f"Eslatma yuborishda xato ({user_id}): {e}")
+            finally:
+                self.queue.task_done()
+
+    async def send(self, stage: str, user_id: int, campaign_id: Optional[int], referral_count: int):
+        """Band qilingan eslatmani yuborish; vaqtinchalik xatoda band bekor qilinadi"""
+        try:
+            success, error_type = await safe_send_message(
+                self.bot, user_id, text=await self.render(stage, campaign_id, referral_count)
+            )
+        except asyncio.CancelledError:
+            # To'xtatilmoqda - keyingi ishga tushishda qayta yuboriladi
+            await db.release_reminder(stage, user_id)
+            raise
+        except Exception as e:
+            success, error_type = False, f"error: {e}"
+
+        if success:
+            self.sent += 1
+            return
+        self.failed += 1
+        send_errors.add(f"reminder:{stage}", error_type, user_id)
+        if error_type.partition(":")[0] in TRANSIENT_ERRORS:
+            await db.release_reminder(stage, user_id)
+
+
+# Ishlayotgan eslatmalar navbati (/health)
+active_pipeline: Optional[ReminderPipeline] = None
+
+
+def queued_reminders() -> int:
+    """Navbatdagi, hali yuborilmagan eslatmalar"""
+    return active_pipeline.queue.qsize() if active_pipeline else 0
+
+
+async def run_reminders(bot: Bot, interval: float = None):
+    """Eslatmalarni davriy qidirish (aylanishlar orasida `interval` soniya) va yuborish"""
+    global active_pipeline
+    interval = interval or settings.REMINDER_INTERVAL
+    pipeline = active_pipeline = ReminderPipeline(bot)
+    sender = asyncio.create_task(pipeline.deliver())
+    try:
+        while True:
+            try:
+                queued = await pipeline.collect()
+                if queued:
+                    logger.info(
+                        f"🔔 {queued} ta eslatma navbatga qo'yildi "
+                        f"(jami yuborilgan: {pipeline.sent}, xato: {pipeline.failed})"
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Eslatmalarni qidirishda xato: {e}")
+            await asyncio.sleep(interval)
+    finally:
+        sender.cancel()
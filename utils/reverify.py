@@ -0,0 +1,150 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.enums import ChatMemberStatus
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+from config import settings
+from database.database import db
+from utils.ratelimit import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+STATE_KEY = "reverify_progress"
+PAGE_SIZE = 100
+MEMBER_STATUSES = (ChatMemberStatus.CREATOR, ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.MEMBER)
+# Kanal darajasidagi xatolar - shu aylanishda kanal boshqa tekshirilmaydi
+CHANNEL_ERRORS = ("chat not found", "member list is inaccessible", "not enough rights")
+
+
+class MembershipVerifier:
+    """Kanal a'zoligini (user_channels.joined) Bot API orqali fonda tekshirish
+
+    Barcha foydalanuvchilar (users, telegram_id bo'yicha keyset sahifalar)
+    aylanib chiqiladi, har biri uchun aktiv kanallarda get_chat_member
+    chaqiriladi - soniyasiga `rate` tadan ko'p emas, interaktiv so'rovlarga
+    joy qoladi. Yangi qo'shilganlar va chiqib ketganlar sahifa bo'yicha
+    bitta tranzaksiyada yoziladi, kursor bot_state'da saqlanadi.
+    """
+
+    def __init__(self, bot: Bot, rate: float = None):
+        self.bot = bot
+        self.limiter = RateLimiter(rate or settings.REVERIFY_RATE)
+        self.progress = {
+            "after": 0, "checked": 0, "changed": 0, "left": 0,
+            "started": None, "finished": None,
+        }
+        self._skipped: Set[str] = set()
+
+    async def load(self):
+        """Saqlangan kursor va sanagichlarni yuklash"""
+        value = await db.get_state(STATE_KEY)
+        if value:
+            try:
+                self.progress.update(json.loads(value))
+            except ValueError:
+                logger.error(f"Noto'g'ri {STATE_KEY}: {value!r}")
+
+    async def save(self):
+        await db.set_state(STATE_KEY, json.dumps(self.progress))
+
+    async def is_member(self, channel_id: str, user_id: int) -> Optional[bool]:
+        """Kanal a'zosimi. Aniqlab bo'lmasa - None (holat o'zgartirilmaydi)"""
+        if channel_id in self._skipped:
+            return None
+
+        await self.limiter.wait()
+        try:
+            member = await self.bot.get_chat_member(channel_id, user_id)
+        except TelegramRetryAfter as e:
+            self.limiter.pause(e.retry_after)
+            return None
+        except (TelegramBadRequest, TelegramForbiddenError) as e:
+            if isinstance(e, TelegramForbiddenError) or any(error in str(e).lower() for error in CHANNEL_ERRORS):
+                logger.warning(f"Kanal {channel_id} qayta tekshirilmaydi: {e}")
+                self._skipped.add(channel_id)
+            return None
+        except Exception as e:
+            logger.error(f"A'zolikni tekshirishda xato ({channel_id}, {user_id}): {e}")
+            return None
+
+        if member.status == ChatMemberStatus.RESTRICTED:
+            return bool(getattr(member, "is_member", False))
+        return member.status in MEMBER_STATUSES
+
+    async def verify_page(self, users: List[Tuple[int, Optional[int]]], channels: List[Dict]) -> int:
+        """Sahifadagi (user_id, campaign_id) larni tekshirish. Qaytaradi: o'zgargan holatlar soni
+
+        Har bir foydalanuvchi faqat umumiy va o'z kampaniyasi kanallarida tekshiriladi.
+        """
+        states = await db.get_channel_states([user_id for user_id, _ in users])
+        changes = []
+        for user_id, campaign_id in users:
+            for channel in channels:
+                if channel['campaign_id'] is not None and channel['campaign_id'] != campaign_id:
+                    continue
+                member = await self.is_member(channel['channel_id'], user_id)
+                if member is None:
+                    continue
+                self.progress['checked'] += 1
+                joined, _ = states[user_id].get(channel['id'], (0, 0))
+                if member and joined != 1:
+                    changes.append((user_id, channel['id'], 1, 0))
+                elif not member and joined == 1:
+                    changes.append((user_id, channel['id'], 0, 0))
+                    self.progress['left'] += 1
+
+        if changes:
+            await db.set_channel_states(changes)
+            self.progress['changed'] += len(changes)
+        return len(changes)
+
+    async def run_pass(self):
+        """Bitta to'liq aylanish (kursordan davom etadi)"""
+        if self.progress['finished'] or not self.progress['started']:
+            self.progress.update(
+                after=0, checked=0, changed=0, left=0, started=int(time.time()), finished=None
+            )
+        self._skipped.clear()
+
+        while True:
+            users = await db.get_users_campaign_page(self.progress['after'], PAGE_SIZE)
+            if not users:
+                break
+            # Taklif havolasi (https://t.me/+...) bo'yicha a'zolikni tekshirib bo'lmaydi
+            channels = [
+                channel for channel in await db.get_active_channels()
+                if not channel['channel_id'].startswith('https://')
+            ]
+            await self.verify_page(users, channels)
+            self.progress['after'] = users[-1][0]
+            await self.save()
+
+        self.progress.update(after=0, finished=int(time.time()))
+        await self.save()
+        logger.info(
+            f"A'zolik qayta tekshirildi: {self.progress['checked']} ta tekshiruv, "
+            f"{self.progress['changed']} ta o'zgarish ({self.progress['left']} ta chiqib ketgan)"
+        )
+
+
+async def run_reverification(bot: Bot, interval: float = None):
+    """A'zolikni davriy qayta tekshirish (aylanishlar orasida `interval` soniya)"""
+    interval = interval or settings.REVERIFY_INTERVAL
+    verifier = MembershipVerifier(bot)
+    await verifier.load()
+    while True:
+        try:
+            finished = verifier.progress['finished']
+            if finished:
+                await asyncio.sleep(max(finished + interval - time.time(), 0))
+            await verifier.run_pass()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"A'zolikni qayta tekshirishda xato: {e}")
+            await asyncio.sleep(60)
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from aiogram import Bot
+
+from config import settings
+from database.database import db
+from database.segments import Segment, parse_segment
+from utils.broadcast import running_jobs, start_broadcast
+
+logger = logging.getLogger(__name__)
+
+# Adminlar vaqtni mahalliy vaqtda kiritadi (standart - Toshkent, UTC+5)
+LOCAL_TZ = timezone(timedelta(hours=settings.SCHEDULE_UTC_OFFSET))
+MIN_INTERVAL = 10 * 60
+
+DURATION_RE = re.compile(r"^(\d+)([smhd])$")
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+SCHEDULE_HELP = (
+    "<code>/schedule &lt;vaqt&gt; [every=1d] [spread=2h] [filtrlar]</code>\n\n"
+    "⏰ Vaqt: <code>+30m</code>, <code>09:00</code> yoki <code>2024-05-01 09:00</code>\n"
+    "🔁 every - takrorlash oralig'i (kamida 10m)\n"
+    "🌊 spread - yuborishni shu vaqt oralig'iga taqsimlash\n"
+    "🎯 Filtrlar - /segment dagi kabi"
+)
+
+
+def parse_duration(value: str) -> int:
+    """'30m', '2h', '1d' -> soniyalar"""
+    match = DURATION_RE.match(value)
+    if not match:
+        raise ValueError(f"Noto'g'ri davomiylik: {value} (masalan: 30m, 2h, 1d)")
+    return int(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+
+def format_time(timestamp: int) -> str:
+    return datetime.fromtimestamp(timestamp, LOCAL_TZ).strftime("%Y-%m-%d %H:%M")
+
+
+def parse_schedule(text: Optional[str], now: float = None) -> Tuple[int, Optional[int], int, Segment]:
+    """/schedule argumentlari -> (run_at, interval, spread, segment). Xato bo'lsa - ValueError"""
+    now = now or time.time()
+    tokens = (text or "").split()
+    if not tokens:
+        raise ValueError("Vaqt ko'rsatilmagan")
+
+    token = tokens.pop(0)
+    if token.startswith("+"):
+        run_at = int(now) + parse_duration(token[1:])
+    elif re.match(r"^\d{4}-\d{2}-\d{2}$", token) and tokens:
+        try:
+            moment = datetime.strptime(f"{token} {tokens.pop(0)}", "%Y-%m-%d %H:%M")
+        except ValueError:
+            raise ValueError("Noto'g'ri sana/vaqt (YYYY-MM-DD HH:MM)")
+        run_at = int(moment.replace(tzinfo=LOCAL_TZ).timestamp())
+    else:
+        try:
+            clock = datetime.strptime(token, "%H:%M").time()
+        except ValueError:
+            raise ValueError(f"Noto'g'ri vaqt: {token}")
+        # Bugun yoki (o'tib ketgan bo'lsa) ertaga
+        today = datetime.fromtimestamp(now, LOCAL_TZ)
+        moment = datetime.combine(today.date(), clock, LOCAL_TZ)
+        if moment.timestamp() <= now:
+            moment += timedelta(days=1)
+        run_at = int(moment.timestamp())
+
+    interval = None
+    spread = 0
+    filters = []
+    for token in tokens:
+        key, _, value = token.partition("=")
+        if key == "every" and value:
+            interval = parse_duration(value)
+        elif key == "spread" and value:
+            spread = parse_duration(value)
+        else:
+            filters.append(token)
+
+    if run_at <= now:
+        raise ValueError("Vaqt o'tib ketgan")
+    if interval is not None and interval < MIN_INTERVAL:
+        raise ValueError("every kamida 10m bo'lishi kerak")
+    if interval is not None and spread >= interval:
+        raise ValueError("spread every dan kichik bo'lishi kerak")
+    return run_at, interval, spread, parse_segment(" ".join(filters))
+
+
+def next_run_at(schedule: Dict, now: int) -> Optional[int]:
+    """Takroriy reja uchun keyingi vaqt (o'tkazib yuborilganlari qayta yuborilmaydi)"""
+    interval = schedule['interval_seconds']
+    if not interval:
+        return None
+    missed = (now - schedule['run_at']) // interval + 1
+    return schedule['run_at'] + missed * interval
+
+
+async def run_due_schedules(bot: Bot, now: int = None) -> int:
+    """Vaqti kelgan rejalarni ishga tushirish. Qaytaradi: boshlanganlar soni"""
+    now = int(now or time.time())
+    started = 0
+    for schedule in await db.get_due_schedules(now):
+        # Xabar yuborishlar ustma-ust tushmasligi uchun - keyingi tekshiruvgacha kutadi
+        if running_jobs:
+            break
+
+        try:
+            segment = parse_segment(schedule['segment'])
+        except ValueError as e:
+            logger.error(f"Reja #{schedule['id']}: segment noto'g'ri - {e}")
+            continue
+
+        # Avval band qilinadi: qayta ishga tushganda ikki marta yuborilmaydi
+        claimed_run_at = next_run_at(schedule, now)
+        if not await db.claim_schedule(schedule['id'], schedule['run_at'], claimed_run_at):
+            continue
+
+        try:
+            broadcast = await start_broadcast(
+                bot, schedule['admin_chat_id'], schedule['text'], schedule['photo'],
+                segment, spread=schedule['spread_seconds'] or 0,
+                source_chat_id=schedule['source_chat_id'], source_message_ids=schedule['source_message_ids']
+            )
+        except Exception:
+            # Xabar yuborish yaratilmadi - reja keyingi tekshiruvda qayta ishga tushadi
+            await db.release_schedule(
+                schedule['id'], schedule['run_at'],
+                claimed_run_at if claimed_run_at is not None else schedule['run_at']
+            )
+            raise
+        await db.set_schedule_broadcast(schedule['id'], broadcast['id'])
+        logger.info(f"Reja #{schedule['id']}: xabar yuborish #{broadcast['id']} boshlandi")
+        started += 1
+    return started
+
+
+async def run_scheduler(bot: Bot, interval: float = None):
+    """Rejalarni davriy tekshirish (asosiy event loop'da)"""
+    interval = interval or settings.SCHEDULER_INTERVAL
+    while True:
+        try:
+            await run_due_schedules(bot)
+        except Exception as e:
+            logger.error(f"Rejalashtiruvchida xato: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,182 @@
+import logging
+import string
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from database.database import db
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class TemplateSpec:
+    description: str
+    default: str
+    # Matnda {nom} ko'rinishida ishlatiladigan o'zgaruvchilar
+    variables: Tuple[str, ...] = ()
+
+
+# Admin o'zgartira oladigan matnlar (database'da yozuv bo'lmasa - standart matn)
+TEMPLATES: Dict[str, TemplateSpec] = {
+    "welcome": TemplateSpec("Xush kelibsiz matni (kanallar ro'yxati bilan)", """
+Bepul darsliklarni qo'lga kiritish uchun quyidagi kanallarga a'zo bo'ling👇
+
+<b>📺 Kanallar:</b>
+
+{channels}✅ Barcha kanallarga a'zo bo'lgandan so'ng "Tekshirish" tugmasini bosing!""".strip(), ("channels",)),
+    "welcome_empty": TemplateSpec("Aktiv kanallar bo'lmaganda", """
+👋 Assalomu alaykum!
+
+🎓 Bepul darsliklar olish uchun botdan foydalaning.
+
+⚠️ Hozirda aktiv kanallar yo'q. Admin bilan bog'laning.""".strip()),
+    "check_membership": TemplateSpec("\"Tekshirish\" tugmasi javobi", """
+HAR TOMONLAMA RIVOJLANISHNI ISTAGANLAR UCHUN 🔝
+
+✨ Assalomu alaykum, muslimam!
+
+Bu yerda 5 nafar mutaxassis o'z tajribasi va bilimlarini jamlab, siz uchun bepul darslik tayyorlashdi. Har bir mavzu — rivojingiz uchun muhim:
+
+📌 Gulruh – "Hammasi blogdan boshlanadi"
+📌 Ayilen – Oila qurishga tayyorgarlik va qo'rquvlarni yengish
+📌 Mohinur Barista – Koreyada yashash va o'qish imkoniyatlari
+📌 Xilola Qayumova – "Homiladorlar bilishi shart"
+📌 Sojida Karimova – Sog'lom munosabatlar siri
+
+📖 Bu loyiha sizga maksimal foyda berish va yangi imkoniyatlarga yo'l ochish uchun takrorlanmas imkon.
+
+Yagona shart - bot bergan taklif postini atigi {referrals} ta yaqiningizga yuborish, xolos!
+
+Darsliklar jamlangan kanalga linkni olish uchun👇""".strip(), ("referrals",)),
+    "check_membership_button": TemplateSpec("\"Tekshirish\" javobidagi havola tugmasi", "Darsliklarni olish"),
+    "success": TemplateSpec("Vazifa bajarilganda (va /msg)", """
+Tabriklayman, siz muvaffaqiyatli ro'yxatdan o'tdingiz 🥳
+
+{link}
+
+Darsliklar shu kanalga yuboriladi. Qo'shilib oling!""".strip(), ("link",)),
+    "offer": TemplateSpec("Taklif posti (content o'rnatilmagan bo'lsa)", """
+✨ Bepul darslik loyihasi start oldi!
+
+5 nafar mutaxassis siz uchun turli sohalarda bepul darslar tayyorlashdi:
+🌱 Blog yuritish
+🌱 Oila qurishga tayyorgarlik
+🌱 Koreyada o'qish va yashash
+🌱 Homiladorlikda muhim ma'lumotlar
+🌱 Sog'lom munosabatlar
+
+✅ Hayotning eng muhim bosqichlarida kerak bo'ladigan bilimlarni bir joyda jamladik. Endi siz ham mutaxassislardan eshitasiz, mutlaqo BEPUL!
+
+👉 Ishtirok etish tugmasini bosing va darslikni birinchi bo'lib qo'lga kiriting!""".strip()),
+    "offer_done": TemplateSpec("Taklif postidan keyingi xabar", "Muvaffaqiyat tilayman! 🚀"),
+    "reminder_channels": TemplateSpec("Eslatma: kanallarga qo'shilmaganlar", """
+👋 Bepul darsliklar sizni kutmoqda!
+
+Darsliklarni olish uchun barcha kanallarga a'zo bo'ling va "✅ Tekshirish" tugmasini bosing.""".strip()),
+    "reminder_referrals": TemplateSpec("Eslatma: referallari yetmaganlar", """
+🔥 Darsliklarga oz qoldi!
+
+Taklif postini yana {left} ta yaqiningizga yuboring - jami {referrals} ta do'stingiz qo'shilsa, darsliklar sizniki!""".strip(), ("referrals", "left")),
+    "help": TemplateSpec("\"Yordam\" matni", """
+ℹ️ <b>Bot haqida ma'lumot:</b>
+
+🎯 <b>Maqsad:</b> Bepul darsliklar olish
+
+📋 <b>Qadamlar:</b>
+1️⃣ Barcha kanallarga qo'shiling
+2️⃣ Sizning linkingiz orqali {referrals} ta odam qo'shiling
+3️⃣ Darsliklarni oling!
+
+🔗 <b>Linkni qanday ulashish:</b>
+• Do'stlaringizga yuboring
+• Ijtimoiy tarmoqlarda ulashing
+• Guruplarda bo'lishing
+
+❓ <b>Savollaringiz bo'lsa:</b>
+Admin bilan bog'laning""".strip(), ("referrals",)),
+}
+
+
+class CompiledTemplate:
+    """Bir marta tahlil qilingan matn: (oddiy matn, o'zgaruvchi) bo'laklari"""
+
+    __slots__ = ("parts",)
+
+    def __init__(self, parts: List[Tuple[str, Optional[str]]]):
+        self.parts = parts
+
+    def render(self, **values) -> str:
+        return "".join(
+            literal + (str(values[field]) if field else "")
+            for literal, field in self.parts
+        )
+
+
+def compile_template(name: str, body: str) -> CompiledTemplate:
+    """Matnni tekshirib, bo'laklarga ajratish. Noma'lum o'zgaruvchi yoki xato bo'lsa - ValueError
+
+    Figurali qavsning o'zi kerak bo'lsa - {{ va }}.
+    """
+    try:
+        tokens = list(string.Formatter().parse(body))
+    except ValueError as e:
+        raise ValueError(f"Figurali qavslar noto'g'ri ({e}). Qavsning o'zi uchun {{{{ va }}}} yozing")
+
+    allowed = TEMPLATES[name].variables
+    parts = []
+    for literal, field, spec, conversion in tokens:
+        if field is not None and field not in allowed:
+            variables = ", ".join(f"{{{variable}}}" for variable in allowed) or "yo'q"
+            raise ValueError(f"Noma'lum o'zgaruvchi {{{field}}} (mumkin: {variables})")
+        if spec or conversion:
+            raise ValueError(f"{{{field}}} ichida : yoki ! ishlatilmaydi")
+        parts.append((literal, field))
+    return CompiledTemplate(parts)
+
+
+class TemplateStore:
+    """Tahlil qilingan matnlar keshi (db.templates_version o'zgarmaguncha)
+
+    Admin matnni o'zgartirganda versiya oshadi - keyingi so'rovda matnlar
+    qayta yuklanadi, bot qayta ishga tushirilmaydi.
+    """
+
+    def __init__(self):
+        self._version = None
+        self._overrides: Dict[str, str] = {}
+        self._compiled: Dict[str, CompiledTemplate] = {}
+
+    async def _load(self):
+        version = db.templates_version
+        if version == self._version:
+            return
+        overrides = await db.get_templates()
+        compiled = {}
+        for name, spec in TEMPLATES.items():
+            body = overrides.get(name)
+            if body is not None:
+                try:
+                    compiled[name] = compile_template(name, body)
+                    continue
+                except ValueError as e:
+                    logger.error(f"'{name}' matni noto'g'ri, standart matn ishlatiladi: {e}")
+            compiled[name] = compile_template(name, spec.default)
+        self._overrides = overrides
+        self._compiled = compiled
+        self._version = version
+
+    async def body(self, name: str) -> str:
+        """Hozirgi matn (o'zgartirilgan yoki standart)"""
+        await self._load()
+        return self._overrides.get(name, TEMPLATES[name].default)
+
+    async def is_custom(self, name: str) -> bool:
+        await self._load()
+        return name in self._overrides
+
+    async def render(self, name: str, **values) -> str:
+        await self._load()
+        return self._compiled[name].render(**values)
+
+
+templates = TemplateStore()
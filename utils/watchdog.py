@@ -0,0 +1,175 @@
+import asyncio
+import html
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Loop "yurak urishi" oralig'i (soniya)
+BEAT_INTERVAL = 0.05
+# Stekning eng ichki shuncha kadri saqlanadi / ko'rsatiladi
+STACK_DEPTH = 12
+RECENT_STALLS = 20
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (fayl, qator, funksiya) - stekning eng ichki kadrlari
+Signature = Tuple[Tuple[str, int, str], ...]
+
+
+def app_frames(stack: traceback.StackSummary) -> List[traceback.FrameSummary]:
+    """asyncio ichki kadrlarini (run_forever ... Handle._run) tashlab, eng ichki kadrlar"""
+    start = 0
+    for index, frame in enumerate(stack):
+        if frame.name == "_run" and frame.filename.endswith(os.path.join("asyncio", "events.py")):
+            start = index + 1
+    return list(stack[start:])[-STACK_DEPTH:]
+
+
+def short_path(filename: str) -> str:
+    if filename.startswith(PROJECT_ROOT + os.sep):
+        return os.path.relpath(filename, PROJECT_ROOT)
+    return filename
+
+
+def format_stack(frames: List[traceback.FrameSummary]) -> str:
+    return "\n".join(
+        f"{short_path(frame.filename)}:{frame.lineno} {frame.name}: {(frame.line or '').strip()}"
+        for frame in frames
+    )
+
+
+class LoopWatchdog:
+    """Event loop'ni bloklagan kodni topish
+
+    Loop har `BEAT_INTERVAL` soniyada vaqtni belgilaydi (call_later). Alohida
+    oqim belgi `threshold` dan ko'p kechiksa loop oqimining stekini oladi -
+    aynan shu payt bloklab turgan kod. Loop qayta ishlaganda to'xtash
+    davomiyligi bilan birga yoziladi: log, oxirgi to'xtashlar va stek bo'yicha
+    jami (/stalls).
+    """
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.stalls = 0
+        self.recent: Deque[Tuple[float, float, Optional[Signature]]] = deque(maxlen=RECENT_STALLS)
+        # stek -> {'count', 'total', 'max', 'stack'}
+        self.hotspots: Dict[Signature, Dict] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._expected = 0.0
+        self._captured: Optional[Tuple[float, List[traceback.FrameSummary]]] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._expected = time.monotonic() + BEAT_INTERVAL
+        self._handle = self._loop.call_later(BEAT_INTERVAL, self._beat)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"Loop watchdog yoqildi (chegara {self.threshold * 1000:.0f} ms)")
+
+    def stop(self):
+        self._stop.set()
+        if self._handle:
+            self._handle.cancel()
+            self._handle = None
+
+    def _beat(self):
+        now = time.monotonic()
+        lag = now - self._expected
+        if lag >= self.threshold:
+            captured, self._captured = self._captured, None
+            # Stek shu to'xtash paytida olingan bo'lsagina
+            frames = captured[1] if captured and captured[0] == self._expected else None
+            self._record(lag, frames)
+        self._expected = now + BEAT_INTERVAL
+        self._handle = self._loop.call_later(BEAT_INTERVAL, self._beat)
+
+    def _watch(self):
+        # Chegaradan ko'p bo'lmagan kechikish bilan sezish uchun
+        poll = max(min(self.threshold / 2, 0.1), 0.005)
+        while not self._stop.wait(poll):
+            expected = self._expected
+            if time.monotonic() - expected < self.threshold:
+                continue
+            if self._captured and self._captured[0] == expected:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            frames = app_frames(traceback.extract_stack(frame))
+            del frame
+            # Loop shu orada davom etgan bo'lsa - stek boshqa kodniki
+            if self._expected == expected:
+                self._captured = (expected, frames)
+
+    def _record(self, lag: float, frames: Optional[List[traceback.FrameSummary]]):
+        self.stalls += 1
+        signature = tuple(
+            (short_path(frame.filename), frame.lineno, frame.name) for frame in frames
+        ) if frames else None
+        self.recent.append((time.time(), lag, signature))
+        if signature:
+            hotspot = self.hotspots.setdefault(signature, {
+                'count': 0, 'total': 0.0, 'max': 0.0, 'stack': format_stack(frames)
+            })
+            hotspot['count'] += 1
+            hotspot['total'] += lag
+            hotspot['max'] = max(hotspot['max'], lag)
+            logger.warning(
+                "Event loop %.0f ms bloklandi:\n%s", lag * 1000, hotspot['stack'],
+                extra={"data": {"stall_ms": round(lag * 1000)}}
+            )
+        else:
+            logger.warning(
+                "Event loop %.0f ms bloklandi (stek olinmadi)", lag * 1000,
+                extra={"data": {"stall_ms": round(lag * 1000)}}
+            )
+
+    def top(self, limit: int = 5) -> List[Dict]:
+        """Jami to'xtash vaqti bo'yicha eng ko'p bloklagan joylar"""
+        return sorted(self.hotspots.values(), key=lambda hotspot: hotspot['total'], reverse=True)[:limit]
+
+    def reset(self):
+        self.stalls = 0
+        self.recent.clear()
+        self.hotspots.clear()
+
+
+def render_stalls(watchdog: LoopWatchdog, limit: int = 5) -> str:
+    """/stalls hisoboti: eng ko'p bloklagan joylar steki bilan"""
+    lines = [
+        f"🐢 <b>Event loop to'xtashlari</b> (chegara {watchdog.threshold * 1000:.0f} ms)\n",
+        f"Jami: {watchdog.stalls}"
+    ]
+    if watchdog.recent:
+        lines.append("Oxirgilari: " + ", ".join(
+            f"{lag * 1000:.0f} ms" for _, lag, _ in list(watchdog.recent)[-10:]
+        ))
+    for number, hotspot in enumerate(watchdog.top(limit), 1):
+        # Telegram xabari 4096 belgigacha - uzun steklar qisqartiriladi
+        stack = hotspot['stack'][-500:]
+        lines.append(
+            f"\n<b>{number}.</b> {hotspot['count']} marta, jami {hotspot['total'] * 1000:.0f} ms, "
+            f"max {hotspot['max'] * 1000:.0f} ms\n<pre>{html.escape(stack)}</pre>"
+        )
+    if not watchdog.hotspots:
+        lines.append("\nStek yozilgan to'xtashlar yo'q.")
+    lines.append("\nTozalash: <code>/stalls reset</code>")
+    return "\n".join(lines)
+
+
+# LOOP_WATCHDOG_MS = 0 - o'chirilgan
+loop_watchdog = LoopWatchdog(settings.LOOP_WATCHDOG_MS / 1000) if settings.LOOP_WATCHDOG_MS > 0 else None